@@ -0,0 +1,119 @@
+"""
+Phrase Matcher Microbenchmark
+=============================
+Compares the old unigram/bigram/trigram dict lookups in extract_intent
+against the compiled PhraseMatcher, on a synthetic 10k-keyword taxonomy.
+
+Usage:
+    python bench_phrase_matcher.py --keywords 10000 --queries 2000
+"""
+
+import os
+import random
+import argparse
+import time
+
+# search_engine builds an OpenAI client at import; no calls are made here
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from search_engine import TaxonomyMatch, PhraseMatcher, tokenize
+
+
+VOCAB = [
+    "lego", "disney", "marvel", "peppa", "pig", "paw", "patrol", "frozen", "spider",
+    "man", "harry", "potter", "bluey", "pokemon", "trainers", "wellies", "boots",
+    "shoes", "slippers", "dress", "jacket", "coat", "pyjamas", "doll", "plush",
+    "teddy", "board", "game", "puzzle", "baby", "toddler", "kids", "teen", "gift",
+    "birthday", "christmas", "outdoor", "indoor", "wooden", "electronic", "star",
+    "wars", "castle", "train", "set", "kitchen", "play", "tent", "bike", "scooter",
+]
+
+
+def build_taxonomy(size: int, seed: int = 42) -> dict:
+    """Random 1-4 word phrases from a realistic vocabulary plus numbered fillers"""
+    rng = random.Random(seed)
+    taxonomy = {}
+    while len(taxonomy) < size:
+        length = rng.choice([1, 1, 2, 2, 2, 3, 3, 4])
+        words = [rng.choice(VOCAB) if rng.random() < 0.6 else f"w{rng.randrange(size)}"
+                 for _ in range(length)]
+        keyword = " ".join(words)
+        taxonomy[keyword] = TaxonomyMatch(keyword, rng.choice(["Toys", "Footwear", "Franchise"]),
+                                          "Sub", 1.0)
+    return taxonomy
+
+
+def build_queries(count: int, taxonomy: dict, seed: int = 7) -> list:
+    """2-8 vocabulary words with a real taxonomy phrase spliced in"""
+    rng = random.Random(seed)
+    keywords = sorted(taxonomy)
+    queries = []
+    for _ in range(count):
+        words = [rng.choice(VOCAB) for _ in range(rng.randint(2, 8))]
+        words.insert(rng.randint(0, len(words)), rng.choice(keywords))
+        queries.append(" ".join(words))
+    return queries
+
+
+def legacy_matches(words: list, taxonomy: dict) -> list:
+    """The pre-automaton extract_intent lookups (phrases up to 3 words only)"""
+    found = []
+    for word in words:
+        if word in taxonomy:
+            found.append(taxonomy[word])
+    for i in range(len(words) - 1):
+        bigram = f"{words[i]} {words[i+1]}"
+        if bigram in taxonomy:
+            found.append(taxonomy[bigram])
+    for i in range(len(words) - 2):
+        trigram = f"{words[i]} {words[i+1]} {words[i+2]}"
+        if trigram in taxonomy:
+            found.append(taxonomy[trigram])
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark taxonomy phrase matching')
+    parser.add_argument('--keywords', type=int, default=10000, help='Taxonomy size')
+    parser.add_argument('--queries', type=int, default=2000, help='Queries per run')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs (best is reported)')
+    args = parser.parse_args()
+
+    taxonomy = build_taxonomy(args.keywords)
+    queries = [tokenize(q) for q in build_queries(args.queries, taxonomy)]
+
+    started = time.perf_counter()
+    matcher = PhraseMatcher(taxonomy)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    # Parity: for phrases up to 3 words both must find exactly the same keywords
+    for words in queries:
+        legacy = sorted(m.keyword for m in legacy_matches(words, taxonomy))
+        compiled = sorted(match.keyword for start, end, match in matcher.find(words)
+                          if end - start <= 3)
+        assert legacy == compiled, f"Mismatch for {' '.join(words)!r}: {legacy} != {compiled}"
+
+    def timed(fn):
+        started = time.perf_counter()
+        for words in queries:
+            fn(words)
+        return time.perf_counter() - started
+
+    # Alternate the two so clock and cache drift hit both alike
+    legacy_s, compiled_s = float('inf'), float('inf')
+    for _ in range(args.repeat):
+        legacy_s = min(legacy_s, timed(lambda words: legacy_matches(words, taxonomy)))
+        compiled_s = min(compiled_s, timed(matcher.find))
+    legacy_us = legacy_s / len(queries) * 1e6
+    compiled_us = compiled_s / len(queries) * 1e6
+    longer = sum(1 for words in queries for start, end, _ in matcher.find(words) if end - start > 3)
+
+    print(f"Taxonomy: {len(taxonomy):,} keywords, compiled in {compile_ms:.1f}ms")
+    print(f"Queries:  {len(queries):,} (parity OK)")
+    print(f"  n-gram loops:   {legacy_us:7.2f} µs/query")
+    print(f"  PhraseMatcher:  {compiled_us:7.2f} µs/query ({legacy_us / compiled_us:.2f}x)")
+    print(f"  4+ word phrases only the matcher finds: {longer:,}")
+
+
+if __name__ == "__main__":
+    main()
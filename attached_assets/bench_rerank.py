@@ -0,0 +1,216 @@
+"""
+Re-rank Evaluation
+==================
+Compares the local LinearReranker with the GPT re-rank (sunnyneqbasif's
+slow path) on the same candidate sets: NDCG@8 and precision@8 against
+reference picks, plus per-query latency of each.
+
+Reference picks come from GPT (rank_with_llm) and are stored in --labels
+with their candidate rows, so later runs (and --fit) work offline. Edit
+the "picks" in that file to use human judgments instead.
+
+Candidates come from the live DATABASE_URL (fetch_candidates), or from a
+synthetic catalog with --synthetic; point OPENAI_BASE_URL at
+fake_openai_server.py to try the whole loop without an API key.
+
+Usage:
+    python bench_rerank.py --synthetic --candidates 500 --labels rerank_labels.json
+    python bench_rerank.py --queries-file test-queries.json --max-queries 200 --labels rerank_labels.json
+    python bench_rerank.py --labels rerank_labels.json --fit rerank_weights.json   # then RERANK_WEIGHTS=...
+"""
+
+import os
+import json
+import math
+import time
+import random
+import argparse
+
+import numpy as np
+
+# sunnyneqbasif builds an OpenAI client at import; only label runs call it
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from sunnyneqbasif import fetch_candidates, rank_with_llm, RERANK_TOP_N
+from rerank import LinearReranker, fit_weights
+
+QUERIES = [
+    "Disney trainers for toddler under £20",
+    "Peppa Pig wellies",
+    "LEGO birthday gift",
+    "outdoor toys for kids",
+    "Marvel t-shirt age 5",
+    "cheap baby gifts",
+    "wooden kitchen play set",
+    "harry potter lego",
+    "paw patrol tower",
+    "bluey plush",
+]
+
+FILLER = ["kids", "toy", "set", "gift", "pink", "blue", "wooden", "large", "mini", "deluxe",
+          "bundle", "pack", "school", "bag", "socks", "mug", "book", "puzzle", "game", "outdoor"]
+
+# Columns kept in the labels file (enough for both re-rankers)
+LABEL_COLUMNS = ["aw_product_id", "product_name", "description", "search_price",
+                 "merchant_image_url", "aw_image_url"]
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def synthetic_candidates(query: str, count: int, rng: random.Random) -> list:
+    """Awin-shaped rows where some names/descriptions contain some query words"""
+    words = [w for w in query.lower().replace("£", "").split() if w.isalpha() and len(w) > 2] or ["toy"]
+    rows = []
+    for i in range(count):
+        name = rng.sample(words, rng.randint(0, len(words))) + rng.sample(FILLER, rng.randint(1, 6))
+        rng.shuffle(name)
+        description = " ".join(rng.choice(words + FILLER) for _ in range(rng.randint(0, 40)))
+        rows.append({
+            "aw_product_id": str(100000 + i),
+            "product_name": " ".join(name).title(),
+            "description": description,
+            "search_price": round(rng.uniform(2, 80), 2),
+            "merchant_image_url": rng.choice(["https://img.example/1.jpg", None]),
+            "aw_image_url": None,
+        })
+    return rows
+
+
+def ndcg(ranked: list, picks: list, k: int) -> float:
+    """Graded gain: the reference's first pick is worth k, its last 1"""
+    gains = {pid: k - i for i, pid in enumerate(picks[:k])}
+    dcg = sum(gains.get(pid, 0) / math.log2(i + 2) for i, pid in enumerate(ranked[:k]))
+    ideal = sum(g / math.log2(i + 2) for i, g in enumerate(sorted(gains.values(), reverse=True)))
+    return dcg / ideal if ideal else 0.0
+
+
+def precision(ranked: list, picks: list, k: int) -> float:
+    return len(set(ranked[:k]) & set(picks[:k])) / k
+
+
+def collect_labels(queries: list, labels: dict, synthetic: bool, count: int, seed: int) -> dict:
+    """Fill in candidate rows and GPT picks for queries the labels file lacks"""
+    rng = random.Random(seed)
+    for query in queries:
+        if query in labels:
+            continue
+        if synthetic:
+            candidates = synthetic_candidates(query, count, rng)
+        else:
+            candidates = [{c: (float(r[c]) if c == "search_price" and r[c] is not None else r[c])
+                           for c in LABEL_COLUMNS} for r in fetch_candidates(query)]
+        if not candidates:
+            continue
+        started = time.perf_counter()
+        try:
+            picks = rank_with_llm(query, candidates)
+        except Exception as e:
+            print(f"  GPT labels failed for {query!r}: {e}")
+            continue
+        labels[query] = {"candidates": candidates, "picks": picks,
+                         "gpt_ms": (time.perf_counter() - started) * 1000}
+    return labels
+
+
+def evaluate(reranker: LinearReranker, labels: dict, queries: list, repeat: int) -> dict:
+    scores, precisions, timings = [], [], []
+    for query in queries:
+        entry = labels[query]
+        for _ in range(repeat):
+            started = time.perf_counter()
+            ranked = reranker.rank(query, entry["candidates"], RERANK_TOP_N)
+            timings.append((time.perf_counter() - started) * 1000)
+        scores.append(ndcg(ranked, entry["picks"], RERANK_TOP_N))
+        precisions.append(precision(ranked, entry["picks"], RERANK_TOP_N))
+    return {"ndcg": float(np.mean(scores)), "precision": float(np.mean(precisions)), "timings": timings}
+
+
+def training_data(reranker: LinearReranker, labels: dict, queries: list):
+    matrices, targets = [], []
+    for query in queries:
+        entry = labels[query]
+        picks = {pid: 1.0 - i / RERANK_TOP_N for i, pid in enumerate(entry["picks"])}
+        matrices.append(reranker.features(query, entry["candidates"]))
+        targets.append(np.array([picks.get(str(c["aw_product_id"]), 0.0) for c in entry["candidates"]]))
+    return matrices, targets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the local re-ranker with GPT re-ranking')
+    parser.add_argument('--labels', default='rerank_labels.json',
+                        help='Reference picks + candidate rows (read, extended, written back)')
+    parser.add_argument('--queries-file', help='JSON list of queries (default: built-in sample)')
+    parser.add_argument('--max-queries', type=int, default=None)
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Synthetic candidate sets instead of DATABASE_URL')
+    parser.add_argument('--candidates', type=int, default=50, help='Candidates per synthetic query')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed local runs per query')
+    parser.add_argument('--weights', help='Evaluate these fitted weights too')
+    parser.add_argument('--fit', metavar='PATH',
+                        help='Fit weights on the labels (report held-out NDCG) and write them here')
+    parser.add_argument('--no-gpt', action='store_true', help="Only use labels already on file")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    labels = {}
+    if os.path.exists(args.labels):
+        with open(args.labels) as f:
+            labels = json.load(f)
+
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            queries = json.load(f)
+    elif labels and args.no_gpt:
+        queries = list(labels)
+    else:
+        queries = QUERIES
+    queries = queries[:args.max_queries]
+
+    if not args.no_gpt:
+        before = len(labels)
+        collect_labels(queries, labels, args.synthetic, args.candidates, args.seed)
+        if len(labels) > before:
+            with open(args.labels, "w") as f:
+                json.dump(labels, f)
+            print(f"Labelled {len(labels) - before} new queries -> {args.labels}")
+
+    queries = [q for q in queries if q in labels]
+    if not queries:
+        raise SystemExit("No labelled queries to evaluate")
+
+    sizes = [len(labels[q]["candidates"]) for q in queries]
+    gpt_ms = [labels[q]["gpt_ms"] for q in queries if labels[q].get("gpt_ms") is not None]
+    print(f"{len(queries)} queries, {min(sizes)}-{max(sizes)} candidates each\n")
+    print(f"{'re-ranker':>14} {'NDCG@8':>8} {'P@8':>6} {'p50 ms':>9} {'p95 ms':>9}")
+    if gpt_ms:
+        print(f"{'gpt':>14} {1.0:>8.3f} {1.0:>6.2f} {percentile(gpt_ms, 50):>9.1f} "
+              f"{percentile(gpt_ms, 95):>9.1f}   (reference)")
+
+    rerankers = {"local": LinearReranker()}
+    if args.weights:
+        rerankers["local+weights"] = LinearReranker.load(args.weights)
+    for name, reranker in rerankers.items():
+        result = evaluate(reranker, labels, queries, args.repeat)
+        print(f"{name:>14} {result['ndcg']:>8.3f} {result['precision']:>6.2f} "
+              f"{percentile(result['timings'], 50):>9.2f} {percentile(result['timings'], 95):>9.2f}")
+
+    if args.fit:
+        base = LinearReranker()
+        train, test = queries[0::2], queries[1::2] or queries[0::2]
+        weights = fit_weights(*training_data(base, labels, train))
+        fitted = LinearReranker(dict(zip(weights["features"], weights["weights"])), weights["bias"])
+        held_out = evaluate(fitted, labels, test, 1)
+        baseline = evaluate(base, labels, test, 1)
+        print(f"\nHeld-out NDCG@8 ({len(test)} queries): default {baseline['ndcg']:.3f} -> fitted {held_out['ndcg']:.3f}")
+
+        final = fit_weights(*training_data(base, labels, queries))
+        with open(args.fit, "w") as f:
+            json.dump(final, f, indent=2)
+        print(f"Weights fitted on all {len(queries)} queries -> {args.fit} (use RERANK_WEIGHTS={args.fit})")
+
+
+if __name__ == "__main__":
+    main()
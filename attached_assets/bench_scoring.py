@@ -0,0 +1,118 @@
+"""
+Relevance Scoring Benchmark
+===========================
+Checks that score_batch() gives bit-identical scores to
+calculate_relevance_score() (and the same ranking), then times both at
+50, 500 and 5,000 candidates on a synthetic catalog - for raw rows
+(lowercased per request) and for rows carrying the precomputed *_norm
+columns, as search_products fetches them with NORMALIZED_TEXT=1.
+
+Usage:
+    python bench_scoring.py --sizes 50,500,5000 --repeat 20
+"""
+
+import os
+import random
+import argparse
+import time
+
+import numpy as np
+
+# search_engine builds an OpenAI client at import; no calls are made here
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from search_engine import (
+    TaxonomyMatch, CandidateBatch, extract_intent, calculate_relevance_score, score_batch,
+    normalized_columns
+)
+
+WORDS = ["lego", "disney", "marvel", "peppa", "pig", "frozen", "spider-man", "toy", "kids", "pokémon",
+         "gift", "wooden", "set", "play", "trainers", "wellies", "dress", "plush", "baby", "game"]
+BRANDS = ["LEGO", "Disney", "Marvel", "Peppa Pig", "Hasbro", "Mattel", "", None]
+CATEGORIES = ["Toys", "Footwear", "Clothing", "Games", "Toys > Building", "", None]
+
+TAXONOMY = {k: TaxonomyMatch(k, c, sc, w) for k, c, sc, w in [
+    ('trainers', 'Footwear', 'Sports', 1.0), ('wellies', 'Footwear', 'Outdoor', 1.0),
+    ('lego', 'Toys', 'Building', 1.0), ('doll', 'Toys', 'Dolls', 1.0), ('dress', 'Clothing', 'Dresses', 1.0),
+    ('disney', 'Franchise', 'Disney', 1.2), ('marvel', 'Franchise', 'Marvel', 1.2),
+    ('peppa pig', 'Franchise', 'Peppa Pig', 1.2), ('baby', 'AgeGroup', '0-2', 1.0),
+    ('gift', 'Intent', 'Gift', 1.1), ('cheap', 'Intent', 'Budget', 1.0), ('premium', 'Intent', 'Premium', 1.0),
+]}
+
+QUERIES = [
+    "Disney trainers for toddler under £20",
+    "Peppa Pig wellies",
+    "LEGO birthday gift",
+    "outdoor toys for kids",
+    "Marvel dress over £5",
+    "cheap baby gifts £10 to £30",
+    "premium wooden lego set",
+]
+
+
+def make_products(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    words = lambda n: " ".join(rng.choice(WORDS) for _ in range(n))
+    return [{
+        "id": str(i),
+        "name": words(rng.randint(2, 8)).title(),
+        "description": rng.choice([words(rng.randint(10, 80)), "", None]),
+        "search_tags": rng.choice([", ".join(rng.sample(WORDS, 5)), "", None]),
+        "category": rng.choice(CATEGORIES),
+        "brand": rng.choice(BRANDS),
+        "price": rng.choice([round(rng.uniform(1, 120), 2), 0, None]),
+        "image_url": rng.choice(["https://img.example/1.jpg", "", None]),
+        "in_stock": rng.random() < 0.9,
+    } for i in range(count)]
+
+
+def with_norm_columns(products: list) -> list:
+    return [{**p, **normalized_columns(p)} for p in products]
+
+
+def loop_scores(products: list, intent) -> np.ndarray:
+    return np.array([calculate_relevance_score(dict(p), intent) for p in products])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch relevance scoring')
+    parser.add_argument('--sizes', default='50,500,5000', help='Candidate set sizes')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per size (best is reported)')
+    args = parser.parse_args()
+
+    intents = [extract_intent(q, TAXONOMY) for q in QUERIES]
+
+    # Parity: identical floats and identical ranking for every query
+    for seed in range(5):
+        products = make_products(1000, seed)
+        normalized = with_norm_columns(products)
+        for intent in intents:
+            for rows in (products, normalized):
+                expected = loop_scores(rows, intent)
+                actual = score_batch(CandidateBatch.from_products(rows), intent)
+                assert np.array_equal(expected, actual), f"Score mismatch for {intent.raw_query!r}"
+                ranked = sorted(range(len(rows)), key=lambda i: expected[i], reverse=True)
+                assert ranked == list(np.argsort(-actual, kind='stable')), "Ranking mismatch"
+    print("Parity OK: scores and rankings identical on 5 x 1,000 candidates x 7 queries,\n"
+          "raw and precomputed columns\n")
+
+    def best_of(fn):
+        best = float('inf')
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            for intent in intents:
+                fn(intent)
+            best = min(best, time.perf_counter() - started)
+        return best / len(intents) * 1000
+
+    print(f"{'rows':>6} {'candidates':>10} {'loop ms':>9} {'batch ms':>9} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        raw = make_products(size, seed=99)
+        for label, products in (("raw", raw), ("norm", with_norm_columns(raw))):
+            loop_ms = best_of(lambda intent: loop_scores(products, intent))
+            batch_ms = best_of(lambda intent: score_batch(CandidateBatch.from_products(products), intent))
+            print(f"{label:>6} {size:>10,} {loop_ms:>9.3f} {batch_ms:>9.3f} {loop_ms / batch_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
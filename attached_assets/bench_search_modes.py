@@ -0,0 +1,77 @@
+"""
+Search Mode Benchmark
+=====================
+Times search_products() candidate retrieval in "like" and "fulltext"
+mode against the live DATABASE_URL, and reports how much the top
+results overlap. Run `python search_engine.py --migrate-fulltext` first.
+
+Usage:
+    python bench_search_modes.py --repeat 5 --limit 10
+    python bench_search_modes.py --pool 5000   # cap on the adaptive candidate pool
+"""
+
+import os
+import time
+import argparse
+
+# search_engine builds an OpenAI client at import; no calls are made here
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from search_engine import extract_intent, search_products, taxonomy_cache
+
+QUERIES = [
+    "Disney trainers for toddler under £20",
+    "Peppa Pig wellies",
+    "LEGO birthday gift",
+    "outdoor toys for kids",
+    "Marvel t-shirt age 5",
+    "cheap baby gifts",
+    "wooden kitchen play set",
+    "harry potter lego",
+    "paw patrol tower",
+    "bluey plush",
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare LIKE and full-text candidate retrieval')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query per mode')
+    parser.add_argument('--limit', type=int, default=10, help='Results per query')
+    parser.add_argument('--pool', type=int, default=None,
+                        help='Candidate pool cap per query (default SEARCH_CANDIDATE_POOL, like mode limit * 5)')
+    args = parser.parse_args()
+
+    matcher = taxonomy_cache.matcher()
+    intents = [extract_intent(q, matcher.taxonomy, matcher) for q in QUERIES]
+
+    timings = {"like": [], "fulltext": []}
+    top_ids = {"like": {}, "fulltext": {}}
+    for mode in timings:
+        # Warm-up run so both modes start with a hot buffer cache
+        for intent in intents:
+            search_products(intent, args.limit, mode=mode, pool=args.pool)
+        for _ in range(args.repeat):
+            for intent in intents:
+                started = time.perf_counter()
+                results = search_products(intent, args.limit, mode=mode, pool=args.pool)
+                timings[mode].append((time.perf_counter() - started) * 1000)
+                top_ids[mode][intent.raw_query] = {p['id'] for p in results}
+
+    print(f"{'mode':>10} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for mode, values in timings.items():
+        print(f"{mode:>10} {percentile(values, 50):>9.1f} {percentile(values, 95):>9.1f} {max(values):>9.1f}")
+
+    print("\nTop-result overlap (fulltext vs like):")
+    for query in QUERIES:
+        like, full = top_ids["like"][query], top_ids["fulltext"][query]
+        overlap = len(like & full) / len(like | full) if like | full else 1.0
+        print(f"  {query[:40]:<40} {len(like):>3} / {len(full):>3} results, {overlap:.0%} shared")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Sunny Candidate Pool
+====================
+Adaptive candidate retrieval for the ranking stages (search_engine's
+scorer, sunnyneqbasif's re-ranker):
+
+- candidates stream from a server-side cursor, best first where an index
+  supplies the order (ts_rank_cd, trigram matches)
+- the pool grows in tiers (e.g. 40 -> 200 -> 1000) and stops as soon as
+  the ranker's top-K is the same after a tier as before it, the latency
+  budget is spent, or the rows run out
+- an unordered LIKE scan is not a pre-ordered pool: pass a single tier,
+  since a top-K that "settles" over scan order says nothing about the rest
+- every query's final pool size and stop reason go to metrics
+  (sunny_candidates{source="<name>_pool"}, sunny_pool_stops_total)
+
+Usage:
+    tiers = pool_tiers(first=limit * 5, cap=1000)
+    size, reason = grow_pool(lambda n: cursor.fetchmany(n), top.push_rows,
+                             top.ids, tiers, budget_ms=150, source="search")
+"""
+
+import time
+from typing import Callable, List, Sequence, Tuple
+
+from metrics import observe_candidates, pool_stops_total, stage
+
+
+def pool_tiers(first: int, cap: int, growth: float = 5.0) -> Tuple[int, ...]:
+    """first, first * growth, ... up to cap (always ending at cap)"""
+    first = max(1, min(first, cap))
+    tiers = [first]
+    while tiers[-1] < cap:
+        tiers.append(min(cap, int(tiers[-1] * max(growth, 1.5))))
+    return tuple(tiers)
+
+
+def grow_pool(fetch: Callable[[int], List], consume: Callable[[List], None],
+              top_ids: Callable[[], Sequence], tiers: Sequence[int], budget_ms: float,
+              source: str, chunk: int = 500) -> Tuple[int, str]:
+    """
+    Fetch rows (best cheap score first, if ordered) tier by tier, handing each batch
+    to `consume`. Stops when top_ids() didn't change over the last tier
+    ("stable"), `budget_ms` has passed ("budget"), fetch ran dry
+    ("exhausted") or the last tier is reached ("max").
+    Returns (rows consumed, reason).
+    """
+    started = time.perf_counter()
+    size = 0
+    previous = None
+    reason = "max"
+    for tier in tiers:
+        exhausted = False
+        while size < tier:
+            with stage("sql"):
+                rows = fetch(min(chunk, tier - size))
+            if not rows:
+                exhausted = True
+                break
+            size += len(rows)
+            consume(rows)
+        if exhausted or size < tier:
+            reason = "exhausted"
+            break
+        current = list(top_ids())
+        if current == previous:
+            reason = "stable"
+            break
+        if (time.perf_counter() - started) * 1000 >= budget_ms:
+            reason = "budget"
+            break
+        previous = current
+    observe_candidates(size, f"{source}_pool")
+    pool_stops_total.inc(source, reason)
+    return size, reason
@@ -0,0 +1,285 @@
+"""
+Sunny Database Pool
+===================
+One shared connection pool per database for every Sunny entry point
+(search_engine, generate_search_tags, main123, main_2, sunnyneqbasif).
+Connections are borrowed and returned instead of opened per call, so
+requests stop paying a TCP + auth handshake each time.
+
+Usage:
+    from db_pool import pg_connection
+
+    with pg_connection() as conn:
+        cursor = conn.cursor()
+        ...
+
+Configuration (env):
+    DB_POOL_MIN               connections opened up front (default 1)
+    DB_POOL_MAX               hard cap per process (default 10)
+    DB_POOL_TIMEOUT           seconds to wait for a free connection (default 10)
+    DB_POOL_HEALTHCHECK_AFTER idle seconds before a connection is pinged (default 30)
+"""
+
+import os
+import time
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import RealDictCursor
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool timeout"""
+
+
+class PoolStats:
+    """Acquire-wait and health-check counters shared by both pool types"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.health_checks = 0
+        self.health_failures = 0
+        self.discarded = 0
+
+    def record_acquire(self, wait_ms: float):
+        with self._lock:
+            self.acquired += 1
+            self.in_use += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+
+    def record_release(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def as_dict(self) -> Dict:
+        return {
+            "acquired": self.acquired,
+            "in_use": self.in_use,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(self.wait_total_ms / self.acquired, 3) if self.acquired else 0.0,
+            "wait_max_ms": round(self.wait_max_ms, 3),
+            "health_checks": self.health_checks,
+            "health_failures": self.health_failures,
+            "discarded": self.discarded,
+        }
+
+
+# ============================================================
+# POSTGRESQL
+# ============================================================
+
+class PostgresPool:
+    """
+    ThreadedConnectionPool with blocking acquire, idle health checks
+    and wait metrics. psycopg2's pool raises as soon as it is exhausted;
+    the semaphore makes callers queue (up to `timeout`) instead.
+    """
+
+    def __init__(self, dsn: str, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 timeout: float = DB_POOL_TIMEOUT,
+                 healthcheck_after: float = DB_POOL_HEALTHCHECK_AFTER):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self.stats = PoolStats()
+        self._pool = ThreadedConnectionPool(minconn, maxconn, dsn, cursor_factory=RealDictCursor)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used: Dict[int, float] = {}
+
+    def acquire(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.stats.timeouts += 1
+            raise PoolTimeout(f"No database connection free after {self.timeout}s")
+
+        try:
+            conn = self._pool.getconn()
+            while not self._healthy(conn):
+                self._pool.putconn(conn, close=True)
+                self.stats.discarded += 1
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        self.stats.record_acquire((time.perf_counter() - started) * 1000)
+        return conn
+
+    def release(self, conn, discard: bool = False):
+        self._last_used[id(conn)] = time.monotonic()
+        discard = discard or conn.closed
+        if discard:
+            self._last_used.pop(id(conn), None)
+            self.stats.discarded += 1
+        # putconn rolls back any open transaction before reuse
+        self._pool.putconn(conn, close=discard)
+        self.stats.record_release()
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self.healthcheck_after:
+            return True
+
+        self.stats.health_checks += 1
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            self.stats.health_failures += 1
+            self._last_used.pop(id(conn), None)
+            return False
+
+    def close(self):
+        self._pool.closeall()
+
+    def describe(self) -> Dict:
+        return {"type": "postgres", "min": self.minconn, "max": self.maxconn, **self.stats.as_dict()}
+
+
+# ============================================================
+# SQLITE (single-box main_2 deployment)
+# ============================================================
+
+class SQLitePool:
+    """Fixed set of reusable SQLite connections shared across threads"""
+
+    def __init__(self, path: str, size: int = DB_POOL_MAX, timeout: float = DB_POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.stats = PoolStats()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                conn = self._connect()
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    self.stats.timeouts += 1
+                    raise PoolTimeout(f"No SQLite connection free after {self.timeout}s")
+
+        self.stats.record_acquire((time.perf_counter() - started) * 1000)
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+        self.stats.record_release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def describe(self) -> Dict:
+        return {"type": "sqlite", "path": self.path, "max": self.size, "open": self._created,
+                **self.stats.as_dict()}
+
+
+# ============================================================
+# SHARED INSTANCES
+# ============================================================
+
+_pools: Dict[str, object] = {}
+_labels: Dict[str, str] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pg_pool(dsn: Optional[str] = None) -> PostgresPool:
+    """Process-wide pool for a DSN (DATABASE_URL by default), created on first use"""
+    dsn = dsn or DATABASE_URL
+    key = f"pg:{dsn}"
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = PostgresPool(dsn)
+                # Never echo DSNs (they carry credentials) into stats output
+                _labels[key] = "postgres" if dsn == DATABASE_URL else f"postgres_{len(_labels)}"
+    return pool
+
+
+def get_sqlite_pool(path: str) -> SQLitePool:
+    key = f"sqlite:{os.path.abspath(path)}"
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = SQLitePool(path)
+                _labels[key] = f"sqlite:{os.path.basename(path)}"
+    return pool
+
+
+def pg_connection(dsn: Optional[str] = None):
+    """Borrow a PostgreSQL connection (RealDictCursor rows) for a `with` block"""
+    return get_pg_pool(dsn).connection()
+
+
+def sqlite_connection(path: str):
+    """Borrow a SQLite connection (sqlite3.Row rows) for a `with` block"""
+    return get_sqlite_pool(path).connection()
+
+
+def pool_stats() -> Dict:
+    """Acquire-wait and health metrics for every pool in this process"""
+    return {_labels[key]: pool.describe() for key, pool in list(_pools.items())}
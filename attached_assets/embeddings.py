@@ -0,0 +1,136 @@
+"""
+Sunny Embeddings
+================
+Pluggable text embedders for pgvector retrieval on products.embedding
+(vector(1536), filled by server/generate-embeddings-fast.ts with
+text-embedding-3-small).
+
+- OpenAIEmbedder: the production model; must match what's stored in the column
+- HashingEmbedder: deterministic, offline stand-in (hashed word + trigram
+  features) for tests and dev databases - never mix it with OpenAI vectors
+
+Usage:
+    embedder = get_embedder()            # EMBEDDER=openai|hashing
+    vector = embedder.embed_query("outdoor toys for kids")
+    cursor.execute("... ORDER BY embedding <=> %s::vector", (to_pgvector(vector),))
+
+Configuration (env):
+    EMBEDDER              openai (default) or hashing
+    EMBEDDING_MODEL       OpenAI model (default text-embedding-3-small)
+    EMBEDDING_DIMENSIONS  vector size (default 1536, the column's size)
+"""
+
+import os
+import re
+import hashlib
+import unicodedata
+from typing import Dict, List, Optional
+
+from ttl_cache import TTLCache
+
+EMBEDDER = os.getenv("EMBEDDER", "openai")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+
+# Queries repeat; don't pay an embedding round-trip for each one
+query_vectors = TTLCache(max_size=5000, ttl=86400)
+
+
+def embedding_document(product: Dict) -> str:
+    """Text embedded for a product - same layout as generate-embeddings-fast.ts"""
+    parts = [product.get('name') or '']
+    if product.get('brand'):
+        parts.append(product['brand'])
+    if product.get('category'):
+        parts.append(product['category'])
+    if product.get('description'):
+        parts.append(product['description'][:500])
+    return " | ".join(parts)[:2000]
+
+
+def to_pgvector(vector: List[float]) -> str:
+    """pgvector text literal, for use with a %s::vector parameter"""
+    return "[" + ",".join(repr(float(x)) for x in vector) + "]"
+
+
+class OpenAIEmbedder:
+    """OpenAI embeddings API (batched)"""
+
+    def __init__(self, model: str = EMBEDDING_MODEL, client=None):
+        self.model = model
+        self.name = f"openai:{model}"
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    def embed(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        client = self.client if timeout is None else self.client.with_options(timeout=timeout, max_retries=0)
+        response = client.embeddings.create(model=self.model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    def embed_query(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        """Cached query vector; with a timeout (seconds) the API call gives up by then"""
+        key = (self.name, text.strip().lower())
+        vector = query_vectors.get(key)
+        if vector is None:
+            vector = self.embed([text], timeout)[0]
+            query_vectors.set(key, vector)
+        return vector
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-features vectors: each word and character trigram
+    is hashed to a signed bucket, then the vector is L2-normalized. Texts
+    sharing words or word fragments get positive cosine similarity.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing:{dimensions}"
+
+    def _features(self, text: str) -> List[str]:
+        folded = unicodedata.normalize('NFKD', text.casefold())
+        words = re.findall(r'[^\W_]+', ''.join(c for c in folded if not unicodedata.combining(c)))
+        features = [f"w:{w}" for w in words]
+        for w in words:
+            padded = f"^{w}$"
+            features.extend(f"t:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def embed_one(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(x * x for x in vector) ** 0.5
+        return [x / norm for x in vector] if norm else vector
+
+    def embed(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        return [self.embed_one(t) for t in texts]
+
+    def embed_query(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        return self.embed_one(text)
+
+
+_embedder = None
+
+
+def get_embedder(name: Optional[str] = None):
+    """Embedder selected by name or the EMBEDDER env var (shared instance for the default)"""
+    global _embedder
+    if name is None:
+        if _embedder is None:
+            _embedder = get_embedder(EMBEDDER)
+        return _embedder
+    if name == "openai":
+        return OpenAIEmbedder()
+    if name == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"Unknown embedder: {name!r} (expected 'openai' or 'hashing')")
@@ -0,0 +1,194 @@
+"""
+Fake OpenAI Server
+==================
+Local stand-in for the chat completions API, for exercising the tagging
+pipeline (concurrency, rate limiting, 429 backoff) without spending money.
+Answers with deterministic keywords taken from the prompt's product
+name (or, for batched tagging prompts, a JSON object keyed by product
+id; for re-rank prompts, a JSON array of the IDs whose names share the
+most words with the search), after a configurable latency, and enforces
+its own requests/min limit with 429 + Retry-After like the real API.
+
+Usage:
+    python fake_openai_server.py --port 8099 --latency 0.3 --rpm 600
+    OPENAI_BASE_URL=http://localhost:8099/v1 OPENAI_API_KEY=fake \\
+        python generate_search_tags.py --workers 32 --rpm 600
+
+GET /stats returns request / 429 counts and the peak concurrency seen.
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAI:
+    def __init__(self, latency: float, jitter: float, rpm: int, error_rate: float,
+                 malformed_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self._window = deque()  # accepted request times, last 60s
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def admit(self) -> float:
+        """0 if the request is within the rpm limit, else seconds until it would be"""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            if self.rpm and len(self._window) >= self.rpm:
+                self.rate_limited += 1
+                return 60 - (now - self._window[0])
+            self._window.append(now)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return 0.0
+
+    def done(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    @staticmethod
+    def keywords(name: str) -> str:
+        words = re.findall(r'[a-z]+', name.lower())
+        return ", ".join(dict.fromkeys(w for w in words if len(w) > 2)) or "toys"
+
+    def complete(self, body: dict) -> dict:
+        prompt = body["messages"][-1]["content"]
+        batch = prompt.find("Products (JSON):\n")
+        rerank = re.match(r'Search: (.*)\n\nProducts:\n', prompt)
+        if rerank:
+            # sunnyneqbasif re-rank prompt: "ID:x | name | £price | description" lines
+            wanted = set(re.findall(r'[a-z]+', rerank.group(1).lower()))
+            lines = re.findall(r'^ID:(.*?) \| (.*?) \|', prompt, re.MULTILINE)
+            def rank_key(line):
+                name = re.findall(r'[a-z]+', line[1].lower())
+                return -len(wanted & set(name)), len(name)  # ties: the more focused title
+            ranked = sorted(lines, key=rank_key)
+            content = json.dumps([pid for pid, _ in ranked[:8]])
+        elif batch >= 0:
+            # Batched tagging prompt: answer every product by id
+            products, _ = json.JSONDecoder().raw_decode(prompt, batch + len("Products (JSON):\n"))
+            content = json.dumps({"products": [{"id": p["id"], "tags": self.keywords(p["name"])}
+                                               for p in products]})
+            if random.random() < self.malformed_rate:
+                content = content[:len(content) // 2]  # truncated, like a max_tokens cut-off
+        else:
+            product = re.search(r'^Product: (.*)$', prompt, re.MULTILINE)
+            content = self.keywords(product.group(1) if product else prompt)
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4 + 1
+        return {
+            "id": f"chatcmpl-fake-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+
+def make_handler(fake: FakeOpenAI):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: dict, headers: dict = None):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                self._send(200, fake.stats())
+            else:
+                self._send(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+
+            retry_after = fake.admit()
+            if retry_after:
+                self._send(429, {"error": {"message": "Rate limit reached for requests",
+                                           "type": "requests", "code": "rate_limit_exceeded"}},
+                           {"Retry-After": f"{retry_after:.2f}"})
+                return
+            try:
+                time.sleep(max(0.0, fake.latency + random.uniform(-fake.jitter, fake.jitter)))
+                if random.random() < fake.error_rate:
+                    fake.errors += 1
+                    self._send(500, {"error": {"message": "fake server error", "type": "server_error"}})
+                    return
+                self._send(200, fake.complete(body))
+            finally:
+                fake.done()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # stdlib default of 5 refuses bursts of concurrent clients
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake OpenAI chat completions server')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.3, help='Seconds per completion')
+    parser.add_argument('--jitter', type=float, default=0.1, help='± seconds of latency noise')
+    parser.add_argument('--rpm', type=int, default=0, help='Requests/min before 429s (0 = unlimited)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 500 responses')
+    parser.add_argument('--malformed-rate', type=float, default=0.0,
+                        help='Fraction of batched replies returned as broken JSON')
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(args.latency, args.jitter, args.rpm, args.error_rate, args.malformed_rate)
+    server = FakeServer(("127.0.0.1", args.port), make_handler(fake))
+    print(f"Fake OpenAI on http://127.0.0.1:{args.port}/v1 (latency {args.latency}s, rpm {args.rpm or 'unlimited'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(fake.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,37 +5,63 @@ Run this ONCE to add AI-generated search tags to all 115k products.
 This enriches the description into searchable keywords.
 
 Estimated cost: ~$5-10 for 115k products using gpt-4o-mini
-Estimated time: ~2-3 hours (with rate limiting)
+Estimated time: minutes - requests run concurrently up to the account's
+RPM/TPM limits, 20 products per request
+
+Requests carry --prompt-batch products each (default 20), so the
+instruction block is sent once per batch rather than once per product.
+
+Work is tracked in a job table: the untagged catalog is split once into
+id ranges, and each tagger process claims ranges (FOR UPDATE SKIP LOCKED)
+and checkpoints its progress, so several processes on different nodes
+can share the work and an interrupted run resumes where it stopped.
 
 Usage:
-    python generate_search_tags.py --batch-size 100 --delay 0.5
+    python generate_search_tags.py --workers 32 --rpm 5000 --tpm 2000000 --batches 0
+    python generate_search_tags.py --stats      # progress from the checkpoint
+    python generate_search_tags.py --replan     # pick up newly imported products
+    python generate_search_tags.py --prompt-version v2 --batches 0   # roll out a new prompt
+
+Products whose prompt inputs match something already tagged (the same
+item listed by several merchants) are answered from the shared response
+cache in tagging.py without an API call; the per-range summary shows
+the dedup rate.
+
+Each product stores search_tags_hash = md5(name, description[:600],
+prompt version) of the inputs it was tagged from; only rows whose hash
+no longer matches are planned, so nightly feed updates cost LLM calls
+in proportion to what changed. Run once with --adopt-existing to accept
+tags written before hashing existed.
+
+Test against the local fake server (see fake_openai_server.py):
+    OPENAI_BASE_URL=http://localhost:8099/v1 python generate_search_tags.py --batches 0
 """
 
 import os
 import sys
 import time
+import socket
 import argparse
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from typing import Dict, Iterator, List, Optional, Tuple
 from openai import OpenAI
 
+from db_pool import pg_connection
+from rate_limit import RateLimiter
+from tagging import (
+    BatchTagger, TagWriter, shared_tag_cache, TAG_RPM, TAG_TPM, TAG_WORKERS, TAG_PROMPT_BATCH,
+    TAG_FLUSH_SIZE, TAG_FLUSH_SECONDS
+)
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+TAG_MAX_TOKENS = 150
 
+# Retries and 429 backoff are handled by rate_limit.call_with_backoff.
+# The client also honours OPENAI_BASE_URL (e.g. the fake server).
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0, timeout=60)
 
-def generate_tags(name: str, description: str) -> str:
-    """Generate searchable tags from product name and description"""
-    
-    if not description or len(description.strip()) < 20:
-        return ""
-    
-    prompt = f"""Extract search keywords from this children's/family product. Return ONLY a comma-separated list.
+TAG_INSTRUCTIONS = """Extract search keywords from children's/family products. Return ONLY comma-separated keywords.
 
 Include:
 - Age suitability (baby, toddler, kids 3-5, kids 6-8, teens)
@@ -44,108 +70,301 @@ Include:
 - Material/features (wooden, plastic, electronic, waterproof)
 - Gift occasions (birthday, christmas, party)
 - Activity type (building, reading, active play, pretend play)
-- Any character/franchise names mentioned
-
-Product: {name}
-Description: {description[:600]}
-
-Keywords only (comma-separated, no explanation):"""
-
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            max_tokens=150
-        )
-        tags = response.choices[0].message.content.strip()
-        # Clean up
-        tags = tags.replace('\n', ', ').replace('  ', ' ')
-        return tags[:500]  # Limit length
-    except Exception as e:
-        print(f"  Error: {e}")
-        return ""
-
-
-def process_batch(batch_size: int, delay: float):
-    """Process one batch of products"""
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get products without tags
-    cursor.execute("""
-        SELECT id, name, description 
-        FROM products 
-        WHERE (search_tags IS NULL OR search_tags = '')
-          AND description IS NOT NULL 
-          AND LENGTH(description) > 20
-        ORDER BY id
-        LIMIT %s
-    """, (batch_size,))
-    
-    products = cursor.fetchall()
-    
-    if not products:
-        print("✅ All products have been tagged!")
-        return 0
-    
-    processed = 0
-    for product in products:
-        tags = generate_tags(product['name'], product['description'])
-        
-        if tags:
-            cursor.execute(
-                "UPDATE products SET search_tags = %s WHERE id = %s",
-                (tags, product['id'])
-            )
-            processed += 1
-            print(f"✓ {product['name'][:50]}...")
-            print(f"  → {tags[:80]}...")
-        else:
-            # Mark as processed even if no tags (to avoid reprocessing)
-            cursor.execute(
-                "UPDATE products SET search_tags = '' WHERE id = %s",
-                (product['id'],)
-            )
+- Any character/franchise names mentioned"""
+
+
+def get_db_connection():
+    return pg_connection(DATABASE_URL)
+
+
+def make_tagger(limiter: Optional[RateLimiter] = None,
+                prompt_batch: int = TAG_PROMPT_BATCH, use_cache: bool = True) -> BatchTagger:
+    return BatchTagger(client, TAG_INSTRUCTIONS, batch_size=prompt_batch,
+                       description_chars=600, max_tokens_per_product=TAG_MAX_TOKENS,
+                       limiter=limiter, cache=shared_tag_cache() if use_cache else None)
+
+
+def generate_tags(name: str, description: str,
+                  limiter: Optional[RateLimiter] = None) -> Optional[str]:
+    """
+    Generate searchable tags from product name and description (one call).
+    Returns "" when there's nothing to tag, None if the API call failed.
+    """
+    return make_tagger(limiter, 1).tag_one({'id': '', 'name': name, 'description': description}).tags
+
+
+def tag_products(products: List[Dict], tagger: BatchTagger,
+                 workers: int = TAG_WORKERS) -> Iterator[Tuple[Dict, Optional[str]]]:
+    """
+    Tag products concurrently: tagger.batch_size products per request, up to
+    `workers` requests in flight. Yields (product, tags) as each completes.
+    """
+    for result in tagger.tag(products, workers):
+        yield result.product, result.tags
+
+
+# Bump to roll a new prompt out: rows re-qualify as their hash stops matching
+TAG_PROMPT_VERSION = os.getenv("TAG_PROMPT_VERSION", "v1")
+
+# Fingerprint of everything the tags depend on (the prompt sees description[:600]).
+# One %s: the prompt version.
+TAG_INPUT_HASH = "md5(coalesce(name, '') || chr(31) || left(coalesce(description, ''), 600) || chr(31) || %s)"
+
+# Products whose tags are missing or stale (one %s: the prompt version)
+TAGGABLE = f"""description IS NOT NULL 
+              AND LENGTH(description) > 20
+              AND search_tags_hash IS DISTINCT FROM {TAG_INPUT_HASH}"""
+
+JOB_SCHEMA = """
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_tags_hash TEXT;
+
+CREATE TABLE IF NOT EXISTS tag_jobs (
+    name VARCHAR(50) PRIMARY KEY,
+    total_products INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+ALTER TABLE tag_jobs ADD COLUMN IF NOT EXISTS prompt_version VARCHAR(50);
+
+-- The catalog split into id ranges that taggers claim independently.
+-- cursor_id is the checkpoint: last id whose results are committed.
+CREATE TABLE IF NOT EXISTS tag_job_ranges (
+    job VARCHAR(50) NOT NULL REFERENCES tag_jobs(name) ON DELETE CASCADE,
+    start_id VARCHAR(100) NOT NULL,
+    end_id VARCHAR(100) NOT NULL,
+    products INTEGER NOT NULL,
+    cursor_id VARCHAR(100),
+    processed INTEGER NOT NULL DEFAULT 0,
+    tagged INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',  -- pending | running | done
+    claimed_by TEXT,
+    heartbeat_at TIMESTAMP,
+    PRIMARY KEY (job, start_id)
+);
+"""
+
+TAG_JOB = os.getenv("TAG_JOB", "search_tags")
+# A running range with no heartbeat for this long is assumed dead and re-claimable
+TAG_LEASE_SECONDS = int(os.getenv("TAG_LEASE_SECONDS", "300"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def adopt_existing_tags(prompt_version: str = TAG_PROMPT_VERSION) -> int:
+    """
+    Stamp the current input hash on products tagged before hashes existed,
+    so the first incremental run doesn't pay to re-tag the whole catalog.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(JOB_SCHEMA)
+        cursor.execute(f"""
+            UPDATE products SET search_tags_hash = {TAG_INPUT_HASH}
+            WHERE search_tags_hash IS NULL AND search_tags IS NOT NULL AND search_tags <> ''
+        """, (prompt_version,))
+        adopted = cursor.rowcount
+        conn.commit()
+    return adopted
+
+
+def plan_job(job: str = TAG_JOB, range_size: int = 2000, replan: bool = False,
+             prompt_version: str = TAG_PROMPT_VERSION) -> int:
+    """
+    Split the catalog's untagged or stale products (input hash changed)
+    into claimable id ranges - one scan per plan. A finished job, or one
+    planned for another prompt version, is re-planned automatically, so
+    a nightly run only picks up what the feed changed.
+    replan=True forces it, e.g. straight after a feed import.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(JOB_SCHEMA)
+        cursor.execute("""
+            DELETE FROM tag_jobs j
+            WHERE name = %s
+              AND (%s OR prompt_version IS DISTINCT FROM %s
+                   OR NOT EXISTS (SELECT 1 FROM tag_job_ranges r
+                                  WHERE r.job = j.name AND r.status <> 'done'))
+        """, (job, replan, prompt_version))
+        # Taggers starting together: the first one plans, the others wait and reuse it
+        cursor.execute("""
+            INSERT INTO tag_jobs (name, total_products, prompt_version) VALUES (%s, 0, %s)
+            ON CONFLICT (name) DO NOTHING
+        """, (job, prompt_version))
+        if cursor.rowcount == 0:
+            cursor.execute("SELECT total_products FROM tag_jobs WHERE name = %s", (job,))
+            total = cursor.fetchone()['total_products']
+            conn.commit()
+            return total
         
-        time.sleep(delay)  # Rate limiting
-    
-    conn.commit()
-    conn.close()
-    
-    return processed
+        print(f"Planning job '{job}' ({range_size} products per range)...")
+        cursor.execute(f"""
+            INSERT INTO tag_job_ranges (job, start_id, end_id, products)
+            SELECT %s, MIN(id), MAX(id), COUNT(*)
+            FROM (
+                SELECT id, (ROW_NUMBER() OVER (ORDER BY id) - 1) / %s AS bucket
+                FROM products
+                WHERE {TAGGABLE}
+            ) AS numbered
+            GROUP BY bucket
+        """, (job, range_size, prompt_version))
+        cursor.execute("""
+            UPDATE tag_jobs
+            SET total_products = (SELECT COALESCE(SUM(products), 0) FROM tag_job_ranges WHERE job = %s)
+            WHERE name = %s
+            RETURNING total_products
+        """, (job, job))
+        total = cursor.fetchone()['total_products']
+        conn.commit()
+    return total
 
 
-def get_stats():
-    """Get tagging progress stats"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) FROM products")
-    total = cursor.fetchone()['count']
+def claim_range(job: str = TAG_JOB) -> Optional[Dict]:
+    """
+    Take the next pending (or abandoned) range. SKIP LOCKED lets any number
+    of taggers, on any nodes, claim concurrently without double-processing.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE tag_job_ranges AS r
+            SET status = 'running', claimed_by = %s, heartbeat_at = NOW()
+            FROM (
+                SELECT job, start_id
+                FROM tag_job_ranges
+                WHERE job = %s
+                  AND (status = 'pending'
+                       OR (status = 'running' AND heartbeat_at < NOW() - make_interval(secs => %s)))
+                ORDER BY start_id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            ) AS candidate
+            WHERE r.job = candidate.job AND r.start_id = candidate.start_id
+            RETURNING r.*
+        """, (WORKER_ID, job, TAG_LEASE_SECONDS))
+        claimed = cursor.fetchone()
+        conn.commit()
+    return claimed
+
+
+def process_range(job_range: Dict, tagger: BatchTagger, workers: int = TAG_WORKERS,
+                  page_size: int = 500, flush_size: int = TAG_FLUSH_SIZE,
+                  flush_seconds: float = TAG_FLUSH_SECONDS,
+                  prompt_version: str = TAG_PROMPT_VERSION) -> int:
+    """
+    Tag one claimed range, resuming from its checkpoint. Pages are read by
+    keyset (id > last id), and the checkpoint moves in the same transaction
+    as the tags it covers, so a crash never skips or repeats paid work.
+    """
+    job, start_id, end_id = job_range['job'], job_range['start_id'], job_range['end_id']
+    last_id = job_range['cursor_id'] or ''
+    pending = {'cursor': None, 'processed': 0, 'tagged': 0, 'failed': 0}  # since last flush
     
-    cursor.execute("SELECT COUNT(*) FROM products WHERE search_tags IS NOT NULL AND search_tags != ''")
-    tagged = cursor.fetchone()['count']
+    def checkpoint(cursor):
+        cursor.execute("""
+            UPDATE tag_job_ranges
+            SET cursor_id = COALESCE(%s, cursor_id),
+                processed = processed + %s, tagged = tagged + %s, failed = failed + %s,
+                heartbeat_at = NOW()
+            WHERE job = %s AND start_id = %s
+        """, (pending['cursor'], pending['processed'], pending['tagged'], pending['failed'],
+              job, start_id))
+        pending.update(cursor=None, processed=0, tagged=0, failed=0)
     
-    cursor.execute("SELECT COUNT(*) FROM products WHERE description IS NOT NULL AND LENGTH(description) > 20")
-    taggable = cursor.fetchone()['count']
+    tagged = 0
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        with TagWriter(conn, flush_size, flush_seconds, on_flush=checkpoint) as writer:
+            while True:
+                # input_hash is read with the inputs, so a row edited mid-run
+                # keeps a stale hash and is picked up again next time
+                cursor.execute(f"""
+                    SELECT id, name, description, {TAG_INPUT_HASH} AS input_hash
+                    FROM products
+                    WHERE id >= %s AND id > %s AND id <= %s
+                      AND {TAGGABLE}
+                    ORDER BY id
+                    LIMIT %s
+                """, (prompt_version, start_id, last_id, end_id, prompt_version, page_size))
+                products = cursor.fetchall()
+                if not products:
+                    break
+                
+                for product, tags in tag_products(products, tagger, workers):
+                    pending['processed'] += 1
+                    if tags is None:
+                        # API failure: leave untagged so a replan retries it
+                        pending['failed'] += 1
+                        continue
+                    # '' marks products with nothing to tag (the hash stops reprocessing)
+                    writer.add(product['id'], tags, product['input_hash'])
+                    if tags:
+                        tagged += 1
+                        pending['tagged'] += 1
+                
+                # Whole page done: the checkpoint may now move past it
+                last_id = products[-1]['id']
+                pending['cursor'] = last_id
+                writer.flush()
+                print(f"   {job_range['start_id']}..{end_id}: through {last_id} ({tagged} tagged)")
+        
+        cursor.execute("""
+            UPDATE tag_job_ranges SET status = 'done', heartbeat_at = NOW()
+            WHERE job = %s AND start_id = %s
+        """, (job, start_id))
+        conn.commit()
     
-    conn.close()
+    return tagged
+
+
+def get_stats(job: str = TAG_JOB) -> Dict:
+    """Tagging progress, from the job checkpoint (no table scans)"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT j.total_products,
+                   COALESCE(SUM(r.processed), 0) AS processed,
+                   COALESCE(SUM(r.tagged), 0) AS tagged,
+                   COALESCE(SUM(r.failed), 0) AS failed,
+                   COUNT(*) FILTER (WHERE r.status = 'pending') AS ranges_pending,
+                   COUNT(*) FILTER (WHERE r.status = 'running') AS ranges_running,
+                   COUNT(*) FILTER (WHERE r.status = 'done') AS ranges_done
+            FROM tag_jobs j
+            LEFT JOIN tag_job_ranges r ON r.job = j.name
+            WHERE j.name = %s
+            GROUP BY j.total_products
+        """, (job,))
+        row = cursor.fetchone()
     
-    return {
-        'total': total,
-        'tagged': tagged,
-        'taggable': taggable,
-        'remaining': taggable - tagged
-    }
+    if row is None:
+        return {}
+    stats = dict(row)
+    stats['remaining'] = stats['total_products'] - stats['processed']
+    return stats
 
 
 def main():
     parser = argparse.ArgumentParser(description='Generate search tags for products')
-    parser.add_argument('--batch-size', type=int, default=100, help='Products per batch')
-    parser.add_argument('--delay', type=float, default=0.3, help='Delay between API calls (seconds)')
-    parser.add_argument('--batches', type=int, default=1, help='Number of batches to run (0 = all)')
+    parser.add_argument('--job', default=TAG_JOB, help='Job name (checkpoint key)')
+    parser.add_argument('--range-size', type=int, default=2000, help='Products per claimable range (planning)')
+    parser.add_argument('--replan', action='store_true', help='Drop the job and re-plan from untagged products')
+    parser.add_argument('--batch-size', type=int, default=500, help='Products read per page within a range')
+    parser.add_argument('--workers', type=int, default=TAG_WORKERS, help='Max API requests in flight')
+    parser.add_argument('--rpm', type=float, default=TAG_RPM, help='Requests/min budget')
+    parser.add_argument('--tpm', type=float, default=TAG_TPM, help='Tokens/min budget')
+    parser.add_argument('--flush-size', type=int, default=TAG_FLUSH_SIZE,
+                        help='Write back (and commit) every N results')
+    parser.add_argument('--flush-seconds', type=float, default=TAG_FLUSH_SECONDS,
+                        help='...or every T seconds, whichever comes first')
+    parser.add_argument('--prompt-batch', type=int, default=TAG_PROMPT_BATCH,
+                        help='Products per API request (1 = one prompt per product)')
+    parser.add_argument('--prompt-version', default=TAG_PROMPT_VERSION,
+                        help='Tag prompt version; changing it re-tags products incrementally')
+    parser.add_argument('--adopt-existing', action='store_true',
+                        help='Hash already-tagged products as current instead of re-tagging them')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Ignore the shared tag response cache (always call the API)')
+    parser.add_argument('--batches', type=int, default=1, help='Number of ranges to claim (0 = until none left)')
     parser.add_argument('--stats', action='store_true', help='Show stats only')
     
     args = parser.parse_args()
@@ -153,43 +372,57 @@ def main():
     print("🏷️  Sunny Search Tags Generator")
     print("=" * 50)
     
-    stats = get_stats()
-    print(f"📊 Total products: {stats['total']:,}")
-    print(f"   With descriptions: {stats['taggable']:,}")
-    print(f"   Already tagged: {stats['tagged']:,}")
+    if args.adopt_existing:
+        print(f"🔖 Adopted {adopt_existing_tags(args.prompt_version):,} existing tags as {args.prompt_version}")
+    
+    plan_job(args.job, args.range_size, args.replan, args.prompt_version)
+    stats = get_stats(args.job)
+    print(f"📊 Job '{args.job}' ({args.prompt_version}): {stats['total_products']:,} new or changed products to tag")
+    print(f"   Processed: {stats['processed']:,} ({stats['tagged']:,} tagged, {stats['failed']:,} failed)")
     print(f"   Remaining: {stats['remaining']:,}")
+    print(f"   Ranges: {stats['ranges_done']} done, {stats['ranges_running']} running, "
+          f"{stats['ranges_pending']} pending")
     
     if args.stats:
         return
     
-    if stats['remaining'] == 0:
-        print("\n✅ All products are tagged!")
-        return
-    
-    print(f"\n🚀 Starting... (batch size: {args.batch_size}, delay: {args.delay}s)")
+    print(f"\n🚀 Starting {WORKER_ID}... (page size: {args.batch_size}, workers: {args.workers}, "
+          f"{args.prompt_batch} products/request, budget: {args.rpm:,.0f} RPM / {args.tpm:,.0f} TPM)")
     
+    limiter = RateLimiter(args.rpm, args.tpm)
+    tagger = make_tagger(limiter, args.prompt_batch, use_cache=not args.no_cache)
     batches_run = 0
     total_processed = 0
+    started = time.monotonic()
     
     while True:
-        processed = process_batch(args.batch_size, args.delay)
+        job_range = claim_range(args.job)
+        if job_range is None:
+            print("✅ No ranges left to claim")
+            break
+        
+        print(f"\n📦 Claimed range {job_range['start_id']}..{job_range['end_id']} "
+              f"({job_range['products']} products, resuming after {job_range['cursor_id'] or 'start'})")
+        processed = process_range(job_range, tagger, args.workers, args.batch_size,
+                                  args.flush_size, args.flush_seconds, args.prompt_version)
         total_processed += processed
         batches_run += 1
         
-        if processed == 0:
-            break
-        
-        print(f"\n📦 Batch {batches_run} complete: {processed} products tagged")
-        print(f"   Total this session: {total_processed}")
+        elapsed = time.monotonic() - started
+        print(f"   Range complete: {processed} products tagged")
+        print(f"   Total this session: {total_processed} ({total_processed / elapsed * 60:,.0f}/min)")
+        print(f"   Tagger: {tagger.stats()}")
+        print(f"   Limiter: {limiter.stats()}")
         
         if args.batches > 0 and batches_run >= args.batches:
-            print(f"\n⏸️  Stopping after {args.batches} batches")
+            print(f"\n⏸️  Stopping after {args.batches} ranges")
             break
     
     print(f"\n✅ Session complete: {total_processed} products tagged")
     
-    stats = get_stats()
-    print(f"📊 Progress: {stats['tagged']:,} / {stats['taggable']:,} ({100*stats['tagged']/stats['taggable']:.1f}%)")
+    stats = get_stats(args.job)
+    done = 100 * stats['processed'] / stats['total_products'] if stats['total_products'] else 100.0
+    print(f"📊 Progress: {stats['processed']:,} / {stats['total_products']:,} ({done:.1f}%)")
 
 
 if __name__ == "__main__":
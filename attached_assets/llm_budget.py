@@ -0,0 +1,141 @@
+"""
+LLM Latency Budget
+==================
+Keeps OpenAI calls on the request path (main_2's query parse,
+sunnyneqbasif's GPT re-rank) from holding a user request hostage to a
+slow upstream:
+
+- Deadline: how long a request has left for LLM work, started when the
+  request arrives so queueing counts against it
+- call_with_deadline: run one call against the deadline, optionally hedged
+  (a duplicate request fires if the first is slow; the first answer wins)
+  and retried once on a fast failure while budget remains
+- LLMBudgetExceeded: the deadline passed; callers serve their fallback
+  and flag the response as degraded
+
+Usage:
+    deadline = Deadline()
+    try:
+        response = call_with_deadline(lambda timeout: client.with_options(
+            timeout=timeout, max_retries=0).chat.completions.create(...), deadline)
+    except Exception:
+        ...  # fallback, degraded=True
+
+Configuration (env):
+    LLM_BUDGET_MS    LLM time per request, queueing included (default 2500)
+    LLM_HEDGE_MS     send a hedge request after this long (default 0 = off)
+    LLM_MAX_HEDGES   extra requests per call, hedges and retries (default 1)
+    LLM_WORKERS      threads running LLM calls (default 32)
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Optional, TypeVar
+
+LLM_BUDGET_MS = float(os.getenv("LLM_BUDGET_MS", "2500"))
+LLM_HEDGE_MS = float(os.getenv("LLM_HEDGE_MS", "0"))
+LLM_MAX_HEDGES = int(os.getenv("LLM_MAX_HEDGES", "1"))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "32"))
+
+T = TypeVar("T")
+
+# Abandoned attempts keep running here until their own HTTP timeout fires
+_executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+
+budget_stats = {"calls": 0, "succeeded": 0, "hedges": 0, "hedge_wins": 0, "retries": 0,
+                "timeouts": 0, "errors": 0, "total_ms": 0.0}
+
+
+class LLMBudgetExceeded(TimeoutError):
+    """The request's LLM deadline passed before any attempt answered"""
+
+
+class Deadline:
+    """Point in time by which a request's LLM work must be done"""
+
+    def __init__(self, budget_ms: float = LLM_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.expires_at = time.monotonic() + budget_ms / 1000
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+def call_with_deadline(call: Callable[[float], T], deadline: Deadline,
+                       hedge_ms: Optional[float] = None,
+                       max_hedges: Optional[int] = None) -> T:
+    """
+    Run `call(timeout)` so that it returns by the deadline. `timeout` is the
+    seconds left when the attempt starts; pass it to the HTTP client so
+    abandoned attempts stop too. After `hedge_ms` without an answer (or
+    straight after a failure) a duplicate attempt starts, up to
+    `max_hedges` extras. Raises LLMBudgetExceeded on timeout, or the last
+    error if every attempt failed first.
+    """
+    hedge_ms = LLM_HEDGE_MS if hedge_ms is None else hedge_ms
+    max_hedges = LLM_MAX_HEDGES if max_hedges is None else max_hedges
+    started = time.perf_counter()
+    budget_stats["calls"] += 1
+
+    pending = set()
+    hedge_of = {}  # future -> attempt number
+    error = None
+    next_hedge_at = None
+
+    def launch():
+        nonlocal next_hedge_at
+        future = _executor.submit(call, max(0.05, deadline.remaining()))
+        hedge_of[future] = len(hedge_of)
+        pending.add(future)
+        next_hedge_at = time.monotonic() + hedge_ms / 1000 if hedge_ms > 0 else None
+
+    try:
+        if deadline.expired():
+            raise LLMBudgetExceeded("LLM budget already spent")
+        launch()
+        while pending:
+            can_hedge = len(hedge_of) <= max_hedges
+            timeout = deadline.remaining()
+            if can_hedge and next_hedge_at is not None:
+                timeout = min(timeout, max(0.0, next_hedge_at - time.monotonic()))
+
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    budget_stats["succeeded"] += 1
+                    if hedge_of[future] > 0:
+                        budget_stats["hedge_wins"] += 1
+                    return future.result()
+                error = future.exception()
+
+            if deadline.expired():
+                break
+            if can_hedge and (done and not pending):
+                budget_stats["retries"] += 1
+                launch()
+            elif can_hedge and next_hedge_at is not None and time.monotonic() >= next_hedge_at:
+                budget_stats["hedges"] += 1
+                launch()
+
+        if pending or error is None:
+            budget_stats["timeouts"] += 1
+            raise LLMBudgetExceeded(f"No LLM answer within {deadline.budget_ms:.0f}ms budget")
+        budget_stats["errors"] += 1
+        raise error
+    finally:
+        budget_stats["total_ms"] += (time.perf_counter() - started) * 1000
+
+
+def llm_budget_stats() -> Dict:
+    calls = budget_stats["calls"]
+    return {
+        "budget_ms": LLM_BUDGET_MS,
+        "hedge_ms": LLM_HEDGE_MS,
+        **{k: v for k, v in budget_stats.items() if k != "total_ms"},
+        "avg_ms": round(budget_stats["total_ms"] / calls, 1) if calls else 0.0,
+    }
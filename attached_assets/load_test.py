@@ -0,0 +1,108 @@
+"""
+Search Load Test
+================
+Fires POST /api/search at a running Sunny app with increasing numbers of
+concurrent clients and reports throughput and latency per level. With
+the handlers offloading blocking work, throughput should keep climbing
+with concurrency until the endpoint limit (SEARCH_CONCURRENCY) or the
+database is saturated, instead of flat-lining at one request at a time.
+
+Usage:
+    python load_test.py --url http://localhost:8080/api/search --levels 1,2,4,8,16 --requests 200
+"""
+
+import json
+import time
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+QUERIES = [
+    "Disney trainers for toddler under £20",
+    "Peppa Pig wellies",
+    "LEGO birthday gift",
+    "outdoor toys for kids",
+    "Marvel t-shirt age 5",
+    "cheap baby gifts",
+    "LEGO sets",
+    "baby gifts",
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_level(url: str, concurrency: int, total: int, timeout: float) -> dict:
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        nonlocal errors
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            body = json.dumps({"query": QUERIES[i % len(QUERIES)], "limit": 8}).encode()
+            request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=timeout) as response:
+                    response.read()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed * 1000)
+            except (urllib.error.URLError, TimeoutError, ConnectionError):
+                with lock:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test /api/search')
+    parser.add_argument('--url', default='http://localhost:8080/api/search')
+    parser.add_argument('--levels', default='1,2,4,8,16,32', help='Comma-separated client counts')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per level')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout (seconds)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = [run_level(args.url, int(level), args.requests, args.timeout)
+               for level in args.levels.split(',')]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for r in results:
+        print(f"{r['concurrency']:>8} {r['throughput']:>8.1f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
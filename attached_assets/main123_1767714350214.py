@@ -11,10 +11,17 @@ from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
 from typing import Optional
 
-from search_engine import search_api, get_db_connection, load_taxonomy
+from search_engine import cached_search_api, search_cache, taxonomy_cache
+from db_pool import pool_stats
+from offload import endpoint_limiter, limiter_stats
+from metrics import server_timing_middleware, register_stats, timed_json, metrics_response
 
 app = FastAPI(title="Sunny AI Family Search", version="2.0.0")
 
+# Blocking DB work runs in worker threads, capped per endpoint
+search_limiter = endpoint_limiter("search")
+taxonomy_limiter = endpoint_limiter("taxonomy", default_limit=2)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -23,6 +30,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage timings: /api/metrics + a Server-Timing header on every response
+app.middleware("http")(server_timing_middleware)
+register_stats("pools", pool_stats)
+register_stats("endpoints", limiter_stats)
+register_stats("search_cache", search_cache.stats)
+register_stats("taxonomy", taxonomy_cache.stats)
+
+
+@app.on_event("startup")
+async def warm_taxonomy():
+    """Load the taxonomy once so the first search doesn't pay for it"""
+    try:
+        await taxonomy_limiter.run(taxonomy_cache.get)
+    except Exception as e:
+        # Boot anyway: taxonomy_cache loads it on the first search instead
+        print(f"Taxonomy warm-up failed, loading on first search: {e}")
+
 
 class SearchRequest(BaseModel):
     query: str
@@ -386,13 +410,18 @@ async def search(request: SearchRequest):
     AI-powered product search.
     Uses taxonomy-driven intent extraction + relevance scoring.
     All products from real database - zero hallucination.
+    X-Cache: HIT|MISS says whether the ranked products came from the result cache.
     """
     if not request.query or len(request.query.strip()) < 2:
         raise HTTPException(status_code=400, detail="Query too short")
     
     try:
-        result = search_api(request.query, request.limit or 8)
-        return result
+        result, hit = await search_limiter.run(cached_search_api, request.query, request.limit or 8)
+        response = timed_json(result)
+        response.headers["X-Cache"] = "HIT" if hit else "MISS"
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -400,15 +429,20 @@ async def search(request: SearchRequest):
 
 @app.get("/api/health")
 async def health():
-    return {"status": "healthy", "version": "2.0.0"}
+    return {"status": "healthy", "version": "2.0.0", "pools": pool_stats(), "endpoints": limiter_stats(),
+            "search_cache": search_cache.stats()}
+
+
+@app.get("/api/metrics")
+async def metrics(format: str = "prometheus"):
+    """Stage latency histograms, counters and cache/pool gauges (format=json for percentiles)"""
+    return metrics_response(format)
 
 
 @app.get("/api/taxonomy/stats")
 async def taxonomy_stats():
     """Check taxonomy coverage"""
-    conn = get_db_connection()
-    taxonomy = load_taxonomy(conn)
-    conn.close()
+    taxonomy = await taxonomy_limiter.run(taxonomy_cache.get)
     
     categories = {}
     for match in taxonomy.values():
@@ -419,7 +453,8 @@ async def taxonomy_stats():
     
     return {
         "total_keywords": len(taxonomy),
-        "categories": categories
+        "categories": categories,
+        "cache": taxonomy_cache.stats()
     }
 
 
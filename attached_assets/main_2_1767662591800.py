@@ -5,8 +5,10 @@ No hallucinations - only returns products that exist in YOUR database
 """
 
 import os
+import re
+import copy
 import json
-import sqlite3
+import time
 from typing import Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,6 +17,14 @@ from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
 from openai import OpenAI
 
+from db_pool import sqlite_connection, pool_stats
+from offload import endpoint_limiter, limiter_stats
+from ttl_cache import TTLCache, SQLiteCacheTier
+from llm_budget import Deadline, LLMBudgetExceeded, call_with_deadline, llm_budget_stats
+from search_engine import extract_intent, taxonomy_cache
+from metrics import (stage, observe_candidates, server_timing_middleware, register_stats,
+                     timed_json, metrics_response)
+
 # Initialize FastAPI
 app = FastAPI(title="Sunny AI Family Search", version="1.0.0")
 
@@ -27,12 +37,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage timings: /api/metrics + a Server-Timing header on every response
+app.middleware("http")(server_timing_middleware)
+
 # OpenAI client
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# OpenAI + SQLite calls block, so they run in worker threads capped per endpoint
+search_limiter = endpoint_limiter("search")
+
 # Database path
 DB_PATH = "products.db"
 
+# Query-understanding cache: popular queries skip the GPT round trip.
+# Set QUERY_CACHE_DB to a file path to keep parses across restarts.
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "5000"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "86400"))
+QUERY_CACHE_DB = os.getenv("QUERY_CACHE_DB")
+
+query_cache = TTLCache(max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+query_cache_store = SQLiteCacheTier(QUERY_CACHE_DB, table="query_parses", ttl=QUERY_CACHE_TTL) \
+    if QUERY_CACHE_DB else None
+llm_stats = {"calls": 0, "errors": 0, "timeouts": 0, "total_ms": 0.0}
+
 
 class SearchRequest(BaseModel):
     query: str
@@ -55,16 +82,111 @@ class Product(BaseModel):
 
 
 def get_db_connection():
-    """Get SQLite database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Borrow a pooled SQLite connection: `with get_db_connection() as conn:`"""
+    return sqlite_connection(DB_PATH)
+
+
+# ============================================================
+# FULL-TEXT INDEX (SQLite FTS5)
+# ============================================================
+
+# Keyword retrieval: "fts" (FTS5 + BM25), "like" (substring scan),
+# or "auto" (fts once products_fts has been built)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+
+# External-content index over products: stores only the inverted index,
+# triggers keep it in sync with inserts/updates/deletes.
+# Rebuild (--build-fts) after a VACUUM: products has no INTEGER PRIMARY KEY,
+# so VACUUM may renumber the rowids the index points at.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    name, description,
+    content='products', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts(rowid, name, description)
+    VALUES (new.rowid, new.name, new.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts(products_fts, rowid, name, description)
+    VALUES ('delete', old.rowid, old.name, old.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN
+    INSERT INTO products_fts(products_fts, rowid, name, description)
+    VALUES ('delete', old.rowid, old.name, old.description);
+    INSERT INTO products_fts(rowid, name, description)
+    VALUES (new.rowid, new.name, new.description);
+END;
+"""
+
+# bm25() column weights: a name hit counts 10x a description hit
+FTS_BM25_WEIGHTS = "10.0, 1.0"
+
+_fts_ready = None
+
+
+def build_fts_index():
+    """Create products_fts + sync triggers and (re)index every product"""
+    global _fts_ready
+    with get_db_connection() as conn:
+        started = time.perf_counter()
+        conn.executescript(FTS_SCHEMA)
+        conn.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO products_fts(products_fts) VALUES ('optimize')")
+        conn.commit()
+        count = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    _fts_ready = True
+    print(f"FTS index built for {count:,} products in {time.perf_counter() - started:.1f}s")
+
+
+def fts_enabled() -> bool:
+    """Whether search_products should use the FTS index"""
+    global _fts_ready
+    if SEARCH_BACKEND == "like":
+        return False
+    if SEARCH_BACKEND == "fts":
+        return True
+    if _fts_ready is None:
+        with get_db_connection() as conn:
+            _fts_ready = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+            ).fetchone() is not None
+    return _fts_ready
 
 
-def extract_search_terms(query: str) -> dict:
+def fts_match_expression(keywords: list) -> str:
+    """
+    OR of the keywords as an FTS5 MATCH string; multi-word keywords are
+    phrases. Every token is double-quoted, so input can't inject FTS syntax.
+    """
+    terms = []
+    for kw in keywords:
+        tokens = re.findall(r'\w+', str(kw).lower())
+        if tokens:
+            terms.append('"' + " ".join(tokens) + '"')
+    return " OR ".join(terms)
+
+
+def fts_prefix_expression(text: str) -> str:
+    """Autocomplete MATCH string: all words present, last one as a prefix"""
+    tokens = re.findall(r'\w+', text.lower())
+    if not tokens:
+        return ""
+    return " AND ".join(f'"{t}"' for t in tokens[:-1]) + \
+        (" AND " if len(tokens) > 1 else "") + f'"{tokens[-1]}"*'
+
+
+def parse_query_with_llm(query: str, timeout: Optional[float] = None) -> dict:
     """
     Use GPT-4o-mini to understand the search intent
     Returns structured search parameters - NO product fabrication
+    Raises on API or parse errors; callers decide the fallback.
+    With a timeout (seconds) the call gives up by then, without SDK retries.
     """
     system_prompt = """You are a search query analyzer for a UK family products database.
 Your job is to extract search parameters from natural language queries.
@@ -88,30 +210,140 @@ Examples:
 
 Return ONLY valid JSON, no explanation."""
 
+    api = client.with_options(timeout=timeout, max_retries=0) if timeout else client
+    response = api.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": query}
+        ],
+        temperature=0.1,
+        max_tokens=200
+    )
+    
+    result = response.choices[0].message.content.strip()
+    # Clean up any markdown formatting
+    if result.startswith("```"):
+        result = result.split("```")[1]
+        if result.startswith("json"):
+            result = result[4:]
+    result = result.strip()
+    
+    parsed = json.loads(result)
+    if not isinstance(parsed, dict):
+        raise ValueError(f"Expected a JSON object, got {type(parsed).__name__}")
+    return parsed
+
+
+# Words whose position changes meaning ("gifts from boots", "under 20"):
+# queries containing them (or any digit) keep their word order in the key
+ORDER_SENSITIVE_WORDS = {'from', 'for', 'under', 'over', 'below', 'above', 'less', 'more',
+                         'than', 'to', 'between', 'with', 'without', 'not', 'at', 'by'}
+
+
+def canonical_query(query: str) -> str:
+    """
+    Cache key for a query: case, whitespace and punctuation folded
+    ("LEGO sets!" == "lego  sets"), and word order ignored when that
+    can't change the parse ("sets lego" == "lego sets").
+    """
+    words = re.findall(r'[£$]?\w+', query.lower())
+    if not any(ch.isdigit() for ch in query) and not ORDER_SENSITIVE_WORDS.intersection(words):
+        words.sort()
+    return " ".join(words)
+
+
+def taxonomy_search_params(query: str) -> dict:
+    """
+    Search parameters without the LLM, from search_engine's taxonomy intent
+    extractor: prices, franchise -> brand, category, stop words dropped.
+    Runs once the LLM deadline has passed, so it never waits on Postgres:
+    it uses the taxonomy loaded at startup (DATABASE_URL) if there is one,
+    otherwise only the price and keyword rules.
+    """
+    matcher = taxonomy_cache.loaded_matcher()
+    intent = extract_intent(query, matcher.taxonomy if matcher else {}, matcher)
+    
+    params = {"keywords": [k for k in intent.keywords if not k.isdigit()] or query.lower().split()}
+    if intent.franchises:
+        params["brand"] = intent.franchises[0]
+    if intent.categories:
+        params["category"] = intent.categories[0].lower()
+    if intent.max_price:
+        params["max_price"] = intent.max_price
+    if intent.min_price:
+        params["min_price"] = intent.min_price
+    if intent.age_group:
+        params["age_group"] = intent.age_group
+    return params
+
+
+def store_parse(key: str, params: dict):
+    query_cache.set(key, params)
+    if query_cache_store is not None:
+        query_cache_store.set(key, params)
+
+
+def extract_search_terms(query: str, deadline: Optional[Deadline] = None) -> tuple:
+    """
+    (search parameters, degraded) for a query, via the query cache.
+    Only cache misses reach GPT-4o-mini, within the request's LLM deadline.
+    On timeout or error the taxonomy parse is used instead (degraded=True)
+    and not cached; a late LLM answer still lands in the cache for next time.
+    """
+    key = canonical_query(query)
+    with stage("cache"):
+        cached = query_cache.get(key)
+        if cached is None and query_cache_store is not None:
+            cached = query_cache_store.get(key)
+            if cached is not None:
+                query_cache.set(key, cached)
+    if cached is not None:
+        return copy.deepcopy(cached), False
+    
+    def parse(timeout: float) -> dict:
+        params = parse_query_with_llm(query, timeout)
+        store_parse(key, params)
+        return params
+    
+    started = time.perf_counter()
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query}
-            ],
-            temperature=0.1,
-            max_tokens=200
-        )
-        
-        result = response.choices[0].message.content.strip()
-        # Clean up any markdown formatting
-        if result.startswith("```"):
-            result = result.split("```")[1]
-            if result.startswith("json"):
-                result = result[4:]
-        result = result.strip()
-        
-        return json.loads(result)
+        with stage("llm"):
+            params = call_with_deadline(parse, deadline or Deadline())
+    except LLMBudgetExceeded as e:
+        llm_stats["timeouts"] += 1
+        print(f"OpenAI over budget, using taxonomy parse: {e}")
+        with stage("intent"):
+            return taxonomy_search_params(query), True
     except Exception as e:
+        llm_stats["errors"] += 1
         print(f"OpenAI error: {e}")
-        # Fallback: use raw query as keywords
-        return {"keywords": query.lower().split()}
+        with stage("intent"):
+            return taxonomy_search_params(query), True
+    finally:
+        llm_stats["calls"] += 1
+        llm_stats["total_ms"] += (time.perf_counter() - started) * 1000
+    
+    return copy.deepcopy(params), False
+
+
+def query_cache_stats() -> dict:
+    """Hit/miss counters plus the LLM calls and latency the cache saved"""
+    memory = query_cache.stats()
+    persistent = query_cache_store.stats() if query_cache_store is not None else None
+    saved_calls = memory["hits"] + (persistent["hits"] if persistent else 0)
+    avg_llm_ms = llm_stats["total_ms"] / llm_stats["calls"] if llm_stats["calls"] else 0.0
+    return {
+        "memory": memory,
+        "persistent": persistent,
+        "llm_calls": llm_stats["calls"],
+        "llm_errors": llm_stats["errors"],
+        "llm_timeouts": llm_stats["timeouts"],
+        "avg_llm_ms": round(avg_llm_ms, 1),
+        "llm_calls_saved": saved_calls,
+        "latency_saved_ms": round(saved_calls * avg_llm_ms, 1),
+        "budget": llm_budget_stats(),
+    }
 
 
 def search_products(search_params: dict, limit: int = 8) -> list:
@@ -119,16 +351,14 @@ def search_products(search_params: dict, limit: int = 8) -> list:
     Search the REAL product database
     Returns only products that actually exist - no fabrication
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     # Build dynamic SQL query
     conditions = []
     params = []
     
     # Keyword search across name and description
     keywords = search_params.get("keywords", [])
-    if keywords:
+    match = fts_match_expression(keywords) if keywords and fts_enabled() else ""
+    if keywords and not match:
         keyword_conditions = []
         for kw in keywords:
             keyword_conditions.append("(LOWER(name) LIKE ? OR LOWER(description) LIKE ?)")
@@ -166,21 +396,42 @@ def search_products(search_params: dict, limit: int = 8) -> list:
     # Build final query
     where_clause = " AND ".join(conditions) if conditions else "1=1"
     
-    query = f"""
-        SELECT id, name, description, price, currency, merchant, merchant_id,
-               category, brand, affiliate_link, image_url, in_stock
-        FROM products
-        WHERE {where_clause}
-        ORDER BY 
-            CASE WHEN image_url IS NOT NULL AND image_url != '' THEN 0 ELSE 1 END,
-            price ASC
-        LIMIT ?
-    """
+    if match:
+        # BM25-ranked: index lookup first, then filters on the matching rows only
+        query = f"""
+            WITH matches AS (
+                SELECT rowid, bm25(products_fts, {FTS_BM25_WEIGHTS}) AS rank
+                FROM products_fts
+                WHERE products_fts MATCH ?
+            )
+            SELECT id, name, description, price, currency, merchant, merchant_id,
+                   category, brand, affiliate_link, image_url, in_stock
+            FROM matches JOIN products ON products.rowid = matches.rowid
+            WHERE {where_clause}
+            ORDER BY 
+                matches.rank,
+                CASE WHEN image_url IS NOT NULL AND image_url != '' THEN 0 ELSE 1 END,
+                price ASC
+            LIMIT ?
+        """
+        params.insert(0, match)
+    else:
+        query = f"""
+            SELECT id, name, description, price, currency, merchant, merchant_id,
+                   category, brand, affiliate_link, image_url, in_stock
+            FROM products
+            WHERE {where_clause}
+            ORDER BY 
+                CASE WHEN image_url IS NOT NULL AND image_url != '' THEN 0 ELSE 1 END,
+                price ASC
+            LIMIT ?
+        """
     params.append(limit)
     
     try:
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        with get_db_connection() as conn, stage("sql"):
+            rows = conn.execute(query, params).fetchall()
+        observe_candidates(len(rows), "sql")
         
         products = []
         for row in rows:
@@ -203,8 +454,28 @@ def search_products(search_params: dict, limit: int = 8) -> list:
     except Exception as e:
         print(f"Database error: {e}")
         return []
-    finally:
-        conn.close()
+
+
+def autocomplete(text: str, limit: int = 8) -> list:
+    """Product-name suggestions for a partially typed query"""
+    if fts_enabled():
+        match = fts_prefix_expression(text)
+        if not match:
+            return []
+        sql = f"""
+            SELECT products.name
+            FROM products_fts JOIN products ON products.rowid = products_fts.rowid
+            WHERE products_fts MATCH ? AND products.in_stock = 1
+            ORDER BY bm25(products_fts, {FTS_BM25_WEIGHTS})
+            LIMIT ?
+        """
+        params = [match, limit]
+    else:
+        sql = "SELECT name FROM products WHERE LOWER(name) LIKE ? AND in_stock = 1 LIMIT ?"
+        params = [f"{text.lower()}%", limit]
+    
+    with get_db_connection() as conn:
+        return [row["name"] for row in conn.execute(sql, params).fetchall()]
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -559,26 +830,79 @@ async def search_products_api(request: SearchRequest):
     if not request.query or len(request.query.strip()) < 2:
         raise HTTPException(status_code=400, detail="Query too short")
     
-    # Step 1: AI understands the search intent
-    search_params = extract_search_terms(request.query)
+    # LLM work must finish within the budget, queueing included
+    deadline = Deadline()
+    
+    # Step 1: AI understands the search intent (taxonomy parse if GPT is slow)
+    search_params, degraded = await search_limiter.run(extract_search_terms, request.query, deadline)
     
     # Step 2: Search the REAL database
-    products = search_products(search_params, request.limit or 8)
+    products = await search_limiter.run(search_products, search_params, request.limit or 8)
     
-    return {
+    return timed_json({
         "query": request.query,
         "searchParams": search_params,
         "products": products,
-        "count": len(products)
-    }
+        "count": len(products),
+        "degraded": degraded
+    })
+
+
+@app.get("/api/autocomplete")
+async def autocomplete_api(q: str, limit: int = 8):
+    """Prefix suggestions as the user types"""
+    if len(q.strip()) < 2:
+        return {"query": q, "suggestions": []}
+    suggestions = await search_limiter.run(autocomplete, q, min(limit, 20))
+    return {"query": q, "suggestions": suggestions}
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Query-understanding cache effectiveness"""
+    return query_cache_stats()
+
+
+@app.get("/api/metrics")
+async def metrics(format: str = "prometheus"):
+    """Stage latency histograms, counters and cache/pool gauges (format=json for percentiles)"""
+    return metrics_response(format)
 
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "Sunny AI Search"}
+    return {"status": "healthy", "service": "Sunny AI Search", "pools": pool_stats(),
+            "endpoints": limiter_stats()}
+
+
+@app.on_event("startup")
+async def warm_taxonomy():
+    """Load the Postgres taxonomy for taxonomy_search_params, which never loads it itself"""
+    if not os.getenv("DATABASE_URL"):
+        return
+    try:
+        await search_limiter.run(taxonomy_cache.get)
+    except Exception as e:
+        # Fallback parses use the price and keyword rules only
+        print(f"Taxonomy unavailable for fallback parse: {e}")
+
+
+register_stats("pools", pool_stats)
+register_stats("endpoints", limiter_stats)
+register_stats("query_cache", query_cache_stats)
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Sunny AI Family Search')
+    parser.add_argument('--build-fts', action='store_true',
+                        help='Build the FTS5 index for products.db and exit')
+    args = parser.parse_args()
+    
+    if args.build_fts:
+        build_fts_index()
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8080)
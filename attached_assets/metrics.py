@@ -0,0 +1,297 @@
+"""
+Sunny Metrics
+=============
+In-process latency and size instrumentation shared by the three search
+apps (main123 / search_engine, main_2, sunnyneqbasif):
+
+- Histogram / Counter: labelled metrics with Prometheus text exposition;
+  histograms also keep a window of recent values for p50/p95/p99
+- stage("sql"): times one hot-path stage into sunny_stage_seconds and into
+  the current request's Server-Timing header
+- server_timing_middleware: per-request timing scope (a contextvar, so it
+  follows the request into offload worker threads), request histogram and
+  the Server-Timing header
+- register_stats(prefix, fn): export an existing stats() dict (pools,
+  limiters, caches) as gauges
+- metrics_response(format): the /api/metrics body, Prometheus text or JSON
+
+FastAPI is only imported by the response helpers, so search_engine's
+CLI and the benchmarks can record stages without it.
+
+Usage:
+    app.middleware("http")(server_timing_middleware)
+
+    with stage("sql"):
+        cursor.execute(...)
+    observe_candidates(len(rows))
+
+    @app.get("/api/metrics")
+    async def metrics(format: str = "prometheus"):
+        return metrics_response(format)
+"""
+
+import re
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Seconds: sub-millisecond scoring up to multi-second LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+# Candidate-set sizes
+SIZE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Series:
+    __slots__ = ("buckets", "count", "total", "recent")
+
+    def __init__(self, size: int, window: int):
+        self.buckets = [0] * size
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, plus a recent-values window"""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS, window: int = 2048):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.bounds = buckets
+        self.window = window
+        self._series: Dict[Tuple, _Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = _Series(len(self.bounds), self.window)
+            for i, bound in enumerate(self.bounds):
+                if value <= bound:
+                    series.buckets[i] += 1
+                    break
+            series.count += 1
+            series.total += value
+            series.recent.append(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                labels = _format_labels(self.labels, values)
+                cumulative = 0
+                for bound, count in zip(self.bounds, series.buckets):
+                    cumulative += count
+                    le = _format_labels(self.labels, values, 'le="%g"' % bound)
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _format_labels(self.labels, values, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {series.count}")
+                lines.append(f"{self.name}_sum{labels} {series.total:.6f}")
+                lines.append(f"{self.name}_count{labels} {series.count}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def summary(self) -> Dict:
+        """count / mean / p50 / p95 / p99 (over the recent window) per label set"""
+        out = {}
+        with self._lock:
+            snapshot = [(values, series.count, series.total, list(series.recent))
+                        for values, series in self._series.items()]
+        for values, count, total, recent in sorted(snapshot):
+            key = ",".join(str(v) for v in values) or "all"
+            out[key] = {
+                "count": count,
+                "mean": round(total / count, 6) if count else 0.0,
+                "p50": round(percentile(recent, 50), 6) if recent else 0.0,
+                "p95": round(percentile(recent, 95), 6) if recent else 0.0,
+                "p99": round(percentile(recent, 99), 6) if recent else 0.0,
+            }
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {total:g}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {",".join(str(v) for v in values) or "all": total
+                    for values, total in sorted(self._values.items())}
+
+
+stage_seconds = Histogram("sunny_stage_seconds", "Time spent in one search stage", ("stage",))
+request_seconds = Histogram("sunny_request_seconds", "End-to-end request time", ("endpoint",))
+candidate_count = Histogram("sunny_candidates", "Candidates fetched per search before ranking",
+                            ("source",), buckets=SIZE_BUCKETS)
+requests_total = Counter("sunny_requests_total", "Requests served", ("endpoint", "status"))
+errors_total = Counter("sunny_errors_total", "Search errors by stage", ("stage",))
+pool_stops_total = Counter("sunny_pool_stops_total", "Why adaptive candidate pools stopped growing",
+                           ("source", "reason"))
+
+_HISTOGRAMS = [stage_seconds, request_seconds, candidate_count]
+_COUNTERS = [requests_total, errors_total, pool_stops_total]
+_stats_sources: Dict[str, Callable[[], Dict]] = {}
+
+# Stage durations of the request being served: [(stage, seconds), ...]
+_request_stages: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar(
+    "sunny_request_stages", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as stage `name` (histogram + this request's Server-Timing)"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors_total.inc(name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, name)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((name, elapsed))
+
+
+def observe_candidates(count: int, source: str = "sql"):
+    candidate_count.observe(count, source)
+
+
+def timed_json(payload):
+    """JSONResponse whose encoding is timed as the "serialize" stage"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    with stage("serialize"):
+        return JSONResponse(content=jsonable_encoder(payload))
+
+
+def server_timing_header(stages: List[Tuple[str, float]], total: float) -> str:
+    merged: Dict[str, float] = {}
+    for name, elapsed in stages:
+        merged[name] = merged.get(name, 0.0) + elapsed
+    parts = [f"{name};dur={elapsed * 1000:.2f}" for name, elapsed in merged.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+async def server_timing_middleware(request, call_next):
+    """Per-request stage collection, request metrics and the Server-Timing header"""
+    stages: list = []
+    token = _request_stages.set(stages)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["Server-Timing"] = server_timing_header(stages, time.perf_counter() - started)
+        return response
+    finally:
+        _request_stages.reset(token)
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", None) or "unmatched"
+        request_seconds.observe(time.perf_counter() - started, endpoint)
+        requests_total.inc(endpoint, str(status))
+
+
+def register_stats(prefix: str, fn: Callable[[], Dict]):
+    """Export fn()'s numeric fields (nested dicts flattened) as sunny_<prefix>_* gauges"""
+    _stats_sources[prefix] = fn
+
+
+def _flatten(prefix: str, value, out: Dict[str, float]):
+    if isinstance(value, dict):
+        for key, inner in value.items():
+            _flatten(f"{prefix}_{key}", inner, out)
+    elif isinstance(value, bool):
+        out[prefix] = float(value)
+    elif isinstance(value, (int, float)):
+        out[prefix] = float(value)
+
+
+def _gauges() -> Dict[str, float]:
+    gauges: Dict[str, float] = {}
+    for prefix, fn in _stats_sources.items():
+        try:
+            _flatten(f"sunny_{prefix}", fn(), gauges)
+        except Exception as e:
+            print(f"Metrics source {prefix} failed: {e}")
+    return {re.sub(r'[^a-zA-Z0-9_]', '_', name): value for name, value in gauges.items()}
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for metric in _HISTOGRAMS + _COUNTERS:
+        lines.extend(metric.render())
+    for name, value in sorted(_gauges().items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_summary() -> Dict:
+    return {
+        "stages": stage_seconds.summary(),
+        "requests": request_seconds.summary(),
+        "candidates": candidate_count.summary(),
+        "requests_total": requests_total.summary(),
+        "errors_total": errors_total.summary(),
+        "pool_stops_total": pool_stops_total.summary(),
+        "stats": {prefix: fn() for prefix, fn in _stats_sources.items()},
+    }
+
+
+def reset_metrics():
+    """Drop every recorded value (benchmarks: exclude warmup from the results)"""
+    for metric in _HISTOGRAMS + _COUNTERS:
+        metric.reset()
+
+
+def metrics_response(format: str = "prometheus"):
+    """/api/metrics body: Prometheus text exposition, or JSON with percentiles"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, PlainTextResponse
+    if format == "json":
+        return JSONResponse(content=jsonable_encoder(metrics_summary()))
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,94 @@
+"""
+Blocking Work Offload
+=====================
+The search handlers are `async def`, but psycopg2, sqlite3 and the OpenAI
+SDK all block. Calling them directly on the event loop stalls every other
+request, so handlers push that work onto worker threads through an
+EndpointLimiter: a per-endpoint cap on in-flight calls, with a bounded
+wait queue that sheds load (503) instead of piling up forever.
+
+Usage:
+    search_limiter = endpoint_limiter("search")
+
+    @app.post("/api/search")
+    async def search(request: SearchRequest):
+        return await search_limiter.run(search_api, request.query)
+
+Configuration (env), per endpoint name (upper-cased):
+    SEARCH_CONCURRENCY   max calls running at once (default: DB_POOL_MAX)
+    SEARCH_MAX_WAITING   max calls queued behind them before 503 (default 100)
+"""
+
+import os
+import threading
+from functools import partial
+from typing import Callable, Dict
+
+import anyio
+import anyio.to_thread
+from fastapi import HTTPException
+
+from db_pool import DB_POOL_MAX
+
+
+class EndpointLimiter:
+    """Runs blocking callables in threads, at most `limit` at a time"""
+
+    def __init__(self, name: str, limit: int, max_waiting: int):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self._limiter = anyio.CapacityLimiter(limit)
+        self._lock = threading.Lock()
+        self.pending = 0  # running + queued
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        with self._lock:
+            if self.pending >= self.limit + self.max_waiting:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Server busy, please retry")
+            self.pending += 1
+
+        try:
+            return await anyio.to_thread.run_sync(partial(fn, *args, **kwargs), limiter=self._limiter)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def stats(self) -> Dict:
+        in_flight = int(self._limiter.borrowed_tokens)
+        return {
+            "limit": self.limit,
+            "in_flight": in_flight,
+            "waiting": max(0, self.pending - in_flight),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
+
+
+_limiters: Dict[str, EndpointLimiter] = {}
+
+
+def endpoint_limiter(name: str, default_limit: int = DB_POOL_MAX,
+                     default_max_waiting: int = 100) -> EndpointLimiter:
+    """Shared limiter for an endpoint, sized from <NAME>_CONCURRENCY / <NAME>_MAX_WAITING"""
+    if name not in _limiters:
+        prefix = name.upper()
+        _limiters[name] = EndpointLimiter(
+            name,
+            int(os.getenv(f"{prefix}_CONCURRENCY", str(default_limit))),
+            int(os.getenv(f"{prefix}_MAX_WAITING", str(default_max_waiting))),
+        )
+    return _limiters[name]
+
+
+def limiter_stats() -> Dict:
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
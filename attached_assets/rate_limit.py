@@ -0,0 +1,184 @@
+"""
+OpenAI Rate Limiting
+====================
+Client-side budget for bulk LLM jobs (tag generation): keep under the
+account's requests/min and tokens/min limits instead of discovering them
+through 429s, and back off adaptively when a 429 happens anyway.
+
+- TokenBucket: continuous-refill bucket; callers may go into debt and
+  sleep it off, so waits are fair under concurrency
+- RateLimiter: RPM + TPM buckets, shared cooldown after a 429 and an
+  AIMD rate scale (halve on 429, creep back up on success)
+- call_with_backoff: run one API call under the limiter with retries
+
+Usage:
+    limiter = RateLimiter(rpm=500, tpm=200_000)
+    response = call_with_backoff(limiter, estimate_tokens(prompt) + max_tokens,
+                                 lambda: client.chat.completions.create(...))
+
+The OpenAI client reads OPENAI_BASE_URL, so pointing it at
+fake_openai_server.py exercises all of this locally.
+"""
+
+import time
+import random
+import threading
+from typing import Callable, Dict, Optional
+
+import openai
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size (~4 chars per token), good enough for budgeting"""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """`rate` units per minute, bursting up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        # Default burst: ten seconds' worth, so a cold start doesn't spike the API
+        self.capacity = capacity or max(1.0, rate / 6)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate / 60)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` now (possibly into debt); returns seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens * 60 / self.rate)
+
+    def refund(self, amount: float):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+
+class RateLimiter:
+    """Requests/min + tokens/min budget with adaptive 429 backoff"""
+
+    def __init__(self, rpm: float, tpm: float, min_scale: float = 0.1,
+                 recovery_step: float = 0.02):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.min_scale = min_scale
+        self.recovery_step = recovery_step
+        self.scale = 1.0
+        self._cooldown_until = 0.0
+        self._streak = 0  # consecutive 429s
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.waited_seconds = 0.0
+
+    def acquire(self, tokens: int):
+        """Block until one request of ~`tokens` tokens fits the budget"""
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        with self._lock:
+            wait = max(wait, self._cooldown_until - time.monotonic())
+            self.calls += 1
+            self.waited_seconds += max(0.0, wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the token bucket once the real usage is known"""
+        if actual < estimated:
+            self.tokens.refund(estimated - actual)
+        elif actual > estimated:
+            self.tokens.reserve(actual - estimated)
+
+    def _apply_scale(self):
+        self.requests.set_rate(self.rpm * self.scale)
+        self.tokens.set_rate(self.tpm * self.scale)
+
+    def on_success(self):
+        with self._lock:
+            self._streak = 0
+            if self.scale < 1.0:
+                self.scale = min(1.0, self.scale + self.recovery_step)
+                self._apply_scale()
+
+    def on_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """429: pause everyone, then continue at half the rate"""
+        with self._lock:
+            self.rate_limited += 1
+            self._streak += 1
+            self.scale = max(self.min_scale, self.scale / 2)
+            self._apply_scale()
+            delay = retry_after if retry_after is not None else min(60.0, 2 ** self._streak)
+            delay *= random.uniform(1.0, 1.25)  # de-synchronize the workers
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "rate_scale": round(self.scale, 3),
+            "effective_rpm": round(self.rpm * self.scale),
+            "effective_tpm": round(self.tpm * self.scale),
+            "waited_seconds": round(self.waited_seconds, 1),
+        }
+
+
+def _retry_after(error: openai.APIStatusError) -> Optional[float]:
+    headers = getattr(error.response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+RETRYABLE = (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def call_with_backoff(limiter: RateLimiter, estimated_tokens: int, call: Callable,
+                      max_attempts: int = 6):
+    """
+    Run `call` (one API request) inside the budget. 429s feed the limiter's
+    adaptive backoff; timeouts, connection errors and 5xx retry with jittered
+    exponential delay. Raises the last error once attempts run out.
+    """
+    for attempt in range(max_attempts):
+        limiter.acquire(estimated_tokens)
+        try:
+            response = call()
+        except openai.RateLimitError as e:
+            limiter.on_rate_limited(_retry_after(e))
+            error = e
+        except RETRYABLE as e:
+            time.sleep(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5))
+            error = e
+        else:
+            limiter.on_success()
+            usage = getattr(response, "usage", None)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                limiter.settle(estimated_tokens, usage.total_tokens)
+            return response
+        if attempt + 1 < max_attempts:
+            limiter.on_retry()
+    raise error
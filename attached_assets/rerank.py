@@ -0,0 +1,180 @@
+"""
+Sunny Re-rankers
+================
+Local re-rank stage for sunnyneqbasif: orders a keyword candidate set by
+relevance to the query on the CPU - about 1 ms for 50 candidates and
+10 ms for 500 - instead of a multi-second GPT round trip.
+
+- LinearReranker: weighted sum of per-candidate features modelled on
+  search_engine.calculate_relevance_score (query terms in the name vs only
+  in the description, phrase and bigram hits, price fit, image)
+- fit_weights: ridge regression of those features onto reference labels
+  (GPT picks or human judgments), run offline by bench_rerank.py --fit
+
+The GPT re-rank stays in sunnyneqbasif as the optional slow path
+(RERANKER=gpt, or "rerank": "gpt" on a request when the server lists it
+in RERANK_CLIENT_CHOICES).
+
+Usage:
+    reranker = LinearReranker.from_env()          # RERANK_WEIGHTS=weights.json
+    top_ids = reranker.rank("peppa pig wellies", candidates, top_n=8)
+
+Configuration (env):
+    RERANK_WEIGHTS  JSON file written by bench_rerank.py --fit (default: built-in weights)
+"""
+
+import os
+import json
+import math
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from search_engine import normalize_search_text, extract_price_range
+
+RERANK_WEIGHTS = os.getenv("RERANK_WEIGHTS")
+
+# Words that say nothing about the product (same spirit as extract_intent's list)
+QUERY_STOP_WORDS = {'a', 'an', 'the', 'for', 'and', 'or', 'in', 'on', 'at', 'to', 'of', 'with',
+                    'is', 'are', 'i', 'me', 'my', 'want', 'need', 'looking', 'find', 'get', 'buy',
+                    'under', 'over', 'below', 'above', 'less', 'more', 'than', 'up', 'max', 'min'}
+
+FEATURES = [
+    "name_coverage",     # share of query terms found in the name
+    "desc_coverage",     # share found only in the description
+    "all_terms",         # every term found somewhere
+    "name_phrase",       # the whole query phrase appears in the name
+    "name_bigrams",      # share of adjacent query-term pairs in the name
+    "in_budget",         # +1 inside the stated price range, -1 outside, 0 if none
+    "budget_usage",      # price / max price when inside the budget
+    "has_image",
+    "short_name",        # 1 / log2(2 + words in name): focused titles over bundles
+]
+
+# Hand-set starting point, scaled like calculate_relevance_score
+# (name hit 10, description hit 5, over budget -50, image 3)
+DEFAULT_WEIGHTS = {
+    "name_coverage": 10.0,
+    "desc_coverage": 5.0,
+    "all_terms": 4.0,
+    "name_phrase": 6.0,
+    "name_bigrams": 4.0,
+    "in_budget": 25.0,
+    "budget_usage": 5.0,
+    "has_image": 3.0,
+    "short_name": 2.0,
+}
+
+
+def query_terms(query: str) -> List[str]:
+    """Normalized query words that should match product text, in query order"""
+    terms = []
+    for word in normalize_search_text(query).split():
+        if word not in QUERY_STOP_WORDS and not word.isdigit() and word not in terms:
+            terms.append(word)
+    return terms
+
+
+class LinearReranker:
+    """
+    score = features @ weights + bias. Reads Awin rows by default
+    (aw_product_id, product_name, ...); pass other keys for other tables.
+    """
+
+    name = "local"
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, bias: float = 0.0,
+                 id_key: str = "aw_product_id", name_key: str = "product_name",
+                 description_key: str = "description", price_key: str = "search_price",
+                 image_keys: Sequence[str] = ("merchant_image_url", "aw_image_url"),
+                 description_chars: int = 500):
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.weights = np.array([weights[f] for f in FEATURES], dtype=np.float64)
+        self.bias = bias
+        self.id_key = id_key
+        self.name_key = name_key
+        self.description_key = description_key
+        self.price_key = price_key
+        self.image_keys = tuple(image_keys)
+        self.description_chars = description_chars
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "LinearReranker":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(dict(zip(data["features"], data["weights"])), data.get("bias", 0.0), **kwargs)
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "LinearReranker":
+        """Fitted weights from RERANK_WEIGHTS when set, else the defaults"""
+        if RERANK_WEIGHTS:
+            try:
+                return cls.load(RERANK_WEIGHTS, **kwargs)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not load re-rank weights from {RERANK_WEIGHTS}, using defaults: {e}")
+        return cls(**kwargs)
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"features": FEATURES, "weights": self.weights.tolist(), "bias": self.bias},
+                      f, indent=2)
+
+    def features(self, query: str, candidates: List[Dict]) -> np.ndarray:
+        """(len(candidates), len(FEATURES)) feature matrix"""
+        terms = query_terms(query)
+        phrase = " ".join(terms)
+        bigrams = [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+        min_price, max_price = extract_price_range(query.lower())
+
+        matrix = np.zeros((len(candidates), len(FEATURES)), dtype=np.float64)
+        for row, p in enumerate(candidates):
+            name = normalize_search_text(p.get(self.name_key))
+            description = normalize_search_text((p.get(self.description_key) or "")[:self.description_chars])
+
+            in_name = sum(1 for t in terms if t in name)
+            in_desc = sum(1 for t in terms if t not in name and t in description)
+            if terms:
+                matrix[row, 0] = in_name / len(terms)
+                matrix[row, 1] = in_desc / len(terms)
+                matrix[row, 2] = float(in_name + in_desc == len(terms))
+                matrix[row, 3] = float(len(terms) > 1 and phrase in name)
+            if bigrams:
+                matrix[row, 4] = sum(1 for b in bigrams if b in name) / len(bigrams)
+
+            price = float(p.get(self.price_key) or 0)
+            if (min_price or max_price) and price > 0:
+                inside = (not max_price or price <= max_price) and (not min_price or price >= min_price)
+                matrix[row, 5] = 1.0 if inside else -1.0
+                if inside and max_price:
+                    matrix[row, 6] = price / max_price
+
+            matrix[row, 7] = float(any(p.get(k) for k in self.image_keys))
+            matrix[row, 8] = 1.0 / math.log2(2 + len(name.split()))
+        return matrix
+
+    def score(self, query: str, candidates: List[Dict]) -> np.ndarray:
+        if not candidates:
+            return np.zeros(0)
+        return self.features(query, candidates) @ self.weights + self.bias
+
+    def rank(self, query: str, candidates: List[Dict], top_n: int = 8) -> List[str]:
+        """IDs (as strings) of the best `top_n` candidates, best first (ties keep fetch order)"""
+        scores = self.score(query, candidates)
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [str(candidates[i][self.id_key]) for i in order]
+
+
+def fit_weights(matrices: List[np.ndarray], labels: List[np.ndarray],
+                ridge: float = 1.0) -> Dict:
+    """
+    Least-squares weights (+ bias) mapping feature rows to relevance labels
+    (e.g. 1.0 for a reference pick, 0.0 otherwise), pooled over queries.
+    Returns the RERANK_WEIGHTS file layout.
+    """
+    X = np.vstack(matrices)
+    y = np.concatenate(labels)
+    X1 = np.hstack([X, np.ones((len(X), 1))])
+    penalty = ridge * np.eye(X1.shape[1])
+    penalty[-1, -1] = 0.0  # don't shrink the bias
+    solution = np.linalg.solve(X1.T @ X1 + penalty, X1.T @ y)
+    return {"features": FEATURES, "weights": solution[:-1].tolist(), "bias": float(solution[-1])}
@@ -13,11 +13,25 @@ Components:
 import os
 import json
 import re
-from typing import Optional, List, Dict, Tuple
+import time
+import heapq
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Optional, List, Dict, Tuple
 from dataclasses import dataclass
+import numpy as np
 from openai import OpenAI
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import execute_values
+
+from db_pool import pg_connection
+from embeddings import get_embedder, embedding_document, to_pgvector
+from llm_budget import Deadline, call_with_deadline
+from tagging import BatchTagger, TagWriter, shared_tag_cache
+from ttl_cache import TTLCache
+from metrics import stage, observe_candidates
+from candidate_pool import grow_pool, pool_tiers
 
 # ============================================================
 # CONFIGURATION
@@ -26,6 +40,54 @@ from psycopg2.extras import RealDictCursor
 DATABASE_URL = os.getenv("DATABASE_URL")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# How often (seconds) the taxonomy cache checks taxonomy_version for changes
+TAXONOMY_CHECK_INTERVAL = float(os.getenv("TAXONOMY_CHECK_INTERVAL", "30"))
+
+# Candidate retrieval: "like" (substring scan), "fulltext" (tsvector + GIN)
+# or "trigram" (pg_trgm GIN on name/brand/search_tags, typo-tolerant)
+SEARCH_MODE = os.getenv("SEARCH_MODE", "like")
+
+# Filter and score on the precomputed *_norm columns (set to 1 once
+# `--normalize-products` has backfilled them); 0 keeps the LOWER() scan
+NORMALIZED_TEXT = os.getenv("NORMALIZED_TEXT", "0") == "1"
+
+# Semantic candidates: nearest products.embedding neighbours merged into the
+# keyword candidates (0 = off; needs `--migrate-vector` and embeddings)
+VECTOR_TOP_K = int(os.getenv("VECTOR_TOP_K", "0"))
+# Time allowed for the query embedding; past it the search goes keyword-only
+VECTOR_EMBED_BUDGET_MS = float(os.getenv("VECTOR_EMBED_BUDGET_MS", "500"))
+
+# Keyword candidates are streamed from a server-side cursor SEARCH_FETCH_CHUNK
+# rows at a time. In fulltext/trigram mode they come best-first and the pool
+# grows in tiers (limit * 5, x SEARCH_POOL_GROWTH, ... up to
+# SEARCH_CANDIDATE_POOL) until the top results stop changing or
+# SEARCH_POOL_BUDGET_MS is spent. Like mode is an unordered scan, not a
+# pre-ordered pool: it takes a fixed limit * 5 rows and never grows
+SEARCH_CANDIDATE_POOL = int(os.getenv("SEARCH_CANDIDATE_POOL", "1000"))
+SEARCH_POOL_GROWTH = float(os.getenv("SEARCH_POOL_GROWTH", "5"))
+SEARCH_POOL_BUDGET_MS = float(os.getenv("SEARCH_POOL_BUDGET_MS", "150"))
+SEARCH_FETCH_CHUNK = int(os.getenv("SEARCH_FETCH_CHUNK", "500"))
+
+# Chunks smaller than this are scored row by row: building the batch
+# columns costs more than NumPy saves below ~100 candidates (bench_scoring.py)
+SCORE_BATCH_MIN = int(os.getenv("SCORE_BATCH_MIN", "100"))
+
+# Typo tolerance for taxonomy matching: query words missing from the catalogue
+# vocabulary (search_vocabulary, built by --normalize-products) and one edit
+# away from a taxonomy word are corrected before matching. A correction alone
+# only boosts its keyword, it never adds a category/franchise filter (0 = off)
+TYPO_MAX_DISTANCE = int(os.getenv("TYPO_MAX_DISTANCE", "0"))
+
+# SEARCH_MODE=trigram: pg_trgm word similarity (`--migrate-trigram`) on
+# name/brand, at least this close, also counts as a keyword hit
+TRIGRAM_THRESHOLD = float(os.getenv("TRIGRAM_THRESHOLD", "0.6"))
+
+# search_api result cache: entries, seconds each stays fresh, and how often
+# (seconds) it checks products/taxonomy for changes (0 entries = off)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2000"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+SEARCH_CACHE_CHECK_INTERVAL = float(os.getenv("SEARCH_CACHE_CHECK_INTERVAL", "30"))
+
 client = OpenAI(api_key=OPENAI_API_KEY)
 
 
@@ -106,6 +168,31 @@ INSERT INTO taxonomy (keyword, category, subcategory, weight) VALUES
 ('luxury', 'Intent', 'Premium', 1.0);
 """
 
+TAXONOMY_VERSION_SCHEMA = """
+-- Run this once: bumps a single version row whenever the taxonomy changes,
+-- so app processes can detect edits with one primary-key lookup
+CREATE TABLE IF NOT EXISTS taxonomy_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+INSERT INTO taxonomy_version (id, version) VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_taxonomy_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE taxonomy_version SET version = version + 1, updated_at = NOW() WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS taxonomy_version_bump ON taxonomy;
+CREATE TRIGGER taxonomy_version_bump
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON taxonomy
+FOR EACH STATEMENT EXECUTE FUNCTION bump_taxonomy_version();
+"""
+
 
 @dataclass
 class TaxonomyMatch:
@@ -116,8 +203,8 @@ class TaxonomyMatch:
 
 
 def get_db_connection():
-    """Get PostgreSQL connection"""
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    """Borrow a pooled PostgreSQL connection: `with get_db_connection() as conn:`"""
+    return pg_connection(DATABASE_URL)
 
 
 def load_taxonomy(conn) -> Dict[str, TaxonomyMatch]:
@@ -137,6 +224,398 @@ def load_taxonomy(conn) -> Dict[str, TaxonomyMatch]:
     return taxonomy
 
 
+def load_search_vocabulary(conn) -> frozenset:
+    """Every normalized word in the catalogue, empty until --normalize-products has built it"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT token FROM search_vocabulary")
+    except (psycopg2.errors.UndefinedTable, psycopg2.errors.ObjectNotInPrerequisiteState):
+        conn.rollback()
+        return frozenset()
+    return frozenset(row['token'] for row in cursor.fetchall())
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens (same rule for queries and keywords)"""
+    return re.findall(r'\b\w+\b', text.lower())
+
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_search_text(text: Optional[str]) -> str:
+    """
+    Canonical form for matching: casefolded, accents stripped, punctuation
+    turned into single spaces. "Pokémon T-Shirt!" -> "pokemon t shirt"
+    """
+    if not text:
+        return ''
+    folded = unicodedata.normalize('NFKD', text.casefold())
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+    return _NON_WORD.sub(' ', folded).strip()
+
+
+# Query terms repeat across requests and candidates; normalize each once
+normalize_term = lru_cache(maxsize=4096)(normalize_search_text)
+
+
+def normalized_columns(product: Dict) -> Dict:
+    """The *_norm columns for a product row, as the products_normalize_text trigger writes them"""
+    text_norm = normalize_search_text(" ".join(
+        filter(None, (product.get('name'), product.get('description'), product.get('search_tags')))
+    ))
+    return {
+        'name_norm': normalize_search_text(product.get('name')),
+        'text_norm': text_norm,  # name + description + search_tags
+        'category_norm': normalize_search_text(product.get('category')),
+        'brand_norm': normalize_search_text(product.get('brand')),
+        'search_tokens': sorted(set(text_norm.split())),
+    }
+
+
+# A taxonomy keyword found in a query: (start, end, match), token positions
+# [start, end). A plain tuple - find() runs for every query.
+PhraseSpan = Tuple[int, int, TaxonomyMatch]
+
+
+class PhraseMatcher:
+    """
+    Taxonomy compiled into a token-level Aho-Corasick automaton.
+    Finds every keyword of any length in one pass over the query tokens,
+    without building n-gram strings. Compile once per taxonomy load.
+    Keywords are compiled reversed and the query is walked right to left,
+    so occurrences come out in start order with no sort.
+    """
+    
+    def __init__(self, taxonomy: Dict[str, TaxonomyMatch], vocabulary: frozenset = frozenset()):
+        self.taxonomy = taxonomy
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._terminal: List[Optional[TaxonomyMatch]] = [None]
+        self._depth: List[int] = [0]
+        
+        for key, match in taxonomy.items():
+            tokens = tokenize(key)
+            if tokens:
+                self._add(tokens[::-1], match)
+        self._build()
+        self.corrector = TermCorrector([tokenize(key) for key in taxonomy], TYPO_MAX_DISTANCE, vocabulary)
+    
+    def _add(self, tokens: List[str], match: TaxonomyMatch):
+        node = 0
+        for token in tokens:
+            nxt = self._goto[node].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(None)
+                self._depth.append(self._depth[node] + 1)
+                self._goto[node][token] = nxt
+            node = nxt
+        
+        # "t-shirt" and "t shirt" compile to the same tokens: keep one, deterministically
+        current = self._terminal[node]
+        if current is None or (-match.weight, match.keyword) < (-current.weight, current.keyword):
+            self._terminal[node] = match
+    
+    def _build(self):
+        """Breadth-first failure links; each node collects outputs of its suffixes"""
+        outputs: List[List[Tuple[int, TaxonomyMatch]]] = [[] for _ in self._goto]
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            if self._terminal[node] is not None:
+                outputs[node].append((self._depth[node], self._terminal[node]))
+            outputs[node].extend(outputs[self._fail[node]])
+            
+            for token, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(token, 0)
+                queue.append(child)
+        
+        # Shortest first: find() reverses its whole list, so longest ends up first
+        self._outputs = [tuple(reversed(o)) for o in outputs]
+    
+    def find(self, tokens: List[str]) -> List[PhraseSpan]:
+        """All keyword occurrences, ordered by start then longest first"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        found = []
+        append = found.append
+        node = 0
+        for start in range(len(tokens) - 1, -1, -1):
+            token = tokens[start]
+            nxt = goto[node].get(token)
+            while nxt is None and node:
+                node = fail[node]
+                nxt = goto[node].get(token)
+            node = nxt or 0
+            for length, match in outputs[node]:
+                append((start, start + length, match))
+        
+        # Collected by start descending, shortest first
+        found.reverse()
+        return found
+
+
+def select_spans(spans: List[PhraseSpan]) -> List[PhraseSpan]:
+    """
+    Resolve overlaps leftmost-longest: "peppa pig wellies" keeps
+    "peppa pig" and drops a standalone "pig" inside it.
+    Expects spans in PhraseMatcher.find() order.
+    """
+    selected = []
+    covered_to = 0
+    for span in spans:
+        if span[0] >= covered_to:
+            selected.append(span)
+            covered_to = span[1]
+    return selected
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Damerau (optimal string alignment) distance, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class TermCorrector:
+    """
+    SymSpell-style spelling correction over the taxonomy's words.
+    Every word (and two-word compound) is indexed under its one-letter
+    deletions, so a lookup only generates the query word's own deletions
+    and checks the few words sharing one: microseconds, no table scan, and
+    an index of about ten entries per word. Also folds accents ("pokémon")
+    and joins/splits compounds ("spiderman" <-> "spider man").
+    Only words missing from `vocabulary` (every word in the catalogue) are
+    corrected: "blue", "bots" and "coast" are real words, not typos of
+    "bluey", "boots" and "coat". No vocabulary, no fuzzy correction.
+    """
+    
+    # Shorter words are left alone; below SUBSTITUTION_MIN_LENGTH only
+    # dropped/extra letters are fixed ("pigg"), not swapped ones ("boys" != "toys")
+    MIN_LENGTH = 4
+    SUBSTITUTION_MIN_LENGTH = 6
+    
+    def __init__(self, phrases: List[List[str]], max_distance: int = 1, vocabulary: frozenset = frozenset()):
+        # Distance 2 multiplies the index by the word length; not worth it
+        self.max_distance = min(max_distance, 1) if vocabulary else 0
+        self.vocabulary = vocabulary
+        self.words = set()
+        self.compounds: Dict[str, List[str]] = {}  # "spiderman" -> ["spider", "man"]
+        for tokens in phrases:
+            self.words.update(tokens)
+            if len(tokens) > 1:
+                self.compounds.setdefault("".join(tokens), tokens)
+        self._deletes: Dict[str, List[str]] = {}
+        if self.max_distance > 0:
+            indexed = self.words | {c for c, tokens in self.compounds.items() if len(tokens) == 2}
+            for word in sorted(indexed):
+                # One letter shorter than MIN_LENGTH still catches "pigg" -> "pig"
+                if len(word) >= self.MIN_LENGTH - 1:
+                    for variant in self._variants(word):
+                        self._deletes.setdefault(variant, []).append(word)
+    
+    @staticmethod
+    def _variants(word: str) -> set:
+        return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+    
+    def lookup(self, word: str) -> Optional[str]:
+        """Closest taxonomy word or compound one edit away, else None"""
+        if len(word) < self.MIN_LENGTH or word.isdigit():
+            return None
+        best = None
+        for variant in self._variants(word):
+            for candidate in self._deletes.get(variant, ()):
+                if len(candidate) == len(word) and len(word) < self.SUBSTITUTION_MIN_LENGTH:
+                    continue
+                distance = edit_distance(word, candidate, 1)
+                if distance <= 1 and (best is None or (distance, candidate) < best):
+                    best = (distance, candidate)
+        return best[1] if best else None
+    
+    def correct(self, words: List[str], keep: set = frozenset()) -> List[Tuple[List[str], List[str], bool]]:
+        """
+        (query words, replacement tokens, fuzzy) groups covering `words` in
+        order. Known words, words in `keep` and words with no close match
+        replace themselves; two unknown-together words that are one taxonomy
+        word when joined ("spider man" -> "spiderman") form one group.
+        fuzzy marks a guessed spelling, as opposed to an exact fold or join.
+        """
+        groups = []
+        i = 0
+        while i < len(words):
+            word = words[i]
+            if i + 1 < len(words) and word + words[i + 1] in self.words \
+                    and not (word in self.words and words[i + 1] in self.words):
+                groups.append((words[i:i + 2], [word + words[i + 1]], False))
+                i += 2
+                continue
+            if word in self.words or word in keep:
+                groups.append(([word], [word], False))
+                i += 1
+                continue
+            folded = normalize_term(word)
+            if folded in self.words or folded in self.compounds:
+                groups.append(([word], self.compounds.get(folded, [folded]), False))
+            else:
+                term = self.lookup(folded) if self.max_distance > 0 and folded not in self.vocabulary else None
+                groups.append(([word], self.compounds.get(term, [term]) if term else [word], term is not None))
+            i += 1
+        return groups
+
+
+def read_taxonomy_version(conn) -> str:
+    """
+    Cheap change marker for the taxonomy.
+    Uses the taxonomy_version row when installed, otherwise falls back to a
+    row-count + created_at watermark (catches inserts/deletes, not edits).
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT version FROM taxonomy_version WHERE id = 1")
+        row = cursor.fetchone()
+        if row:
+            return f"v{row['version']}"
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
+    
+    cursor.execute("""
+        SELECT COUNT(*) AS n, MAX(created_at) AS latest
+        FROM taxonomy
+    """)
+    row = cursor.fetchone()
+    return f"w{row['n']}:{row['latest']}"
+
+
+class TaxonomyCache:
+    """
+    Process-wide taxonomy shared by every request.
+    Loads once, then only re-reads the table when the version changes.
+    Version checks are throttled to one every `check_interval` seconds.
+    """
+    
+    def __init__(self, check_interval: float = TAXONOMY_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # (taxonomy, matcher, version), replaced as a whole so readers never
+        # see a taxonomy with another version's matcher
+        self._loaded: Optional[Tuple[Dict[str, TaxonomyMatch], PhraseMatcher, str]] = None
+        self._last_check = 0.0
+        
+        # Metrics
+        self.reload_count = 0
+        self.version_checks = 0
+        self.last_reload_ms = 0.0
+        self.total_reload_ms = 0.0
+        self.last_reload_at: Optional[float] = None
+    
+    def get(self) -> Dict[str, TaxonomyMatch]:
+        """Return the cached taxonomy, reloading it if the version moved"""
+        return self._current()[0]
+    
+    def matcher(self) -> PhraseMatcher:
+        """Compiled phrase matcher for the current taxonomy"""
+        return self._current()[1]
+    
+    def loaded_matcher(self) -> Optional[PhraseMatcher]:
+        """The matcher already in memory, or None: never touches the DB, nor checks the version"""
+        loaded = self._loaded
+        return loaded[1] if loaded else None
+    
+    def _current(self) -> Tuple[Dict[str, TaxonomyMatch], PhraseMatcher, str]:
+        loaded = self._loaded
+        if loaded is not None and not self._check_due():
+            return loaded
+        
+        with self._lock:
+            if self._loaded is None:
+                # First load: nothing to serve yet, so callers wait for it
+                self._refresh()
+                self._last_check = time.monotonic()
+                return self._loaded
+            # Another thread may have checked while we waited
+            if not self._check_due():
+                return self._loaded
+            # Claim this check; other threads keep serving the current copy
+            self._last_check = time.monotonic()
+        
+        try:
+            self._refresh()
+        except Exception as e:
+            # Keep serving the last good taxonomy if the DB blips
+            print(f"Taxonomy refresh failed, serving cached copy: {e}")
+        return self._loaded
+    
+    def invalidate(self):
+        """Force a version check on the next get()"""
+        self._last_check = 0.0
+    
+    @property
+    def version(self) -> Optional[str]:
+        """Version of the taxonomy currently being served"""
+        return self._loaded[2] if self._loaded else None
+    
+    def stats(self) -> Dict:
+        return {
+            "loaded": self._loaded is not None,
+            "version": self.version,
+            "keywords": len(self._loaded[0]) if self._loaded else 0,
+            "reload_count": self.reload_count,
+            "version_checks": self.version_checks,
+            "last_reload_ms": round(self.last_reload_ms, 2),
+            "avg_reload_ms": round(self.total_reload_ms / self.reload_count, 2) if self.reload_count else 0.0,
+            "last_reload_at": self.last_reload_at,
+        }
+    
+    def _check_due(self) -> bool:
+        return time.monotonic() - self._last_check >= self.check_interval
+    
+    def _refresh(self):
+        with get_db_connection() as conn:
+            version = read_taxonomy_version(conn)
+            self.version_checks += 1
+            if self._loaded is not None and version == self._loaded[2]:
+                return
+            
+            started = time.perf_counter()
+            taxonomy = load_taxonomy(conn)
+            # Only the typo corrector needs the catalogue's words
+            vocabulary = load_search_vocabulary(conn) if TYPO_MAX_DISTANCE > 0 else frozenset()
+        
+        if TYPO_MAX_DISTANCE > 0 and not vocabulary:
+            print("TYPO_MAX_DISTANCE is set but search_vocabulary is empty: typo correction stays off")
+        
+        # Compile after the pooled connection is back, then swap in one step
+        matcher = PhraseMatcher(taxonomy, vocabulary)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._loaded = (taxonomy, matcher, version)
+        self.reload_count += 1
+        self.last_reload_ms = elapsed_ms
+        self.total_reload_ms += elapsed_ms
+        self.last_reload_at = time.time()
+        print(f"Taxonomy loaded: {len(taxonomy)} keywords (version {version}, {elapsed_ms:.1f}ms)")
+
+
+taxonomy_cache = TaxonomyCache()
+
+
 # ============================================================
 # 2. UNIFIED INTENT EXTRACTOR
 # ============================================================
@@ -155,13 +634,21 @@ class SearchIntent:
     weights: Dict[str, float]  # category → weight multiplier
 
 
-def extract_intent(query: str, taxonomy: Dict[str, TaxonomyMatch]) -> SearchIntent:
+STOP_WORDS = {'a', 'an', 'the', 'for', 'and', 'or', 'in', 'on', 'at', 'to',
+              'is', 'are', 'was', 'were', 'i', 'me', 'my', 'want', 'need',
+              'looking', 'find', 'get', 'buy', 'under', 'over', 'below', 'above'}
+
+
+def extract_intent(query: str, taxonomy: Dict[str, TaxonomyMatch],
+                   matcher: Optional[PhraseMatcher] = None) -> SearchIntent:
     """
     ONE function to extract ALL intent. No scattered if-else.
     Consults taxonomy, applies consistent weights.
+    Pass a precompiled matcher (taxonomy_cache.matcher()) on the hot path;
+    it carries the typo corrector compiled with it.
     """
     query_lower = query.lower()
-    words = re.findall(r'\b\w+\b', query_lower)
+    words = tokenize(query_lower)
     
     # Extract price constraints
     min_price, max_price = extract_price_range(query_lower)
@@ -174,40 +661,58 @@ def extract_intent(query: str, taxonomy: Dict[str, TaxonomyMatch]) -> SearchInte
     weights = {}
     keywords = []
     
-    # Check single words
-    for word in words:
-        if word in taxonomy:
-            match = taxonomy[word]
-            apply_taxonomy_match(match, matched_categories, matched_franchises, 
-                               weights, keywords)
-            if match.category == 'AgeGroup':
-                matched_age = match.subcategory
-            if match.category == 'Intent':
-                matched_intent = match.subcategory
-    
-    # Check bigrams (two-word phrases)
-    for i in range(len(words) - 1):
-        bigram = f"{words[i]} {words[i+1]}"
-        if bigram in taxonomy:
-            match = taxonomy[bigram]
-            apply_taxonomy_match(match, matched_categories, matched_franchises,
-                               weights, keywords)
-    
-    # Check trigrams
-    for i in range(len(words) - 2):
-        trigram = f"{words[i]} {words[i+1]} {words[i+2]}"
-        if trigram in taxonomy:
-            match = taxonomy[trigram]
-            apply_taxonomy_match(match, matched_categories, matched_franchises,
-                               weights, keywords)
+    if matcher is None:
+        matcher = PhraseMatcher(taxonomy)
+    
+    # Misspelt / accented / split taxonomy words ("peppa pigg", "pokémon",
+    # "spiderman") are corrected for matching; a correction only sticks
+    # if it completes a taxonomy phrase
+    groups = matcher.corrector.correct(words, STOP_WORDS)
+    corrected = [token for _, tokens, _ in groups for token in tokens]
+    spans = select_spans(matcher.find(corrected))
+    hints = []
+    if corrected != words:
+        guessed = set()
+        position = 0
+        for _, tokens, fuzzy in groups:
+            if fuzzy:
+                guessed.update(range(position, position + len(tokens)))
+            position += len(tokens)
+        
+        # A phrase resting only on guessed spellings is too weak to filter
+        # on ("plus" -> "plush"): it becomes a keyword boost instead
+        hints = [span for span in spans if guessed.issuperset(range(span[0], span[1]))]
+        spans = [span for span in spans if not guessed.issuperset(range(span[0], span[1]))]
+        
+        covered = {p for start, end, _ in spans for p in range(start, end)}
+        position = 0
+        final_words = []
+        for originals, tokens, _ in groups:
+            used = any(p in covered for p in range(position, position + len(tokens)))
+            final_words.extend(tokens if used else originals)
+            position += len(tokens)
+        words = final_words
+    
+    # Every keyword phrase, any length, one pass; overlaps resolved leftmost-longest
+    for _, _, match in spans:
+        apply_taxonomy_match(match, matched_categories, matched_franchises,
+                           weights, keywords)
+        if match.category == 'AgeGroup':
+            matched_age = match.subcategory
+        if match.category == 'Intent':
+            matched_intent = match.subcategory
+    
+    for _, _, match in hints:
+        if match.category not in ('AgeGroup', 'Intent') and match.keyword not in keywords:
+            keywords.append(match.keyword)
+            weights[match.keyword] = match.weight
     
     # Add remaining words as keywords (excluding stop words)
-    stop_words = {'a', 'an', 'the', 'for', 'and', 'or', 'in', 'on', 'at', 'to', 
-                  'is', 'are', 'was', 'were', 'i', 'me', 'my', 'want', 'need',
-                  'looking', 'find', 'get', 'buy', 'under', 'over', 'below', 'above'}
+    seen = {k.lower() for k in keywords}
     for word in words:
-        if word not in stop_words and word not in [k.lower() for k in keywords]:
+        if word not in STOP_WORDS and word not in seen:
             keywords.append(word)
+            seen.add(word)
     
     return SearchIntent(
         raw_query=query,
@@ -277,34 +782,50 @@ INTENT_CATEGORY_WEIGHTS = {
 }
 
 
+def match_text(product: Dict) -> Tuple[str, str, str, str, Callable[[str], str]]:
+    """
+    (name, name + description + search_tags, category, brand, term folding)
+    for scoring. Rows fetched with the *_norm columns use them with
+    normalize_term; others are only lowercased, as normalizing per request
+    costs far more than it saves. Normalization belongs at ingest.
+    """
+    if product.get('text_norm') is not None:
+        return (product['name_norm'], product['text_norm'], product.get('category_norm') or '',
+                product.get('brand_norm') or '', normalize_term)
+    name = (product.get('name') or '').lower()
+    return (name,
+            f"{name} {(product.get('description') or '').lower()} {(product.get('search_tags') or '').lower()}",
+            (product.get('category') or '').lower(), (product.get('brand') or '').lower(), str.lower)
+
+
 def calculate_relevance_score(product: Dict, intent: SearchIntent) -> float:
     """
     ONE scoring function. Consistent weights. No if-else branching.
+    Reads the precomputed *_norm columns when the row has them.
     """
     score = 0.0
-    name_lower = product['name'].lower()
-    desc_lower = (product.get('description') or '').lower()
-    search_tags = (product.get('search_tags') or '').lower()
-    combined_text = f"{name_lower} {desc_lower} {search_tags}"
+    name_text, combined_text, category_text, brand_text, fold = match_text(product)
     
     # 1. Keyword matches (base score)
     for keyword in intent.keywords:
         weight = intent.weights.get(keyword, 1.0)
-        if keyword in name_lower:
+        term = fold(keyword)
+        if not term:
+            continue
+        if term in name_text:
             score += 10.0 * weight  # Name match = high value
-        elif keyword in combined_text:
+        elif term in combined_text:
             score += 5.0 * weight   # Description/tags match = medium value
     
     # 2. Category match bonus
-    product_category = (product.get('category') or '').lower()
     for cat in intent.categories:
-        if cat.lower() in product_category:
+        if fold(cat) in category_text:
             score += 15.0
     
     # 3. Franchise match bonus (BIG boost when franchise specified)
-    product_brand = (product.get('brand') or '').lower()
     for franchise in intent.franchises:
-        if franchise.lower() in product_brand or franchise.lower() in name_lower:
+        term = fold(franchise)
+        if term in brand_text or term in name_text:
             score += 20.0
     
     # 4. Intent × Category weight matrix
@@ -339,22 +860,478 @@ def calculate_relevance_score(product: Dict, intent: SearchIntent) -> float:
     return score
 
 
+@dataclass
+class CandidateBatch:
+    """
+    A candidate set as text columns for score_batch(): the *_norm columns
+    when every row has them, otherwise lowercased once per request (see
+    match_text). Text columns stay Python lists: CPython's substring
+    search beats NumPy's string kernels, so only the arithmetic is vectorized.
+    """
+    names: List[str]
+    texts: List[str]  # name + description + search_tags
+    categories: List[str]
+    brands: List[str]
+    prices: np.ndarray
+    has_image: np.ndarray
+    in_stock: np.ndarray
+    fold: Callable[[str], str] = str.lower  # how query terms are folded to match
+    
+    @classmethod
+    def from_products(cls, products: List[Dict]) -> 'CandidateBatch':
+        if products and all(p.get('text_norm') is not None for p in products):
+            text = [match_text(p) for p in products]
+            names, texts, categories, brands, _ = zip(*text)
+            fold = normalize_term
+        else:
+            # Mixed or plain rows: lowercase all, so one term folding fits every row
+            names = [(p.get('name') or '').lower() for p in products]
+            texts = [f"{name} {(p.get('description') or '').lower()} {(p.get('search_tags') or '').lower()}"
+                     for name, p in zip(names, products)]
+            categories = [(p.get('category') or '').lower() for p in products]
+            brands = [(p.get('brand') or '').lower() for p in products]
+            fold = str.lower
+        return cls(
+            names=list(names),
+            texts=list(texts),
+            categories=list(categories),
+            brands=list(brands),
+            prices=np.array([p.get('price') or 0 for p in products], dtype=float),
+            has_image=np.array([bool(p.get('image_url')) for p in products], dtype=bool),
+            in_stock=np.array([bool(p.get('in_stock')) for p in products], dtype=bool),
+            fold=fold,
+        )
+    
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def _contains(texts: List[str], needle: str, among: Optional[np.ndarray] = None) -> np.ndarray:
+    """Boolean mask of texts containing needle, optionally only testing rows in `among`"""
+    if among is None:
+        return np.fromiter((needle in t for t in texts), dtype=bool, count=len(texts))
+    mask = np.zeros(len(texts), dtype=bool)
+    rows = np.flatnonzero(among)
+    mask[rows] = [needle in texts[i] for i in rows]
+    return mask
+
+
+def score_batch(batch: CandidateBatch, intent: SearchIntent) -> np.ndarray:
+    """
+    calculate_relevance_score for a whole candidate set at once.
+    Same components, applied in the same order, so scores are bit-identical.
+    """
+    scores = np.zeros(len(batch))
+    
+    # 1. Keyword matches (base score)
+    for keyword in intent.keywords:
+        weight = intent.weights.get(keyword, 1.0)
+        term = batch.fold(keyword)
+        if not term:
+            continue
+        # Name is the start of the combined text, so only text hits can be name hits
+        in_text = _contains(batch.texts, term)
+        in_name = _contains(batch.names, term, among=in_text)
+        scores += np.where(in_name, 10.0 * weight, np.where(in_text, 5.0 * weight, 0.0))
+    
+    # 2. Category match bonus
+    for cat in intent.categories:
+        scores += np.where(_contains(batch.categories, batch.fold(cat)), 15.0, 0.0)
+    
+    # 3. Franchise match bonus
+    for franchise in intent.franchises:
+        term = batch.fold(franchise)
+        hit = _contains(batch.brands, term) | _contains(batch.names, term)
+        scores += np.where(hit, 20.0, 0.0)
+    
+    # 4. Intent × Category weight matrix (same multiplier for every candidate)
+    if intent.intent_type:
+        for cat in intent.categories:
+            key = (intent.intent_type, cat)
+            if key in INTENT_CATEGORY_WEIGHTS:
+                scores *= INTENT_CATEGORY_WEIGHTS[key]
+    
+    # 5. Price relevance
+    priced = batch.prices > 0
+    if intent.max_price:
+        within = priced & (batch.prices <= intent.max_price)
+        scores += np.where(within, 5.0 * (batch.prices / intent.max_price), 0.0)
+        scores -= np.where(priced & ~within, 50.0, 0.0)
+    
+    if intent.min_price:
+        scores -= np.where(priced & (batch.prices < intent.min_price), 50.0, 0.0)
+    
+    # 6. Image availability bonus
+    scores += np.where(batch.has_image, 3.0, 0.0)
+    
+    # 7. In-stock bonus
+    scores += np.where(batch.in_stock, 5.0, 0.0)
+    
+    return scores
+
+
+class TopK:
+    """
+    Best `k` rows over a stream of scored chunks, in a bounded min-heap.
+    Ties keep arrival order, so the result matches a stable sort of the
+    whole candidate list; rows that drop out are never copied.
+    """
+    
+    def __init__(self, k: int):
+        self.k = k
+        self.seen = 0
+        self._heap: List[Tuple[float, int, Dict]] = []  # (score, -arrival, row)
+    
+    def push_chunk(self, rows: List[Dict], scores: np.ndarray):
+        # Only a chunk's own top k can make the overall top k
+        for i in np.argsort(-scores, kind='stable')[:self.k]:
+            entry = (float(scores[i]), -(self.seen + int(i)), rows[i])
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, entry)
+            elif entry[:2] > self._heap[0][:2]:
+                heapq.heapreplace(self._heap, entry)
+        self.seen += len(rows)
+    
+    def ids(self) -> List:
+        return [row['id'] for _, _, row in sorted(self._heap, key=lambda e: (-e[0], -e[1]))]
+    
+    def results(self) -> List[Dict]:
+        """Winners best first, as plain dicts"""
+        return [dict(row) for _, _, row in sorted(self._heap, key=lambda e: (-e[0], -e[1]))]
+
+
+def rank_chunk(top: TopK, rows: List[Dict], intent: SearchIntent):
+    with stage("score"):
+        if len(rows) < SCORE_BATCH_MIN:
+            scores = np.array([calculate_relevance_score(row, intent) for row in rows])
+        else:
+            scores = score_batch(CandidateBatch.from_products(rows), intent)
+        top.push_chunk(rows, scores)
+
+
 # ============================================================
 # 4. SEARCH EXECUTION (PostgreSQL + pgvector)
 # ============================================================
 
-def search_products(intent: SearchIntent, limit: int = 10) -> List[Dict]:
+FULLTEXT_SCHEMA = """
+-- Weighted full-text vector: name (A) > search_tags (B) > description (C).
+-- Adding a STORED generated column rewrites the table once, which is the backfill;
+-- new and updated rows are maintained by Postgres automatically.
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(search_tags, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_search_vector
+    ON products USING GIN (search_vector);
+
+ANALYZE products;
+"""
+
+
+NORMALIZED_TEXT_SCHEMA = """
+-- Matching text, normalized once per product instead of LOWER() per row per query.
+-- A trigger keeps the columns current on every insert and on updates of the
+-- source columns. normalize_products() backfills rows written before it existed.
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS name_norm TEXT,
+    ADD COLUMN IF NOT EXISTS text_norm TEXT,
+    ADD COLUMN IF NOT EXISTS category_norm TEXT,
+    ADD COLUMN IF NOT EXISTS brand_norm TEXT,
+    ADD COLUMN IF NOT EXISTS search_tokens TEXT[],
+    ADD COLUMN IF NOT EXISTS normalized_at TIMESTAMP;
+
+-- SQL twin of normalize_search_text(): "Pokémon T-Shirt!" -> "pokemon t shirt"
+CREATE OR REPLACE FUNCTION normalize_search_text(value TEXT) RETURNS TEXT AS $$
+    SELECT btrim(regexp_replace(unaccent(lower(coalesce(value, ''))), '[^[:alnum:]]+', ' ', 'g'))
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION normalize_product_text() RETURNS trigger AS $$
+BEGIN
+    NEW.name_norm := normalize_search_text(NEW.name);
+    NEW.text_norm := normalize_search_text(concat_ws(' ', NEW.name, NEW.description, NEW.search_tags));
+    NEW.category_norm := normalize_search_text(NEW.category);
+    NEW.brand_norm := normalize_search_text(NEW.brand);
+    NEW.search_tokens := ARRAY(SELECT DISTINCT token
+                               FROM unnest(string_to_array(NEW.text_norm, ' ')) AS token
+                               WHERE token <> '' ORDER BY token);
+    NEW.normalized_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_normalize_text ON products;
+CREATE TRIGGER products_normalize_text
+BEFORE INSERT OR UPDATE OF name, description, search_tags, category, brand ON products
+FOR EACH ROW EXECUTE FUNCTION normalize_product_text();
+
+-- Serves the keyword filter text_norm LIKE '%term%' - substring semantics,
+-- the same as the scorer's `term in text_norm`
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_text_norm_trgm
+    ON products USING GIN (text_norm gin_trgm_ops);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_products_search_tokens;
+
+-- Every word in the catalogue, for the typo corrector (TYPO_MAX_DISTANCE): a
+-- query word found here is not a typo. normalize_products() refreshes it
+CREATE MATERIALIZED VIEW IF NOT EXISTS search_vocabulary AS
+    SELECT token, COUNT(*) AS products
+    FROM products, unnest(search_tokens) AS token
+    GROUP BY token
+WITH NO DATA;
+"""
+
+
+def schema_statements(schema: str) -> List[str]:
+    """Split a schema script on ';', leaving $$-quoted function bodies whole"""
+    statements = [""]
+    for i, part in enumerate(schema.split("$$")):
+        if i % 2:
+            statements[-1] += f"$${part}$$"
+            continue
+        head, *rest = part.split(";")
+        statements[-1] += head
+        statements.extend(rest)
+    return statements
+
+
+def run_schema(schema: str):
+    """Run a schema script statement by statement, outside a transaction"""
+    with get_db_connection() as conn:
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction
+        conn.autocommit = True
+        try:
+            cursor = conn.cursor()
+            for statement in schema_statements(schema):
+                sql = "\n".join(line for line in statement.splitlines()
+                                if not line.strip().startswith("--")).strip()
+                if sql:
+                    print(f"Running: {sql.splitlines()[0]}...")
+                    started = time.perf_counter()
+                    cursor.execute(sql)
+                    print(f"  done in {time.perf_counter() - started:.1f}s")
+        finally:
+            conn.autocommit = False
+
+
+def migrate_fulltext():
+    """Add search_vector + GIN index (safe to re-run)"""
+    run_schema(FULLTEXT_SCHEMA)
+
+
+TRIGRAM_SCHEMA = """
+-- Trigram indexes over the lowercased text the keyword filters read.
+-- They serve both the existing LOWER(col) LIKE '%term%' scans and the
+-- typo-tolerant word-similarity match of SEARCH_MODE=trigram (term <% col).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_name_trgm
+    ON products USING GIN (LOWER(name) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_brand_trgm
+    ON products USING GIN (LOWER(brand) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_search_tags_trgm
+    ON products USING GIN (LOWER(search_tags) gin_trgm_ops);
+
+ANALYZE products;
+"""
+
+
+def migrate_trigram():
+    """Add pg_trgm + GIN trigram indexes on name/brand/search_tags (safe to re-run)"""
+    run_schema(TRIGRAM_SCHEMA)
+
+
+VECTOR_SCHEMA = """
+-- products.embedding is filled by generate-embeddings-fast.ts (or --embed-products).
+-- HNSW answers top-K cosine queries without the recall/lists tuning of ivfflat.
+CREATE EXTENSION IF NOT EXISTS vector;
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS embedding vector(1536);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_embedding_hnsw
+    ON products USING hnsw (embedding vector_cosine_ops);
+"""
+
+
+def migrate_vector():
+    """Add the embedding column + HNSW cosine index (safe to re-run)"""
+    run_schema(VECTOR_SCHEMA)
+
+
+def embed_products(batch_size: int = 100, embedder=None) -> int:
+    """Backfill products.embedding for rows that don't have one yet"""
+    embedder = embedder or get_embedder()
+    total = 0
+    last_id = ''
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute("""
+                SELECT id, name, description, brand, category
+                FROM products
+                WHERE id > %s AND embedding IS NULL
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            
+            vectors = embedder.embed([embedding_document(row) for row in rows])
+            execute_values(cursor, """
+                UPDATE products AS p SET embedding = v.embedding
+                FROM (VALUES %s) AS v(id, embedding)
+                WHERE p.id = v.id
+            """, [(row['id'], to_pgvector(vec)) for row, vec in zip(rows, vectors)],
+                template="(%s, %s::vector)")
+            conn.commit()
+            
+            total += len(rows)
+            last_id = rows[-1]['id']
+            print(f"Embedded {total} products with {embedder.name} (last id {last_id})")
+    
+    return total
+
+
+def normalize_products(batch_size: int = 1000) -> int:
+    """
+    Install the normalized columns and their trigger, then backfill rows
+    written before the trigger existed by touching them in id batches
+    (the trigger does the normalizing) and rebuild search_vocabulary.
+    Safe to re-run.
+    """
+    run_schema(NORMALIZED_TEXT_SCHEMA)
+    
+    total = 0
+    last_id = ''
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute("""
+                UPDATE products SET name = name
+                WHERE id IN (
+                    SELECT id FROM products
+                    WHERE id > %s AND normalized_at IS NULL
+                    ORDER BY id
+                    LIMIT %s
+                )
+                RETURNING id
+            """, (last_id, batch_size))
+            ids = sorted(row['id'] for row in cursor.fetchall())
+            conn.commit()
+            if not ids:
+                break
+            
+            total += len(ids)
+            last_id = ids[-1]
+            print(f"Normalized {total} products (last id {last_id})")
+        
+        # New words since the last run would otherwise look like typos
+        cursor.execute("REFRESH MATERIALIZED VIEW search_vocabulary")
+        conn.commit()
+        print("Refreshed search_vocabulary")
+    
+    return total
+
+
+def build_tsquery(keywords: List[str]) -> str:
+    """
+    OR of the keywords as a to_tsquery() string; multi-word keywords
+    become phrases ("peppa pig" -> peppa <-> pig). Tokens are word characters only,
+    so user input can't inject tsquery operators.
+    """
+    terms = []
+    for kw in keywords:
+        tokens = tokenize(kw)
+        if tokens:
+            terms.append(" <-> ".join(tokens) if len(tokens) > 1 else tokens[0])
+    return " | ".join(f"({t})" for t in terms)
+
+
+def embed_search_query(query: str, deadline: Deadline) -> Optional[List[float]]:
+    """
+    The query's embedding, or None if the embedder fails or misses the
+    deadline. Call it before borrowing a connection, so a slow API call
+    never holds one.
+    """
+    try:
+        return call_with_deadline(lambda timeout: get_embedder().embed_query(query, timeout=timeout),
+                                  deadline)
+    except Exception as e:
+        print(f"Query embedding failed, keyword candidates only: {e}")
+        return None
+
+
+def vector_candidates(cursor, intent: SearchIntent, vector: List[float], columns: str,
+                      k: int) -> List[Dict]:
+    """
+    Top-k in-stock products by cosine distance to the query embedding.
+    Only price filters apply: the point is recall beyond the keyword filters.
+    """
+    conditions = ["in_stock = true", "embedding IS NOT NULL"]
+    params = []
+    if intent.max_price:
+        conditions.append("price <= %s")
+        params.append(intent.max_price)
+    if intent.min_price:
+        conditions.append("price >= %s")
+        params.append(intent.min_price)
+    
+    cursor.execute(f"""
+        SELECT {columns}
+        FROM products
+        WHERE {' AND '.join(conditions)}
+        ORDER BY embedding <=> %s::vector
+        LIMIT %s
+    """, params + [to_pgvector(vector), k])
+    return cursor.fetchall()
+
+
+def search_products(intent: SearchIntent, limit: int = 10,
+                    mode: Optional[str] = None, vector_k: Optional[int] = None,
+                    pool: Optional[int] = None, deadline: Optional[Deadline] = None) -> List[Dict]:
     """
     Execute search against PostgreSQL.
     Uses taxonomy-driven filtering + relevance scoring.
     ZERO hallucination - all data from database.
+    mode="fulltext" retrieves candidates from the GIN index ranked by
+    ts_rank_cd; "like" (default) is the substring scan; "trigram" matches
+    name/search_tags substrings and misspelt names through pg_trgm.
+    vector_k > 0 adds the top-k pgvector neighbours of the query to the
+    candidates before scoring; the query is embedded first, within
+    `deadline` (default VECTOR_EMBED_BUDGET_MS), or skipped past it.
+    Keyword candidates come best cheap-score first in fulltext and trigram
+    mode (ts_rank_cd / a CASE sum over the indexed matches), and that pool
+    grows in tiers up to `pool` (default SEARCH_CANDIDATE_POOL) until the
+    top `limit` stops changing or SEARCH_POOL_BUDGET_MS runs out. Like mode
+    keeps the plain bounded scan of `pool` (default limit * 5) rows in
+    table order, as ordering it would evaluate and sort every matching
+    row; it is not adaptive. Candidates are scored chunk by chunk, holding
+    only the running top `limit`.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    mode = mode or SEARCH_MODE
+    vector_k = VECTOR_TOP_K if vector_k is None else vector_k
+    
+    # Embed before borrowing a connection: the API call must not hold one
+    vector = None
+    if vector_k > 0:
+        with stage("embed"):
+            vector = embed_search_query(intent.raw_query, deadline or Deadline(VECTOR_EMBED_BUDGET_MS))
     
     # Build WHERE clause dynamically
     conditions = ["in_stock = true"]
     params = []
+    from_clause = "products"
+    from_params = []
+    order_clause = ""
+    order_params = []
     
     # Price filters
     if intent.max_price:
@@ -365,16 +1342,55 @@ def search_products(intent: SearchIntent, limit: int = 10) -> List[Dict]:
         conditions.append("price >= %s")
         params.append(intent.min_price)
     
-    # Keyword search (name, description, search_tags)
-    if intent.keywords:
+    tsquery = build_tsquery(intent.keywords) if mode == "fulltext" else ""
+    
+    # Full-text candidates: indexed match, best-ranked first
+    if tsquery:
+        from_clause = "products, to_tsquery('english', %s) AS q"
+        from_params.append(tsquery)
+        conditions.append("search_vector @@ q")
+        order_clause = "ORDER BY ts_rank_cd(search_vector, q) DESC"
+    
+    # Typo-tolerant keyword search: every branch can use a trigram index,
+    # so description (unindexed) only counts towards the score
+    elif intent.keywords and mode == "trigram":
         keyword_conditions = []
+        rank_terms = ["CASE WHEN image_url IS NOT NULL AND image_url != '' THEN 3 ELSE 0 END"]
         for kw in intent.keywords:
+            weight = intent.weights.get(kw, 1.0)
+            pattern = f"%{kw.lower()}%"
             keyword_conditions.append(
-                "(LOWER(name) LIKE %s OR LOWER(description) LIKE %s OR LOWER(search_tags) LIKE %s)"
+                "(LOWER(name) LIKE %s OR LOWER(search_tags) LIKE %s OR %s <%% LOWER(name))"
             )
-            pattern = f"%{kw}%"
-            params.extend([pattern, pattern, pattern])
+            params.extend([pattern, pattern, kw.lower()])
+            rank_terms.append(f"CASE WHEN LOWER(name) LIKE %s THEN {10.0 * weight:g} "
+                              f"WHEN %s <%% LOWER(name) THEN {8.0 * weight:g} "
+                              f"WHEN LOWER(search_tags) LIKE %s THEN {5.0 * weight:g} ELSE 0 END")
+            order_params.extend([pattern, kw.lower(), pattern])
+        conditions.append(f"({' OR '.join(keyword_conditions)})")
+        order_clause = f"ORDER BY {' + '.join(rank_terms)} DESC"
+    
+    # Keyword search (name, description, search_tags)
+    elif intent.keywords:
+        keyword_conditions = []
+        for kw in intent.keywords:
+            if NORMALIZED_TEXT:
+                term = normalize_term(kw)
+                if not term:
+                    continue
+                # text_norm already holds name + description + search_tags;
+                # substring match like the scorer, served by its trigram index
+                keyword_conditions.append("text_norm LIKE %s")
+                params.append(f"%{term}%")
+            else:
+                keyword_conditions.append(
+                    "(LOWER(name) LIKE %s OR LOWER(description) LIKE %s OR LOWER(search_tags) LIKE %s)"
+                )
+                pattern = f"%{kw}%"
+                params.extend([pattern, pattern, pattern])
         
+        # No ORDER BY: nothing indexes a CASE sum, so sorting would read every
+        # match before the first row; the LIMIT keeps this scan bounded
         if keyword_conditions:
             conditions.append(f"({' OR '.join(keyword_conditions)})")
     
@@ -382,88 +1398,121 @@ def search_products(intent: SearchIntent, limit: int = 10) -> List[Dict]:
     if intent.categories:
         cat_conditions = []
         for cat in intent.categories:
-            cat_conditions.append("LOWER(category) LIKE %s")
-            params.append(f"%{cat.lower()}%")
+            if NORMALIZED_TEXT:
+                cat_conditions.append("category_norm LIKE %s")
+                params.append(f"%{normalize_term(cat)}%")
+            else:
+                cat_conditions.append("LOWER(category) LIKE %s")
+                params.append(f"%{cat.lower()}%")
         conditions.append(f"({' OR '.join(cat_conditions)})")
     
     # Franchise/brand filter
     if intent.franchises:
         franchise_conditions = []
         for franchise in intent.franchises:
-            franchise_conditions.append(
-                "(LOWER(brand) LIKE %s OR LOWER(name) LIKE %s)"
-            )
-            pattern = f"%{franchise.lower()}%"
+            if mode == "trigram":
+                franchise_conditions.append("(LOWER(brand) LIKE %s OR LOWER(name) LIKE %s OR %s <%% LOWER(brand))")
+                params.extend([f"%{franchise.lower()}%", f"%{franchise.lower()}%", franchise.lower()])
+                continue
+            if NORMALIZED_TEXT:
+                franchise_conditions.append("(brand_norm LIKE %s OR name_norm LIKE %s)")
+                pattern = f"%{normalize_term(franchise)}%"
+            else:
+                franchise_conditions.append(
+                    "(LOWER(brand) LIKE %s OR LOWER(name) LIKE %s)"
+                )
+                pattern = f"%{franchise.lower()}%"
             params.extend([pattern, pattern])
         conditions.append(f"({' OR '.join(franchise_conditions)})")
     
     where_clause = " AND ".join(conditions)
     
+    # Growing the pool until the top settles only means something when rows
+    # come best-first; an unordered scan would compare random samples
+    if order_clause:
+        pool = pool or SEARCH_CANDIDATE_POOL
+        tiers = pool_tiers(limit * 5, pool, SEARCH_POOL_GROWTH)
+    else:
+        pool = pool or limit * 5
+        tiers = (pool,)
+    
+    # Normalized rows carry their matching text, so the scorer does no string work
+    norm_columns = ", name_norm, text_norm, category_norm, brand_norm" if NORMALIZED_TEXT else ""
+    
+    columns = f"""id, name, description, price, currency, merchant, merchant_id,
+               category, brand, affiliate_link, image_url, in_stock, search_tags{norm_columns}"""
+    
     # Fetch candidates (get more than needed for re-ranking)
     query = f"""
-        SELECT id, name, description, price, currency, merchant, merchant_id,
-               category, brand, affiliate_link, image_url, in_stock, search_tags
-        FROM products
+        SELECT {columns}
+        FROM {from_clause}
         WHERE {where_clause}
+        {order_clause}
         LIMIT %s
     """
-    params.append(limit * 5)  # Fetch 5x for re-ranking
+    params = from_params + params + order_params
+    params.append(pool)
     
-    cursor.execute(query, params)
-    candidates = cursor.fetchall()
-    conn.close()
+    top = TopK(limit)
+    seen = set()
     
-    # Score and rank
-    scored_products = []
-    for product in candidates:
-        score = calculate_relevance_score(dict(product), intent)
-        scored_products.append((score, dict(product)))
+    def consume(rows: List[Dict]):
+        if vector_k > 0:
+            seen.update(row['id'] for row in rows)
+        rank_chunk(top, rows, intent)
     
-    # Sort by score descending
-    scored_products.sort(key=lambda x: x[0], reverse=True)
+    with get_db_connection() as conn:
+        # Named cursor: rows stay on the server until fetched, so memory is
+        # one chunk plus the heap however large the pool
+        if mode == "trigram":
+            conn.cursor().execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                                  [str(TRIGRAM_THRESHOLD)])
+        cursor = conn.cursor(name="search_candidates")
+        cursor.itersize = SEARCH_FETCH_CHUNK
+        try:
+            with stage("sql"):
+                cursor.execute(query, params)
+            grow_pool(cursor.fetchmany, consume, top.ids,
+                      tiers, SEARCH_POOL_BUDGET_MS, "search", SEARCH_FETCH_CHUNK)
+        finally:
+            cursor.close()
+        
+        # Semantic neighbours the keyword filters missed
+        if vector is not None:
+            with stage("vector"):
+                neighbours = vector_candidates(conn.cursor(), intent, vector, columns, vector_k)
+            observe_candidates(len(neighbours), "vector")
+            neighbours = [c for c in neighbours if c['id'] not in seen]
+            if neighbours:
+                rank_chunk(top, neighbours, intent)
     
     # Return top N
-    return [p[1] for p in scored_products[:limit]]
+    return top.results()
 
 
 # ============================================================
 # 5. SEARCH TAGS GENERATOR (Run once on all products)
 # ============================================================
 
-def generate_search_tags(product: Dict) -> str:
-    """
-    Generate searchable tags from product description.
-    Run this ONCE on all 115k products, store in search_tags column.
-    """
-    name = product.get('name', '')
-    description = product.get('description', '')
-    
-    if not description or len(description) < 20:
-        return ''
-    
-    prompt = f"""Extract searchable keywords from this product. Return ONLY a comma-separated list of:
+SEARCH_TAG_INSTRUCTIONS = """Extract searchable keywords from products. Return ONLY comma-separated keywords:
 - Age groups (baby, toddler, kids, teens)
 - Use cases (outdoor, indoor, educational, creative)
 - Key features (waterproof, wooden, electronic)
 - Gift occasions (birthday, christmas)
-- Any franchise/character names
+- Any franchise/character names"""
 
-Product: {name}
-Description: {description[:500]}
+# Several products per request; the instruction block is sent once per batch.
+# Shares the response cache with generate_search_tags (keys include the prompt).
+search_tagger = BatchTagger(client, SEARCH_TAG_INSTRUCTIONS, description_chars=500,
+                            max_tokens_per_product=100, cache=shared_tag_cache())
 
-Keywords only, no explanation:"""
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            max_tokens=100
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Error generating tags: {e}")
-        return ''
+def generate_search_tags(product: Dict) -> str:
+    """
+    Generate searchable tags from product description.
+    Run this ONCE on all 115k products, store in search_tags column.
+    """
+    return search_tagger.tag_one(product).tags or ''
 
 
 def batch_generate_search_tags(batch_size: int = 100):
@@ -471,53 +1520,242 @@ def batch_generate_search_tags(batch_size: int = 100):
     Process all products without search_tags.
     Run this as a one-time job.
     """
-    conn = get_db_connection()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Get products needing tags
+        cursor.execute("""
+            SELECT id, name, description 
+            FROM products 
+            WHERE search_tags IS NULL OR search_tags = ''
+            LIMIT %s
+        """, (batch_size,))
+        
+        products = cursor.fetchall()
+        
+        with TagWriter(conn) as writer:
+            for result in search_tagger.tag([dict(p) for p in products]):
+                product, tags = result.product, result.tags or ''
+                writer.add(product['id'], tags)
+                print(f"Tagged: {product['name'][:50]}... → {tags[:50]}...")
+    print(f"Processed {len(products)} products ({search_tagger.stats()['tokens_per_product']} tokens/product)")
+
+
+# ============================================================
+# 6. API ENDPOINT
+# ============================================================
+
+PRODUCTS_VERSION_SCHEMA = """
+-- Run this once (--migrate-products-version): bumps a single version row whenever
+-- products change (imports, deletes, price/stock and listing edits), so the search
+-- result cache can tell its entries are stale with one primary-key lookup.
+-- Writes touching only search_tags (TagWriter flushes) or derived columns don't
+-- bump it - cached results pick those up when they expire (SEARCH_CACHE_TTL)
+CREATE TABLE IF NOT EXISTS products_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+INSERT INTO products_version (id, version) VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_products_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE products_version SET version = version + 1, updated_at = NOW() WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_version_bump ON products;
+CREATE TRIGGER products_version_bump
+AFTER INSERT OR DELETE OR TRUNCATE
+    OR UPDATE OF name, description, price, currency, merchant, merchant_id, category, brand,
+                 affiliate_link, image_url, in_stock
+ON products
+FOR EACH STATEMENT EXECUTE FUNCTION bump_products_version();
+"""
+
+
+def migrate_products_version():
+    """Install the products_version row and its trigger"""
+    run_schema(PRODUCTS_VERSION_SCHEMA)
+
+
+def read_products_version(conn) -> str:
+    """
+    Cheap change marker for the products table.
+    Uses the products_version row when installed, otherwise falls back to
+    the table's write counters in pg_stat_user_tables (updated with a short lag).
+    """
     cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT version FROM products_version WHERE id = 1")
+        row = cursor.fetchone()
+        if row:
+            return f"v{row['version']}"
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
     
-    # Get products needing tags
     cursor.execute("""
-        SELECT id, name, description 
-        FROM products 
-        WHERE search_tags IS NULL OR search_tags = ''
-        LIMIT %s
-    """, (batch_size,))
+        SELECT n_tup_ins + n_tup_upd + n_tup_del AS writes
+        FROM pg_stat_user_tables
+        WHERE relname = 'products'
+    """)
+    row = cursor.fetchone()
+    return f"w{row['writes'] if row else 0}"
+
+
+def intent_cache_key(intent: SearchIntent, limit: int, mode: Optional[str] = None,
+                     vector_k: Optional[int] = None) -> Tuple:
+    """
+    Result-cache key built from the parsed intent, not the raw string, so
+    word order, case, accents and "£" don't split entries:
+    "Disney trainers under £20" and "trainers disney under 20" share one.
+    """
+    mode = mode or SEARCH_MODE
+    vector_k = VECTOR_TOP_K if vector_k is None else vector_k
+    key = (
+        tuple(sorted({normalize_term(k) for k in intent.keywords} - {''})),
+        tuple(sorted(intent.categories)),
+        tuple(sorted(intent.franchises)),
+        intent.age_group,
+        intent.intent_type,
+        intent.min_price,
+        intent.max_price,
+        tuple(sorted(intent.weights.items())),
+        limit,
+        mode,
+        NORMALIZED_TEXT,
+        vector_k,
+    )
+    if vector_k > 0:
+        # Semantic candidates come from the query text itself
+        key += (tuple(sorted(set(normalize_search_text(intent.raw_query).split()))),)
+    return key
+
+
+class SearchResultCache:
+    """
+    Bounded, expiring cache of ranked products per intent key.
+    Cleared as a whole when the products or taxonomy version moves;
+    version checks are throttled to one every `check_interval` seconds.
+    """
     
-    products = cursor.fetchall()
+    def __init__(self, max_size: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL,
+                 check_interval: float = SEARCH_CACHE_CHECK_INTERVAL):
+        self.enabled = max_size > 0
+        self.check_interval = check_interval
+        self.results = TTLCache(max_size=max(1, max_size), ttl=ttl)
+        self._lock = threading.Lock()
+        self._products_version: Optional[str] = None
+        self._taxonomy_version: Optional[str] = None
+        self._last_check = 0.0
+        
+        # Metrics
+        self.invalidations = 0
+        self.version_checks = 0
     
-    for product in products:
-        tags = generate_search_tags(dict(product))
-        cursor.execute(
-            "UPDATE products SET search_tags = %s WHERE id = %s",
-            (tags, product['id'])
-        )
-        print(f"Tagged: {product['name'][:50]}... → {tags[:50]}...")
+    def get(self, key: Tuple) -> Optional[List[Dict]]:
+        if not self.enabled:
+            return None
+        self._check_versions()
+        return self.results.get(key)
+    
+    def set(self, key: Tuple, products: List[Dict]):
+        if self.enabled:
+            self.results.set(key, products)
+    
+    def invalidate(self):
+        """Drop every cached result (e.g. right after a bulk import)"""
+        self.results.clear()
+        self.invalidations += 1
     
-    conn.commit()
-    conn.close()
-    print(f"Processed {len(products)} products")
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            **self.results.stats(),
+            "invalidations": self.invalidations,
+            "version_checks": self.version_checks,
+            "products_version": self._products_version,
+            "taxonomy_version": self._taxonomy_version,
+        }
+    
+    def _check_versions(self):
+        # The taxonomy cache does its own throttled polling; just compare
+        taxonomy_version = taxonomy_cache.version
+        if taxonomy_version != self._taxonomy_version:
+            with self._lock:
+                if taxonomy_version != self._taxonomy_version:
+                    if self._taxonomy_version is not None:
+                        self.invalidate()
+                    self._taxonomy_version = taxonomy_version
+        
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._last_check < self.check_interval:
+                return
+            try:
+                with get_db_connection() as conn:
+                    version = read_products_version(conn)
+                self.version_checks += 1
+            except Exception as e:
+                # Entries still expire by TTL; try again next interval
+                print(f"Products version check failed: {e}")
+                version = self._products_version
+            if version != self._products_version:
+                if self._products_version is not None:
+                    self.invalidate()
+                self._products_version = version
+            self._last_check = time.monotonic()
 
 
-# ============================================================
-# 6. API ENDPOINT
-# ============================================================
+search_cache = SearchResultCache()
 
-def search_api(query: str, limit: int = 8) -> Dict:
+
+def format_product(p: Dict) -> Dict:
+    """Public shape of one product in API responses"""
+    return {
+        "id": p['id'],
+        "name": p['name'],
+        "description": (p.get('description') or '')[:200],
+        "price": p['price'],
+        "currency": p.get('currency', 'GBP'),
+        "merchant": p['merchant'],
+        "brand": p.get('brand'),
+        "category": p.get('category'),
+        "affiliateLink": p['affiliate_link'],
+        "imageUrl": p.get('image_url'),
+        "inStock": p.get('in_stock', True)
+    }
+
+
+def cached_search_api(query: str, limit: int = 8, use_cache: bool = True) -> Tuple[Dict, bool]:
     """
-    Main API entry point.
-    Returns structured response with products.
+    search_api plus whether the products came from the result cache.
+    Intent extraction always runs (it's cheap with the compiled matcher),
+    so the response echoes this query's own intent either way.
     """
-    conn = get_db_connection()
-    taxonomy = load_taxonomy(conn)
-    conn.close()
+    with stage("taxonomy"):
+        matcher = taxonomy_cache.matcher()
     
     # Extract intent using taxonomy
-    intent = extract_intent(query, taxonomy)
+    with stage("intent"):
+        intent = extract_intent(query, matcher.taxonomy, matcher)
     
-    # Search products
-    products = search_products(intent, limit)
+    key = intent_cache_key(intent, limit)
+    with stage("cache"):
+        products = search_cache.get(key) if use_cache else None
+    hit = products is not None
+    if not hit:
+        # Search products
+        products = [format_product(p) for p in search_products(intent, limit)]
+        if use_cache:
+            search_cache.set(key, products)
     
     # Format response
-    return {
+    response = {
         "query": query,
         "intent": {
             "keywords": intent.keywords,
@@ -530,24 +1768,19 @@ def search_api(query: str, limit: int = 8) -> Dict:
                 "max": intent.max_price
             }
         },
-        "products": [
-            {
-                "id": p['id'],
-                "name": p['name'],
-                "description": (p.get('description') or '')[:200],
-                "price": p['price'],
-                "currency": p.get('currency', 'GBP'),
-                "merchant": p['merchant'],
-                "brand": p.get('brand'),
-                "category": p.get('category'),
-                "affiliateLink": p['affiliate_link'],
-                "imageUrl": p.get('image_url'),
-                "inStock": p.get('in_stock', True)
-            }
-            for p in products
-        ],
+        # Copies: callers may mutate the response, the cache entry must not change
+        "products": [dict(p) for p in products],
         "count": len(products)
     }
+    return response, hit
+
+
+def search_api(query: str, limit: int = 8) -> Dict:
+    """
+    Main API entry point.
+    Returns structured response with products.
+    """
+    return cached_search_api(query, limit)[0]
 
 
 # ============================================================
@@ -555,6 +1788,49 @@ def search_api(query: str, limit: int = 8) -> Dict:
 # ============================================================
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Sunny search engine')
+    parser.add_argument('--migrate-fulltext', action='store_true',
+                        help='Add the search_vector column and GIN index')
+    parser.add_argument('--migrate-trigram', action='store_true',
+                        help='Add pg_trgm GIN indexes on name/brand/search_tags (SEARCH_MODE=trigram)')
+    parser.add_argument('--migrate-products-version', action='store_true',
+                        help='Add the products_version row and trigger (search result cache invalidation)')
+    parser.add_argument('--normalize-products', action='store_true',
+                        help='Backfill/refresh the normalized text columns and search_vocabulary')
+    parser.add_argument('--migrate-vector', action='store_true',
+                        help='Add the embedding column and HNSW index')
+    parser.add_argument('--embed-products', action='store_true',
+                        help='Backfill missing product embeddings (EMBEDDER picks the model)')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='Rows per batch for --normalize-products / --embed-products')
+    args = parser.parse_args()
+    
+    if args.migrate_fulltext:
+        migrate_fulltext()
+        raise SystemExit(0)
+    
+    if args.migrate_trigram:
+        migrate_trigram()
+        raise SystemExit(0)
+    
+    if args.migrate_vector:
+        migrate_vector()
+        raise SystemExit(0)
+    
+    if args.migrate_products_version:
+        migrate_products_version()
+        raise SystemExit(0)
+    
+    if args.embed_products:
+        embed_products(args.batch_size or 100)
+        raise SystemExit(0)
+    
+    if args.normalize_products:
+        normalize_products(args.batch_size or 1000)
+        raise SystemExit(0)
+    
     # Test the search
     test_queries = [
         "Disney trainers for toddler under £20",
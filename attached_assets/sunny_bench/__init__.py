@@ -0,0 +1,29 @@
+"""
+Sunny Benchmark Suite
+=====================
+Reproducible load for the three search paths, on a synthetic affiliate
+catalog instead of production data:
+
+- catalog: deterministic catalog generator (115k to 5M+ products) written
+  to SQLite (main_2's layout) and/or Postgres (search_engine's columns
+  plus the Awin columns sunnyneqbasif reads, in one products table)
+- queries: seeded query mix - franchise, price, age, gift and plain
+- stubs: in-process stand-in for the OpenAI client (query parses and
+  re-rank picks after a configurable latency), so runs cost nothing and
+  LLM latency is a controlled variable
+- runner: replays the mix through search_api, main_2 or sunnyneqbasif at
+  a given concurrency; reports throughput, latency percentiles (overall,
+  per query kind and per stage) and peak RSS, saved as JSON per run
+
+Usage (from attached_assets/):
+    python -m sunny_bench generate --size 115k --sqlite bench_products.db
+    python -m sunny_bench generate --size 1m --postgres postgresql://localhost/sunny_bench --replace
+    python -m sunny_bench run --target main_2 --sqlite bench_products.db --queries 2000 --concurrency 8
+    python -m sunny_bench run --target search_api --postgres postgresql://localhost/sunny_bench
+    python -m sunny_bench compare bench_results/*.json
+"""
+
+from sunny_bench.catalog import generate_products, parse_size, write_sqlite, write_postgres
+from sunny_bench.queries import QUERY_MIX, query_mix
+from sunny_bench.stubs import StubOpenAI, install_stub_llm
+from sunny_bench.runner import run_benchmark, save_result, compare_results
@@ -0,0 +1,64 @@
+import argparse
+
+from sunny_bench.catalog import parse_size, write_postgres, write_sqlite
+from sunny_bench.queries import query_mix
+from sunny_bench.runner import TARGETS, compare_results, print_result, run_benchmark, save_result
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="sunny_bench", description="Sunny search benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Write a synthetic catalog")
+    generate.add_argument("--size", default="115k", help="Products: 115k, 1m, 5M, ...")
+    generate.add_argument("--seed", type=int, default=42)
+    generate.add_argument("--sqlite", help="SQLite file (main_2 layout)")
+    generate.add_argument("--postgres", help="Postgres DSN of a dedicated benchmark database")
+    generate.add_argument("--replace", action="store_true", help="Overwrite an existing products table")
+
+    run = commands.add_parser("run", help="Replay a query mix through one search path")
+    run.add_argument("--target", choices=TARGETS, required=True)
+    run.add_argument("--sqlite", help="Catalog for main_2")
+    run.add_argument("--postgres", help="Catalog for search_api / sunny (sets DATABASE_URL)")
+    run.add_argument("--queries", type=int, default=1000)
+    run.add_argument("--seed", type=int, default=7)
+    run.add_argument("--repeat-share", type=float, default=0.3, help="Share of repeated queries")
+    run.add_argument("--concurrency", type=int, default=1)
+    run.add_argument("--warmup", type=int, default=20)
+    run.add_argument("--limit", type=int, default=8)
+    run.add_argument("--no-cache", action="store_true", help="Bypass the query / result / re-rank caches")
+    run.add_argument("--reranker", choices=["local", "gpt"], help="sunny only (default RERANKER)")
+    run.add_argument("--llm-latency", type=float, default=0.3, help="Stub LLM seconds per call")
+    run.add_argument("--llm-jitter", type=float, default=0.1)
+    run.add_argument("--out", default="bench_results", help="Directory for the result JSON")
+    run.add_argument("--name", help="Result file name (default: target-commit-concurrency-time)")
+
+    compare = commands.add_parser("compare", help="Compare saved runs (deltas vs the first)")
+    compare.add_argument("results", nargs="+")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        if not args.sqlite and not args.postgres:
+            parser.error("generate needs --sqlite and/or --postgres")
+        count = parse_size(args.size)
+        if args.sqlite:
+            write_sqlite(args.sqlite, count, args.seed, args.replace)
+        if args.postgres:
+            write_postgres(args.postgres, count, args.seed, args.replace)
+
+    elif args.command == "run":
+        queries = query_mix(args.queries + args.warmup, args.seed, args.repeat_share)
+        result = run_benchmark(args.target, queries, sqlite=args.sqlite, postgres=args.postgres,
+                               concurrency=args.concurrency, warmup=args.warmup, limit=args.limit,
+                               use_cache=not args.no_cache, reranker=args.reranker,
+                               llm_latency=args.llm_latency, llm_jitter=args.llm_jitter)
+        print_result(result)
+        print(f"\nSaved {save_result(result, args.out, args.name)}")
+
+    else:
+        compare_results(args.results)
+
+
+if __name__ == "__main__":
+    main()
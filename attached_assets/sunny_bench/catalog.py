@@ -0,0 +1,258 @@
+"""
+Synthetic affiliate catalog: franchise / category / age / price mixes
+shaped like the Awin + CJ feeds, identical for a given (size, seed).
+"""
+
+import io
+import re
+import time
+import random
+import sqlite3
+from typing import Dict, Iterator
+
+FRANCHISES = {
+    "Disney": ["Frozen", "Toy Story", "Minnie Mouse", "Mickey Mouse", "Encanto"],
+    "Marvel": ["Spider-Man", "Avengers", "Spiderman"],
+    "Peppa Pig": [],
+    "Paw Patrol": [],
+    "Bluey": [],
+    "Harry Potter": [],
+    "Pokemon": ["Pikachu"],
+    "LEGO": ["LEGO City", "LEGO Friends", "LEGO Star Wars"],
+}
+
+PRODUCT_TYPES = {
+    "Footwear": ["Trainers", "Wellies", "Slippers", "Sandals", "Boots", "Sneakers"],
+    "Toys": ["Plush Toy", "Puzzle", "Board Game", "Action Figure", "Doll", "Building Set",
+             "Play Set", "Teddy", "Ride-On", "Kitchen Play Set"],
+    "Clothing": ["T-Shirt", "Pyjamas", "Dress", "Hoodie", "Jacket", "Coat", "Swimsuit"],
+    "Baby": ["Sleepsuit", "Baby Gift Set", "Teether", "Bib Set", "Baby Blanket"],
+    "Books": ["Story Book", "Activity Book", "Sticker Book"],
+    "Outdoor": ["Paddling Pool", "Scooter", "Garden Swing", "Trampoline", "Water Pistol"],
+}
+
+# (category share of the catalog, price range in GBP)
+CATEGORY_MIX = {"Toys": (0.34, (3, 120)), "Clothing": (0.22, (4, 60)), "Footwear": (0.14, (8, 70)),
+                "Baby": (0.12, (4, 50)), "Books": (0.08, (2, 20)), "Outdoor": (0.10, (8, 300))}
+
+ADJECTIVES = ["Kids", "Girls", "Boys", "Unisex", "Deluxe", "Mini", "Classic", "Light-Up", "Wooden",
+              "Soft", "Personalised", "Glitter", "Pink", "Blue", "Rainbow", "Waterproof"]
+AGES = ["baby", "toddler", "ages 3+", "ages 5-8", "ages 8+", "teen", "kids"]
+MERCHANTS = ["Smyths", "Argos", "John Lewis", "Next", "M&S", "Boots", "Zavvi", "Debenhams",
+             "BrandAlley", "Clarks", "Very", "Hamleys", "The Entertainer", "Matalan"]
+GENERIC_BRANDS = ["Hasbro", "Mattel", "Melissa & Doug", "Clarks", "Next", "Crayola", "VTech", None]
+
+# Postgres layout: search_engine's products columns plus the Awin columns
+# sunnyneqbasif reads, so one table serves every target
+POSTGRES_COLUMNS = ["id", "name", "description", "price", "currency", "merchant", "merchant_id",
+                    "category", "brand", "affiliate_link", "image_url", "in_stock", "search_tags",
+                    "aw_product_id", "product_name", "search_price", "merchant_name",
+                    "aw_deep_link", "merchant_image_url", "aw_image_url"]
+
+POSTGRES_SCHEMA = """
+CREATE TABLE products (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    price NUMERIC(10, 2),
+    currency TEXT DEFAULT 'GBP',
+    merchant TEXT,
+    merchant_id TEXT,
+    category TEXT,
+    brand TEXT,
+    affiliate_link TEXT,
+    image_url TEXT,
+    in_stock BOOLEAN DEFAULT true,
+    search_tags TEXT,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    aw_product_id TEXT,
+    product_name TEXT,
+    search_price NUMERIC(10, 2),
+    merchant_name TEXT,
+    aw_deep_link TEXT,
+    merchant_image_url TEXT,
+    aw_image_url TEXT
+)
+"""
+
+SQLITE_SCHEMA = """
+CREATE TABLE products (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    price REAL,
+    currency TEXT,
+    merchant TEXT,
+    merchant_id TEXT,
+    category TEXT,
+    brand TEXT,
+    affiliate_link TEXT,
+    image_url TEXT,
+    in_stock INTEGER
+)
+"""
+SQLITE_COLUMNS = ["id", "name", "description", "price", "currency", "merchant", "merchant_id",
+                  "category", "brand", "affiliate_link", "image_url", "in_stock"]
+
+
+def parse_size(size: str) -> int:
+    """'115k' -> 115000, '5M' -> 5000000, '2500' -> 2500"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([kKmM]?)\s*', str(size))
+    if not match:
+        raise ValueError(f"Bad catalog size: {size!r}")
+    return int(float(match.group(1)) * {"": 1, "k": 1_000, "m": 1_000_000}[match.group(2).lower()])
+
+
+def generate_products(count: int, seed: int = 42) -> Iterator[Dict]:
+    """`count` products; the same (count, seed) always yields the same rows"""
+    rng = random.Random(seed)
+    categories = list(CATEGORY_MIX)
+    shares = [CATEGORY_MIX[c][0] for c in categories]
+    franchises = list(FRANCHISES)
+
+    for i in range(count):
+        category = rng.choices(categories, shares)[0]
+        low, high = CATEGORY_MIX[category][1]
+        product_type = rng.choice(PRODUCT_TYPES[category])
+
+        franchise = rng.choice(franchises) if rng.random() < 0.35 else None
+        line = rng.choice(FRANCHISES[franchise]) if franchise and FRANCHISES[franchise] and rng.random() < 0.5 else None
+        brand = franchise or rng.choice(GENERIC_BRANDS)
+
+        words = [rng.choice(ADJECTIVES)] if rng.random() < 0.6 else []
+        words += [line or franchise] if franchise else []
+        words.append(product_type)
+        name = " ".join(words)
+        if rng.random() < 0.3:
+            name += f" - {rng.choice(['Size', 'Age', 'Pack of'])} {rng.randint(2, 12)}"
+
+        age = rng.choice(AGES)
+        description = (f"{name} for {age}. "
+                       + rng.choice(["Perfect birthday gift.", "Great for Christmas.", "Everyday favourite.",
+                                     "Machine washable.", "Batteries not included.", ""])
+                       + " " + " ".join(rng.choice(ADJECTIVES + PRODUCT_TYPES[category]).lower()
+                                        for _ in range(rng.randint(5, 40))))
+        # Skewed prices: most items cheap, a long tail of expensive ones
+        price = round(min(high, low + (high - low) * rng.random() ** 2.2), 2)
+        merchant = rng.choice(MERCHANTS)
+        merchant_id = str(1000 + MERCHANTS.index(merchant))
+        product_id = f"B{i:08d}"
+        link = f"https://www.awin1.com/pclick.php?p={product_id}&m={merchant_id}"
+        image = f"https://images.example.com/{product_id}.jpg" if rng.random() < 0.9 else None
+        tags = ", ".join(dict.fromkeys(w.lower() for w in [product_type, category, franchise or "", age]
+                                       if w)) if rng.random() < 0.7 else None
+
+        yield {
+            "id": product_id,
+            "name": name,
+            "description": description,
+            "price": price,
+            "currency": "GBP",
+            "merchant": merchant,
+            "merchant_id": merchant_id,
+            "category": category,
+            "brand": brand,
+            "affiliate_link": link,
+            "image_url": image,
+            "in_stock": rng.random() < 0.92,
+            "search_tags": tags,
+            # Awin layout (sunnyneqbasif)
+            "aw_product_id": product_id,
+            "product_name": name,
+            "search_price": price,
+            "merchant_name": merchant,
+            "aw_deep_link": link,
+            "merchant_image_url": image,
+            "aw_image_url": None,
+        }
+
+
+def write_sqlite(path: str, count: int, seed: int = 42, replace: bool = False,
+                 batch_size: int = 10_000) -> int:
+    """Write the catalog to a SQLite file in main_2's products layout"""
+    started = time.perf_counter()
+    conn = sqlite3.connect(path)
+    try:
+        exists = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'products'").fetchone()
+        if exists and not replace:
+            raise SystemExit(f"{path} already has a products table (pass --replace to overwrite)")
+        conn.execute("DROP TABLE IF EXISTS products_fts")
+        conn.execute("DROP TABLE IF EXISTS products")
+        conn.execute(SQLITE_SCHEMA)
+
+        insert = f"INSERT INTO products ({', '.join(SQLITE_COLUMNS)}) VALUES ({', '.join('?' * len(SQLITE_COLUMNS))})"
+        batch = []
+        for product in generate_products(count, seed):
+            batch.append(tuple(int(product[c]) if c == "in_stock" else product[c] for c in SQLITE_COLUMNS))
+            if len(batch) >= batch_size:
+                conn.executemany(insert, batch)
+                batch = []
+        if batch:
+            conn.executemany(insert, batch)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"SQLite: {count:,} products -> {path} in {time.perf_counter() - started:.1f}s")
+    return count
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).replace("\\", "\\\\").replace("\t", " ").replace("\n", " ")
+
+
+def write_postgres(dsn: str, count: int, seed: int = 42, replace: bool = False,
+                   batch_size: int = 50_000) -> int:
+    """
+    COPY the catalog into `products` (plus the search_engine taxonomy) on
+    a dedicated benchmark database. Refuses to touch an existing products
+    table unless replace=True.
+    """
+    import os
+    import psycopg2
+
+    # search_engine builds an OpenAI client at import; no calls are made here
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    from search_engine import TAXONOMY_SCHEMA, TAXONOMY_VERSION_SCHEMA
+
+    started = time.perf_counter()
+    conn = psycopg2.connect(dsn)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass('public.products') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            if not replace:
+                raise SystemExit("products already exists on that database (pass --replace to overwrite)")
+            cursor.execute("DROP TABLE products")
+        cursor.execute(POSTGRES_SCHEMA)
+
+        copy_sql = f"COPY products ({', '.join(POSTGRES_COLUMNS)}) FROM STDIN"
+        buffer = io.StringIO()
+        rows = 0
+        for product in generate_products(count, seed):
+            buffer.write("\t".join(_copy_value(product[c]) for c in POSTGRES_COLUMNS) + "\n")
+            rows += 1
+            if rows % batch_size == 0:
+                buffer.seek(0)
+                cursor.copy_expert(copy_sql, buffer)
+                buffer = io.StringIO()
+                print(f"  {rows:,} / {count:,}")
+        buffer.seek(0)
+        cursor.copy_expert(copy_sql, buffer)
+
+        cursor.execute("SELECT to_regclass('public.taxonomy') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            cursor.execute(TAXONOMY_SCHEMA)
+            cursor.execute(TAXONOMY_VERSION_SCHEMA)
+        conn.commit()
+
+        conn.autocommit = True
+        cursor.execute("ANALYZE products")
+    finally:
+        conn.close()
+    print(f"Postgres: {count:,} products in {time.perf_counter() - started:.1f}s "
+          f"(run search_engine's --migrate-* / --normalize-products for the optional indexes)")
+    return count
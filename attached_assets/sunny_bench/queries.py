@@ -0,0 +1,58 @@
+"""
+Seeded query mix over the catalog vocabulary, shaped like the traffic
+in test-queries-2000: franchise lookups, price caps, age filters, gift
+searches and plain product-type searches.
+"""
+
+import random
+from typing import List, Tuple
+
+from sunny_bench.catalog import ADJECTIVES, FRANCHISES, PRODUCT_TYPES
+
+# kind -> share of the mix
+QUERY_MIX = {"franchise": 0.35, "price": 0.2, "age": 0.15, "gift": 0.15, "plain": 0.15}
+
+AGE_PHRASES = ["for toddler", "for baby", "for 3 year old", "for 5 year old", "age 8",
+               "for teens", "for kids"]
+GIFT_PHRASES = ["birthday gift for {who}", "christmas present for {who}", "gift ideas for {who}",
+                "stocking fillers for {who}"]
+GIFT_WHO = ["a 4 year old", "toddler", "new baby", "8 year old boy", "girl age 6", "kids"]
+
+
+def _product_type(rng: random.Random) -> str:
+    return rng.choice(rng.choice(list(PRODUCT_TYPES.values()))).lower()
+
+
+def make_query(kind: str, rng: random.Random) -> str:
+    franchise = rng.choice(list(FRANCHISES))
+    line = rng.choice(FRANCHISES[franchise] or [franchise])
+    if kind == "franchise":
+        return f"{rng.choice([franchise, line])} {_product_type(rng)}"
+    if kind == "price":
+        cap = rng.choice([5, 10, 15, 20, 25, 30, 50])
+        subject = rng.choice([_product_type(rng), f"{line} {_product_type(rng)}"])
+        return rng.choice([f"{subject} under £{cap}", f"cheap {subject} under {cap} pounds",
+                           f"{subject} below £{cap}"])
+    if kind == "age":
+        return f"{_product_type(rng)} {rng.choice(AGE_PHRASES)}"
+    if kind == "gift":
+        return rng.choice(GIFT_PHRASES).format(who=rng.choice(GIFT_WHO))
+    return f"{rng.choice(ADJECTIVES).lower()} {_product_type(rng)}"
+
+
+def query_mix(count: int, seed: int = 7, repeat_share: float = 0.3) -> List[Tuple[str, str]]:
+    """
+    `count` (kind, query) pairs. About `repeat_share` of them repeat an
+    earlier query, like popular searches do, so caches see realistic hits.
+    """
+    rng = random.Random(seed)
+    kinds = list(QUERY_MIX)
+    weights = [QUERY_MIX[k] for k in kinds]
+    queries: List[Tuple[str, str]] = []
+    for _ in range(count):
+        if queries and rng.random() < repeat_share:
+            queries.append(rng.choice(queries))
+        else:
+            kind = rng.choices(kinds, weights)[0]
+            queries.append((kind, make_query(kind, rng)))
+    return queries
@@ -0,0 +1,247 @@
+"""
+Replays a query mix through one search path in-process and records
+throughput, latency percentiles (overall, per query kind, per stage),
+candidate counts and peak RSS. Results are JSON files so runs from
+different commits or configurations can be compared later.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+TARGETS = ("search_api", "main_2", "sunny")
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def latency_summary(timings: List[float]) -> Dict:
+    if not timings:
+        return {"count": 0}
+    return {
+        "count": len(timings),
+        "mean_ms": round(sum(timings) / len(timings), 2),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "max_ms": round(max(timings), 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def make_target(target: str, sqlite: Optional[str], postgres: Optional[str], limit: int,
+                use_cache: bool, reranker: Optional[str], llm_latency: float,
+                llm_jitter: float) -> Callable[[str], Tuple[int, bool]]:
+    """
+    Import the target app (after DATABASE_URL is set, since the apps read
+    it at import), swap in the stub LLM and return run(query) ->
+    (result count, degraded).
+    """
+    from ttl_cache import TTLCache
+    from llm_budget import Deadline
+    from sunny_bench.stubs import install_stub_llm
+
+    if postgres:
+        os.environ["DATABASE_URL"] = postgres
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    if target == "search_api":
+        if not postgres:
+            raise SystemExit("search_api needs --postgres")
+        import search_engine
+        install_stub_llm(search_engine, latency=llm_latency, jitter=llm_jitter)
+
+        def run(query: str):
+            response, _ = search_engine.cached_search_api(query, limit, use_cache=use_cache)
+            return len(response.get("products", [])), False
+        return run
+
+    if target == "main_2":
+        if not sqlite:
+            raise SystemExit("main_2 needs --sqlite")
+        import main_2
+        main_2.DB_PATH = sqlite
+        install_stub_llm(main_2, latency=llm_latency, jitter=llm_jitter)
+        if not use_cache:
+            main_2.query_cache = TTLCache(max_size=1, ttl=0)
+            main_2.query_cache_store = None
+
+        def run(query: str):
+            params, degraded = main_2.extract_search_terms(query, Deadline())
+            return len(main_2.search_products(params, limit)), degraded
+        return run
+
+    if target == "sunny":
+        if not postgres:
+            raise SystemExit("sunny needs --postgres")
+        import sunnyneqbasif
+        sunnyneqbasif.DATABASE_URL = postgres
+        install_stub_llm(sunnyneqbasif, latency=llm_latency, jitter=llm_jitter)
+        if not use_cache:
+            sunnyneqbasif.rerank_cache = TTLCache(max_size=1, ttl=0)
+            sunnyneqbasif.rerank_judgments = TTLCache(max_size=1, ttl=0)
+
+        def run(query: str):
+            products, degraded = sunnyneqbasif.search(query, reranker, Deadline())
+            return len(products), degraded
+        return run
+
+    raise SystemExit(f"Unknown target {target!r} (choose from {', '.join(TARGETS)})")
+
+
+def run_benchmark(target: str, queries: List[Tuple[str, str]], sqlite: Optional[str] = None,
+                  postgres: Optional[str] = None, concurrency: int = 1, warmup: int = 20,
+                  limit: int = 8, use_cache: bool = True, reranker: Optional[str] = None,
+                  llm_latency: float = 0.0, llm_jitter: float = 0.0) -> Dict:
+    """
+    Replay `queries` (kind, query) through `target`; the first `warmup` are
+    run serially and left out of the results. Returns the result document.
+    """
+    from metrics import candidate_count, reset_metrics, stage_seconds
+
+    run = make_target(target, sqlite, postgres, limit, use_cache, reranker, llm_latency, llm_jitter)
+    rss_before = peak_rss_mb()
+
+    for _, query in queries[:warmup]:
+        try:
+            run(query)
+        except Exception as e:
+            print(f"Warmup error: {e}")
+    reset_metrics()
+    queries = queries[warmup:]
+
+    def timed(item):
+        kind, query = item
+        started = time.perf_counter()
+        try:
+            count, degraded = run(query)
+            error = None
+        except Exception as e:
+            count, degraded, error = 0, False, f"{type(e).__name__}: {e}"
+        return kind, (time.perf_counter() - started) * 1000, count, degraded, error
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, queries))
+    elapsed = time.perf_counter() - started
+
+    timings = [ms for _, ms, _, _, error in outcomes if error is None]
+    by_kind: Dict[str, List[float]] = {}
+    for kind, ms, _, _, error in outcomes:
+        if error is None:
+            by_kind.setdefault(kind, []).append(ms)
+    errors = [error for *_, error in outcomes if error]
+
+    return {
+        "meta": {
+            "target": target,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "backend": "postgres" if target != "main_2" else "sqlite",
+            "queries": len(queries),
+            "concurrency": concurrency,
+            "warmup": warmup,
+            "limit": limit,
+            "cache": use_cache,
+            "reranker": reranker,
+            "llm_latency": llm_latency,
+            "llm_jitter": llm_jitter,
+        },
+        "throughput_qps": round(len(outcomes) / elapsed, 2) if elapsed else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "latency": latency_summary(timings),
+        "by_kind": {kind: latency_summary(values) for kind, values in sorted(by_kind.items())},
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "degraded": sum(1 for outcome in outcomes if outcome[3]),
+        "empty": sum(1 for outcome in outcomes if outcome[4] is None and outcome[2] == 0),
+        "stages": stage_seconds.summary(),
+        "candidates": candidate_count.summary(),
+        "rss_mb": {"before_run": rss_before, "peak": peak_rss_mb()},
+    }
+
+
+def print_result(result: Dict):
+    meta = result["meta"]
+    print(f"\n{meta['target']} @ {meta['commit'] or '?'}: {meta['queries']} queries, "
+          f"concurrency {meta['concurrency']}, cache {'on' if meta['cache'] else 'off'}")
+    print(f"  throughput {result['throughput_qps']:.1f} q/s, errors {result['errors']}, "
+          f"degraded {result['degraded']}, empty {result['empty']}, peak RSS {result['rss_mb']['peak']:.0f} MB")
+    print(f"\n  {'':>10} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [("all", result["latency"])] + list(result["by_kind"].items())
+    for name, row in rows:
+        if row.get("count"):
+            print(f"  {name:>10} {row['count']:>6} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+    if result["stages"]:
+        print(f"\n  {'stage':>10} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, row in result["stages"].items():
+            print(f"  {name:>10} {row['count']:>6} {row['p50'] * 1000:>9.2f} "
+                  f"{row['p95'] * 1000:>9.2f} {row['p99'] * 1000:>9.2f}")
+    for sample in result["error_samples"]:
+        print(f"  error: {sample}")
+
+
+def save_result(result: Dict, directory: str = "bench_results", name: Optional[str] = None) -> str:
+    os.makedirs(directory, exist_ok=True)
+    meta = result["meta"]
+    if name is None:
+        stamp = meta["timestamp"].replace(":", "").replace("-", "")[:15]
+        name = f"{meta['target']}-{meta['commit'] or 'nocommit'}-c{meta['concurrency']}-{stamp}"
+    path = os.path.join(directory, f"{name}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def compare_results(paths: List[str]):
+    """Side-by-side table of saved runs; deltas are against the first one"""
+    runs = []
+    for path in paths:
+        with open(path) as f:
+            runs.append((os.path.splitext(os.path.basename(path))[0], json.load(f)))
+    if not runs:
+        raise SystemExit("Nothing to compare")
+
+    columns = [("q/s", lambda r: r["throughput_qps"], True),
+               ("p50 ms", lambda r: r["latency"].get("p50_ms", 0.0), False),
+               ("p95 ms", lambda r: r["latency"].get("p95_ms", 0.0), False),
+               ("p99 ms", lambda r: r["latency"].get("p99_ms", 0.0), False),
+               ("RSS MB", lambda r: r["rss_mb"]["peak"], False)]
+    width = max(len(name) for name, _ in runs)
+    print(f"{'run':<{width}} " + " ".join(f"{title:>16}" for title, _, _ in columns) + "  errors")
+    _, base = runs[0]
+    for name, run in runs:
+        cells = []
+        for _, value, _ in columns:
+            current, reference = value(run), value(base)
+            delta = f"({(current - reference) / reference * 100:+.0f}%)" if run is not base and reference else ""
+            cells.append(f"{current:>9.1f}{delta:>7}")
+        print(f"{name:<{width}} " + " ".join(cells) + f"  {run['errors']:>6}")
+
+    mismatched = {key for _, run in runs for key in ("target", "queries", "concurrency", "cache")
+                  if run["meta"][key] != base["meta"][key]}
+    if mismatched:
+        print(f"\nNote: runs differ in {', '.join(sorted(mismatched))}")
@@ -0,0 +1,93 @@
+"""
+In-process stand-in for the OpenAI client the apps hold as `client`.
+Query-parse prompts (main_2) get a rule-based JSON parse; re-rank prompts
+(sunnyneqbasif) get fake_openai_server's word-overlap picks. Each call
+sleeps `latency` (+/- jitter) first, and honours with_options(timeout=...)
+by failing once the timeout is shorter than the latency drawn.
+"""
+
+import re
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+from typing import Optional
+
+from fake_openai_server import FakeOpenAI
+from sunny_bench.catalog import FRANCHISES
+
+STOP_WORDS = {"for", "a", "an", "the", "and", "with", "under", "below", "cheap", "pounds",
+              "year", "old", "age", "gift", "gifts", "ideas", "present"}
+AGE_WORDS = {"baby": "baby", "toddler": "toddler", "teens": "teens", "teen": "teens", "kids": "kids"}
+
+
+def parse_answer(query: str) -> dict:
+    """What GPT-4o-mini returns for main_2's parse prompt, near enough"""
+    text = query.lower()
+    words = re.findall(r'[a-z]+', text)
+    params = {"keywords": [w for w in words if w not in STOP_WORDS and len(w) > 1] or words}
+    for franchise, lines in FRANCHISES.items():
+        if any(name.lower() in text for name in [franchise] + lines):
+            params["brand"] = franchise
+            break
+    price = re.search(r'(?:under|below|less than)\s*£?\s*(\d+)', text)
+    if price:
+        params["max_price"] = float(price.group(1))
+    ages = [AGE_WORDS[w] for w in words if w in AGE_WORDS]
+    if ages:
+        params["age_group"] = ages[0]
+    elif re.search(r'\d+\s*year', text):
+        params["age_group"] = "kids"
+    return params
+
+
+class StubOpenAI:
+    """Duck-typed OpenAI client: with_options() and chat.completions.create()"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 0,
+                 timeout: Optional[float] = None, _shared: Optional[dict] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.timeout = timeout
+        self._shared = _shared if _shared is not None else {
+            "rng": random.Random(seed), "lock": threading.Lock(), "fake": FakeOpenAI(0, 0, 0, 0),
+            "calls": 0, "timeouts": 0}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def with_options(self, timeout: Optional[float] = None, **_) -> "StubOpenAI":
+        return StubOpenAI(self.latency, self.jitter, timeout=timeout, _shared=self._shared)
+
+    @property
+    def calls(self) -> int:
+        return self._shared["calls"]
+
+    @property
+    def timeouts(self) -> int:
+        return self._shared["timeouts"]
+
+    def create(self, model: str = "stub", messages: Optional[list] = None, **_):
+        shared = self._shared
+        with shared["lock"]:
+            shared["calls"] += 1
+            delay = max(0.0, self.latency + shared["rng"].uniform(-self.jitter, self.jitter))
+        if self.timeout is not None and delay > self.timeout:
+            time.sleep(self.timeout)
+            with shared["lock"]:
+                shared["timeouts"] += 1
+            raise TimeoutError(f"Stub LLM: {delay:.2f}s answer > {self.timeout:.2f}s timeout")
+        time.sleep(delay)
+
+        if "search query analyzer" in messages[0]["content"]:
+            content = json.dumps(parse_answer(messages[-1]["content"]))
+        else:
+            content = shared["fake"].complete({"model": model, "messages": messages})["choices"][0]["message"]["content"]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def install_stub_llm(*modules, latency: float = 0.0, jitter: float = 0.0, seed: int = 0) -> StubOpenAI:
+    """Replace each module's OpenAI `client` with one shared StubOpenAI"""
+    stub = StubOpenAI(latency, jitter, seed)
+    for module in modules:
+        module.client = stub
+    return stub
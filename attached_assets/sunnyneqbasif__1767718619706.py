@@ -1,34 +1,83 @@
 """
 Sunny Search
 ============
-One file. 115k Awin products. OpenAI picks the best matches.
+One file. 115k Awin products. A local re-ranker picks the best matches
+(OpenAI on request: RERANKER=gpt).
 """
 
 import os
+import re
 import json
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import time
 from openai import OpenAI
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
+from typing import Optional
+
+from db_pool import pg_connection, pool_stats
+from offload import endpoint_limiter, limiter_stats
+from ttl_cache import TTLCache
+from rerank import LinearReranker
+from llm_budget import Deadline, LLMBudgetExceeded, call_with_deadline, llm_budget_stats
+from metrics import (stage, observe_candidates, server_timing_middleware, register_stats,
+                     timed_json, metrics_response)
 
 app = FastAPI()
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+# Per-stage timings: /api/metrics + a Server-Timing header on every response
+app.middleware("http")(server_timing_middleware)
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# search() blocks on Postgres and OpenAI: run it in capped worker threads
+search_limiter = endpoint_limiter("search")
+
+# Re-rank stage: "local" (LinearReranker, milliseconds, no network) or
+# "gpt" (the slow, paid path)
+RERANKER = os.getenv("RERANKER", "local")
+# Re-rankers a request may pick with "rerank" (comma-separated). "gpt" costs
+# an OpenAI call per search, so clients can't force it unless listed here
+RERANK_CLIENT_CHOICES = {name.strip() for name in os.getenv("RERANK_CLIENT_CHOICES", "local").split(",")
+                         if name.strip()}
+local_reranker = LinearReranker.from_env()
+
+# Candidates come from a bounded keyword scan in table order, not a pool
+# ordered by a cheap score: GPT sees the first RERANK_POOL_FIRST, the local
+# re-ranker the first RERANK_CANDIDATE_POOL. Fixed sizes - growing an
+# unordered pool until the picks settle would only compare random samples
+RERANK_POOL_FIRST = int(os.getenv("RERANK_POOL_FIRST", "50"))
+RERANK_CANDIDATE_POOL = int(os.getenv("RERANK_CANDIDATE_POOL", "500"))
+
+# GPT re-rank cache. Exact hits need the same query + candidate set + model;
+# a set with at most RERANK_DELTA_MAX of its candidates unseen for the query
+# only sends those plus the previous winners.
+RERANK_MODEL = os.getenv("RERANK_MODEL", "gpt-4o-mini")
+RERANK_TOP_N = 8
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "5000"))
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", "3600"))
+RERANK_DELTA_MAX = float(os.getenv("RERANK_DELTA_MAX", "0.5"))
+
+rerank_cache = TTLCache(max_size=RERANK_CACHE_SIZE, ttl=RERANK_CACHE_TTL)
+# (query, model) -> {"judged": ids the model has compared, "winners": its picks}
+rerank_judgments = TTLCache(max_size=RERANK_CACHE_SIZE, ttl=RERANK_CACHE_TTL)
+rerank_stats = {"llm_calls": 0, "delta_calls": 0, "delta_reused": 0, "llm_errors": 0, "llm_timeouts": 0,
+                "prompt_products": 0, "total_ms": 0.0, "local_calls": 0, "local_total_ms": 0.0}
+
 
 class SearchRequest(BaseModel):
     query: str
+    rerank: Optional[str] = None  # "local" or "gpt" if in RERANK_CLIENT_CHOICES; default RERANKER
 
 
-def search(query: str):
-    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-    cursor = conn.cursor()
-    
+def candidate_query(query: str, limit: int) -> tuple:
+    """
+    (sql, params) for up to `limit` keyword-matched products. Unordered:
+    ranking the LIKE matches in SQL would read and sort all of them before
+    the first row comes back, so the re-ranker does the ordering.
+    """
     # Get candidate products using keyword match
     words = [w for w in query.lower().split() if len(w) > 2]
     
@@ -45,53 +94,161 @@ def search(query: str):
             FROM products 
             WHERE ({" OR ".join(conditions)})
               AND aw_deep_link IS NOT NULL
-            LIMIT 50
+            LIMIT %s
         """
-        cursor.execute(sql, params)
     else:
-        cursor.execute("""
+        params = []
+        sql = """
             SELECT aw_product_id, product_name, description, search_price,
                    merchant_name, aw_deep_link, merchant_image_url, aw_image_url
             FROM products 
             WHERE aw_deep_link IS NOT NULL
-            LIMIT 50
-        """)
-    
-    candidates = cursor.fetchall()
-    conn.close()
-    
-    if not candidates:
-        return []
-    
+            LIMIT %s
+        """
+    return sql, params + [limit]
+
+
+def fetch_candidates(query: str, limit: int = RERANK_POOL_FIRST) -> list:
+    """Up to `limit` keyword-matched products for the re-ranker"""
+    sql, params = candidate_query(query, limit)
+    with pg_connection(DATABASE_URL) as conn, stage("sql"):
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        candidates = cursor.fetchall()
+    observe_candidates(len(candidates), "sql")
+    return candidates
+
+
+def normalize_query(query: str) -> str:
+    """Re-rank cache key for a query: case, spacing and punctuation folded"""
+    return " ".join(re.findall(r'\w+', query.lower()))
+
+
+def rank_with_llm(query: str, candidates: list, timeout: Optional[float] = None) -> list:
+    """
+    Ask the model for the best RERANK_TOP_N of `candidates`.
+    Returns their IDs (as strings) best first; raises on API errors.
+    With a timeout (seconds) the call gives up by then, without SDK retries.
+    """
     # Send to OpenAI to pick best matches
     products_text = "\n".join([
         f"ID:{p['aw_product_id']} | {p['product_name']} | £{p['search_price']} | {(p['description'] or '')[:150]}"
         for p in candidates
     ])
     
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{
-            "role": "system",
-            "content": """You help UK families find products. Given a search and product list,
+    started = time.perf_counter()
+    try:
+        api = client.with_options(timeout=timeout, max_retries=0) if timeout else client
+        response = api.chat.completions.create(
+            model=RERANK_MODEL,
+            messages=[{
+                "role": "system",
+                "content": """You help UK families find products. Given a search and product list,
 return the IDs of the 8 best matching products as a JSON array.
 ONLY use IDs from the list. Never invent IDs.
 Format: ["id1", "id2", ...]"""
-        }, {
-            "role": "user",
-            "content": f"Search: {query}\n\nProducts:\n{products_text}"
-        }],
-        temperature=0.1
-    )
+            }, {
+                "role": "user",
+                "content": f"Search: {query}\n\nProducts:\n{products_text}"
+            }],
+            temperature=0.1
+        )
+    finally:
+        rerank_stats["llm_calls"] += 1
+        rerank_stats["prompt_products"] += len(candidates)
+        rerank_stats["total_ms"] += (time.perf_counter() - started) * 1000
     
     # Parse selected IDs
+    result = response.choices[0].message.content.strip()
+    if "```" in result:
+        result = result.split("```")[1].replace("json", "").strip()
+    selected_ids = json.loads(result)
+    if not isinstance(selected_ids, list):
+        raise ValueError(f"Expected a JSON array, got {type(selected_ids).__name__}")
+    
+    known = {str(p['aw_product_id']) for p in candidates}
+    return [str(pid) for pid in dict.fromkeys(map(str, selected_ids)) if pid in known][:RERANK_TOP_N]
+
+
+def rerank_with_gpt(query: str, candidates: list, deadline: Optional[Deadline] = None) -> tuple:
+    """
+    (best RERANK_TOP_N candidate IDs, degraded) through the re-rank cache.
+    Repeat candidate sets cost nothing; near-identical ones only send the
+    new candidates plus the previous winners (the rest already lost to them).
+    If GPT misses the request's deadline or fails, the local re-ranker
+    answers instead (degraded=True); a late GPT answer is still cached.
+    """
+    ids = [str(p['aw_product_id']) for p in candidates]
+    query_key = (normalize_query(query), RERANK_MODEL)
+    key = query_key + (tuple(sorted(ids)),)
+    
+    cached = rerank_cache.get(key)
+    if cached is not None:
+        return list(cached), False
+    
+    prompt_candidates = candidates
+    prior = rerank_judgments.get(query_key)
+    if prior is not None:
+        unseen = [p for p in candidates if str(p['aw_product_id']) not in prior["judged"]]
+        present = set(ids)
+        winners = [pid for pid in prior["winners"] if pid in present]
+        if len(unseen) <= RERANK_DELTA_MAX * len(candidates) and len(winners) == len(prior["winners"]):
+            if not unseen:
+                # Same contenders as last time, minus some losers
+                rerank_stats["delta_reused"] += 1
+                rerank_cache.set(key, winners)
+                return list(winners), False
+            by_id = {str(p['aw_product_id']): p for p in candidates}
+            prompt_candidates = [by_id[pid] for pid in winners] + unseen
+            rerank_stats["delta_calls"] += 1
+    
+    def ask(timeout: float) -> list:
+        selected = rank_with_llm(query, prompt_candidates, timeout)
+        judged = set(ids) | (prior["judged"] if prior is not None else set())
+        rerank_judgments.set(query_key, {"judged": judged, "winners": selected})
+        rerank_cache.set(key, selected)
+        return selected
+    
     try:
-        result = response.choices[0].message.content.strip()
-        if "```" in result:
-            result = result.split("```")[1].replace("json", "").strip()
-        selected_ids = json.loads(result)
-    except:
-        selected_ids = [p['aw_product_id'] for p in candidates[:8]]
+        with stage("llm"):
+            return list(call_with_deadline(ask, deadline or Deadline())), False
+    except LLMBudgetExceeded as e:
+        rerank_stats["llm_timeouts"] += 1
+        print(f"Re-rank over budget, using local re-ranker: {e}")
+    except Exception as e:
+        rerank_stats["llm_errors"] += 1
+        print(f"Re-rank failed, using local re-ranker: {e}")
+    return rank_locally(query, candidates), True
+
+
+def rank_locally(query: str, candidates: list) -> list:
+    started = time.perf_counter()
+    with stage("rerank"):
+        selected = local_reranker.rank(query, candidates, RERANK_TOP_N)
+    rerank_stats["local_calls"] += 1
+    rerank_stats["local_total_ms"] += (time.perf_counter() - started) * 1000
+    return selected
+
+
+def rerank(query: str, candidates: list, reranker: Optional[str] = None,
+           deadline: Optional[Deadline] = None) -> tuple:
+    """(best RERANK_TOP_N candidate IDs, degraded), from the local model or GPT"""
+    if (reranker or RERANKER) == "gpt":
+        return rerank_with_gpt(query, candidates, deadline)
+    return rank_locally(query, candidates), False
+
+
+def search(query: str, reranker: Optional[str] = None, deadline: Optional[Deadline] = None):
+    """(products, degraded) for a query"""
+    if (reranker or RERANKER) == "gpt":
+        candidates = fetch_candidates(query)
+    else:
+        candidates = fetch_candidates(query, RERANK_CANDIDATE_POOL)
+    
+    if not candidates:
+        return [], False
+    
+    selected_ids, degraded = rerank(query, candidates, reranker, deadline)
     
     # Build response
     id_to_product = {str(p['aw_product_id']): p for p in candidates}
@@ -109,13 +266,61 @@ Format: ["id1", "id2", ...]"""
                 "imageUrl": p['merchant_image_url'] or p['aw_image_url']
             })
     
-    return results
+    return results, degraded
+
+
+def rerank_cache_stats() -> dict:
+    """Local re-rank timing, plus GPT re-rank cache hits and the calls/products it saved"""
+    calls = rerank_stats["llm_calls"]
+    avg_llm_ms = rerank_stats["total_ms"] / calls if calls else 0.0
+    saved_calls = rerank_cache.hits + rerank_stats["delta_reused"]
+    local_calls = rerank_stats["local_calls"]
+    return {
+        "reranker": RERANKER,
+        "local_calls": local_calls,
+        "avg_local_ms": round(rerank_stats["local_total_ms"] / local_calls, 3) if local_calls else 0.0,
+        "exact": rerank_cache.stats(),
+        "queries_judged": len(rerank_judgments),
+        "llm_calls": calls,
+        "llm_errors": rerank_stats["llm_errors"],
+        "llm_timeouts": rerank_stats["llm_timeouts"],
+        "delta_calls": rerank_stats["delta_calls"],
+        "delta_reused": rerank_stats["delta_reused"],
+        "avg_prompt_products": round(rerank_stats["prompt_products"] / calls, 1) if calls else 0.0,
+        "avg_llm_ms": round(avg_llm_ms, 1),
+        "llm_calls_saved": saved_calls,
+        "latency_saved_ms": round(saved_calls * avg_llm_ms, 1),
+        "budget": llm_budget_stats(),
+    }
 
 
 @app.post("/api/search")
 async def api_search(request: SearchRequest):
-    products = search(request.query)
-    return {"products": products}
+    if request.rerank not in (None, "local", "gpt"):
+        raise HTTPException(status_code=400, detail="rerank must be 'local' or 'gpt'")
+    if request.rerank is not None and request.rerank not in RERANK_CLIENT_CHOICES:
+        raise HTTPException(status_code=403, detail=f"rerank '{request.rerank}' is not enabled for clients")
+    # LLM work must finish within the budget, queueing included
+    deadline = Deadline()
+    products, degraded = await search_limiter.run(search, request.query, request.rerank, deadline)
+    return timed_json({"products": products, "degraded": degraded})
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Re-rank latency and GPT re-rank cache effectiveness"""
+    return rerank_cache_stats()
+
+
+@app.get("/api/metrics")
+async def metrics(format: str = "prometheus"):
+    """Stage latency histograms, counters and cache/pool gauges (format=json for percentiles)"""
+    return metrics_response(format)
+
+
+register_stats("pools", pool_stats)
+register_stats("endpoints", limiter_stats)
+register_stats("rerank", rerank_cache_stats)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -0,0 +1,485 @@
+"""
+Batched Search Tag Generation
+=============================
+Shared by generate_search_tags.py and search_engine.py. Instead of one
+prompt per product (repeating the instruction block 115k times), a
+BatchTagger packs N products into one request and asks for a JSON
+object keyed by product id. Products missing from the reply, or in a
+reply that isn't valid JSON, fall back to a single-product call.
+
+Usage:
+    tagger = BatchTagger(client, INSTRUCTIONS, batch_size=20, limiter=limiter)
+    for result in tagger.tag(products, workers=16):
+        save(result.product['id'], result.tags)
+    print(tagger.stats())   # includes tokens_per_product
+
+Callers pass their own instruction block (what keywords to extract);
+the output format lines are added here. batch_size=1 is the old
+one-product-per-call mode.
+
+Identical inputs are only paid for once: a TagResponseCache (Postgres,
+shared by every tagger process and both scripts) is keyed by a hash of
+the model, instruction block and truncated name/description, and
+duplicates within one call to tag() are sent to the API only once.
+
+Results are written back through a TagWriter: buffered, bulk-loaded into
+a temp staging table and applied with one UPDATE ... FROM per flush,
+committed each time - so a crash loses at most one flush window of
+paid-for LLM work.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional
+
+from psycopg2.extras import execute_values
+
+from db_pool import pg_connection
+from rate_limit import RateLimiter, call_with_backoff, estimate_tokens
+from ttl_cache import TTLCache
+
+# Account limits for gpt-4o-mini (defaults are tier 1); raise them to go faster
+TAG_RPM = float(os.getenv("TAG_RPM", "500"))
+TAG_TPM = float(os.getenv("TAG_TPM", "200000"))
+TAG_WORKERS = int(os.getenv("TAG_WORKERS", "16"))
+TAG_PROMPT_BATCH = int(os.getenv("TAG_PROMPT_BATCH", "20"))
+
+# Write-back: flush buffered tags every N results or T seconds, whichever first
+TAG_FLUSH_SIZE = int(os.getenv("TAG_FLUSH_SIZE", "200"))
+TAG_FLUSH_SECONDS = float(os.getenv("TAG_FLUSH_SECONDS", "5"))
+
+# Response cache: identical (model, prompt, name, description) inputs are
+# tagged once, ever - duplicated feed items across merchants cost nothing
+TAG_CACHE = os.getenv("TAG_CACHE", "1") == "1"
+
+SINGLE_FORMAT = """Product: {name}
+Description: {description}
+
+Keywords only (comma-separated, no explanation):"""
+
+BATCH_FORMAT = """Products (JSON):
+{products}
+
+Return a JSON object {{"products": [{{"id": "<product id>", "tags": "<comma-separated keywords>"}}]}}
+with exactly one entry per product id above. Keywords only, no explanation."""
+
+
+@dataclass
+class TagResult:
+    product: Dict
+    tags: Optional[str]  # None = API failure, "" = nothing to tag
+    tokens: float        # API tokens attributed to this product
+    batched: bool        # False if it went through a single-product call
+    cached: bool = False # answered from the response cache / a duplicate
+
+
+def clean_tags(tags) -> str:
+    if isinstance(tags, list):
+        tags = ", ".join(str(t) for t in tags)
+    tags = str(tags).strip().replace('\n', ', ').replace('  ', ' ')
+    return tags[:500]  # Limit length
+
+
+def parse_batch_response(content: str, ids: List[str]) -> Dict[str, str]:
+    """id → tags for the products the model answered; {} if the reply is malformed"""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return {}
+    if isinstance(data, dict):
+        data = data.get("products", data)
+    wanted = set(ids)
+    tags = {}
+    if isinstance(data, list):
+        for entry in data:
+            if isinstance(entry, dict) and str(entry.get("id")) in wanted and entry.get("tags") is not None:
+                tags[str(entry["id"])] = clean_tags(entry["tags"])
+    elif isinstance(data, dict):
+        # Tolerate {"<id>": "tags", ...}
+        for key, value in data.items():
+            if key in wanted and isinstance(value, (str, list)):
+                tags[key] = clean_tags(value)
+    return tags
+
+
+class TagResponseCache:
+    """
+    Persistent fingerprint → tags store in Postgres, with an in-memory
+    front. Shared across runs, processes and nodes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tag_response_cache (
+            key CHAR(32) PRIMARY KEY,
+            tags TEXT NOT NULL,
+            model VARCHAR(50),
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """
+
+    def __init__(self, dsn: Optional[str] = None, memory_size: int = 100_000):
+        self.dsn = dsn
+        self.memory = TTLCache(max_size=memory_size, ttl=7 * 86400)
+        self._ready = False
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.writes = 0
+
+    def _ensure_table(self, conn):
+        if not self._ready:
+            conn.cursor().execute(self.SCHEMA)
+            conn.commit()
+            self._ready = True
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            tags = self.memory.get(key)
+            if tags is None:
+                missing.append(key)
+            else:
+                found[key] = tags
+        if missing:
+            with pg_connection(self.dsn) as conn:
+                self._ensure_table(conn)
+                cursor = conn.cursor()
+                cursor.execute("SELECT key, tags FROM tag_response_cache WHERE key = ANY(%s)", (missing,))
+                for row in cursor.fetchall():
+                    found[row['key']] = row['tags']
+                    self.memory.set(row['key'], row['tags'])
+                conn.commit()
+        with self._lock:
+            self.lookups += len(keys)
+            self.hits += sum(key in found for key in keys)
+        return found
+
+    def set_many(self, items: Dict[str, str], model: str = None):
+        if not items:
+            return
+        for key, tags in items.items():
+            self.memory.set(key, tags)
+        with pg_connection(self.dsn) as conn:
+            self._ensure_table(conn)
+            execute_values(conn.cursor(), """
+                INSERT INTO tag_response_cache (key, tags, model) VALUES %s
+                ON CONFLICT (key) DO NOTHING
+            """, [(key, tags, model) for key, tags in items.items()])
+            conn.commit()
+        with self._lock:
+            self.writes += len(items)
+
+    def stats(self) -> Dict:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "writes": self.writes,
+            "memory": self.memory.stats(),
+        }
+
+
+_shared_cache = None
+
+
+def shared_tag_cache() -> Optional[TagResponseCache]:
+    """Process-wide response cache on DATABASE_URL (None if TAG_CACHE=0)"""
+    global _shared_cache
+    if TAG_CACHE and _shared_cache is None:
+        _shared_cache = TagResponseCache()
+    return _shared_cache
+
+
+class BatchTagger:
+    """Tags products N per request, with single-product fallback"""
+
+    def __init__(self, client, instructions: str, model: str = "gpt-4o-mini",
+                 batch_size: int = TAG_PROMPT_BATCH, description_chars: int = 600,
+                 max_tokens_per_product: int = 150, min_description: int = 20,
+                 limiter: Optional[RateLimiter] = None,
+                 cache: Optional[TagResponseCache] = None):
+        self.client = client
+        self.instructions = instructions.strip()
+        self.model = model
+        self.cache = cache
+        # Everything about the prompt that changes the answer, except the product
+        self._fingerprint = hashlib.md5(
+            "\x1f".join((model, self.instructions, SINGLE_FORMAT, BATCH_FORMAT)).encode()
+        ).hexdigest()
+        self.batch_size = max(1, batch_size)
+        self.description_chars = description_chars
+        self.max_tokens_per_product = max_tokens_per_product
+        self.min_description = min_description
+        self.limiter = limiter or RateLimiter(TAG_RPM, TAG_TPM)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batch_requests = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.products = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_hits = 0
+        self.duplicates = 0
+
+    def cache_key(self, product: Dict) -> str:
+        """Fingerprint of the exact prompt inputs for this product"""
+        return hashlib.md5("\x1f".join((
+            self._fingerprint,
+            product.get('name') or '',
+            product['description'][:self.description_chars],
+        )).encode()).hexdigest()
+
+    def _taggable(self, product: Dict) -> bool:
+        description = product.get('description')
+        return bool(description) and len(description.strip()) >= self.min_description
+
+    def _complete(self, prompt: str, max_tokens: int, json_mode: bool):
+        kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+        response = call_with_backoff(
+            self.limiter, estimate_tokens(prompt) + max_tokens,
+            lambda: self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.1,
+                max_tokens=max_tokens,
+                **kwargs
+            )
+        )
+        usage = getattr(response, "usage", None)
+        with self._lock:
+            self.requests += 1
+            self.batch_requests += json_mode
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_tokens or 0
+                self.completion_tokens += usage.completion_tokens or 0
+        tokens = (usage.total_tokens or 0) if usage is not None else 0
+        return response.choices[0].message.content, tokens
+
+    def _count(self, results: List[TagResult]) -> List[TagResult]:
+        with self._lock:
+            self.products += len(results)
+            self.failures += sum(r.tags is None for r in results)
+        return results
+
+    def _tag_single(self, product: Dict) -> TagResult:
+        if not self._taggable(product):
+            return TagResult(product, "", 0, False)
+        prompt = self.instructions + "\n\n" + SINGLE_FORMAT.format(
+            name=product.get('name', ''),
+            description=product['description'][:self.description_chars])
+        try:
+            content, tokens = self._complete(prompt, self.max_tokens_per_product, json_mode=False)
+        except Exception as e:
+            print(f"  Error: {e}")
+            return TagResult(product, None, 0, False)
+        return TagResult(product, clean_tags(content), tokens, False)
+
+    def tag_one(self, product: Dict) -> TagResult:
+        """One product, one request (unless the cache already has it)"""
+        if self.cache is not None and self._taggable(product):
+            key = self.cache_key(product)
+            tags = self.cache.get_many([key]).get(key)
+            if tags is not None:
+                with self._lock:
+                    self.cache_hits += 1
+                return self._count([TagResult(product, tags, 0, False, cached=True)])[0]
+            result = self._tag_single(product)
+            if result.tags is not None:
+                self.cache.set_many({key: result.tags}, self.model)
+            return self._count([result])[0]
+        return self._count([self._tag_single(product)])[0]
+
+    def tag_batch(self, products: List[Dict]) -> List[TagResult]:
+        """One request for all of `products`; singles for whatever it doesn't answer"""
+        todo = [p for p in products if self._taggable(p)]
+        results = {str(p['id']): TagResult(p, "", 0, False) for p in products if not self._taggable(p)}
+        if len(todo) == 1:
+            results[str(todo[0]['id'])] = self._tag_single(todo[0])
+            todo = []
+
+        if todo:
+            payload = json.dumps([{
+                "id": str(p['id']),
+                "name": p.get('name', ''),
+                "description": p['description'][:self.description_chars],
+            } for p in todo], ensure_ascii=False)
+            prompt = self.instructions + "\n\n" + BATCH_FORMAT.format(products=payload)
+            ids = [str(p['id']) for p in todo]
+            try:
+                content, tokens = self._complete(
+                    prompt, self.max_tokens_per_product * len(todo) + 50, json_mode=True)
+                answered = parse_batch_response(content, ids)
+            except Exception as e:
+                print(f"  Batch error ({len(todo)} products), falling back to single calls: {e}")
+                answered, tokens = {}, 0
+            share = tokens / len(todo)
+            for product, product_id in zip(todo, ids):
+                if product_id in answered:
+                    results[product_id] = TagResult(product, answered[product_id], share, True)
+                else:
+                    with self._lock:
+                        self.fallbacks += 1
+                    single = self._tag_single(product)
+                    single.tokens += share
+                    results[product_id] = single
+
+        return self._count([results[str(p['id'])] for p in products])
+
+    def tag(self, products: List[Dict], workers: int = TAG_WORKERS) -> Iterator[TagResult]:
+        """
+        Tag everything, batch_size products per request and `workers` requests
+        in flight. Cached inputs and repeats of the same input within
+        `products` are answered without an API call.
+        """
+        to_send = products
+        duplicates: Dict[str, List[Dict]] = {}
+        if self.cache is not None:
+            keyed = {}
+            for product in products:
+                if self._taggable(product):
+                    keyed.setdefault(self.cache_key(product), []).append(product)
+            cached = self.cache.get_many(list(keyed))
+            hits = []
+            for key, group in keyed.items():
+                if key in cached:
+                    hits.extend(TagResult(p, cached[key], 0, False, cached=True) for p in group)
+                elif len(group) > 1:
+                    duplicates[key] = group[1:]
+            with self._lock:
+                self.cache_hits += len(hits)
+                self.duplicates += sum(len(group) for group in duplicates.values())
+            yield from self._count(hits)
+            skip = {id(r.product) for r in hits}
+            skip.update(id(p) for group in duplicates.values() for p in group)
+            to_send = [p for p in products if id(p) not in skip]
+        
+        chunks = [to_send[i:i + self.batch_size] for i in range(0, len(to_send), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [pool.submit(self.tag_batch, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                results = future.result()
+                if self.cache is not None:
+                    answered = {self.cache_key(r.product): r.tags for r in results
+                                if r.tags is not None and self._taggable(r.product)}
+                    self.cache.set_many(answered, self.model)
+                    for key, tags in answered.items():
+                        copies = duplicates.pop(key, [])
+                        results.extend(self._count([TagResult(p, tags, 0, False, cached=True)
+                                                    for p in copies]))
+                yield from results
+        
+        # Duplicates of inputs whose API call failed stay untagged for next time
+        leftovers = [p for group in duplicates.values() for p in group]
+        yield from self._count([TagResult(p, None, 0, False) for p in leftovers])
+
+    def stats(self) -> Dict:
+        tokens = self.prompt_tokens + self.completion_tokens
+        return {
+            "products": self.products,
+            "requests": self.requests,
+            "batch_requests": self.batch_requests,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tokens_per_product": round(tokens / self.products, 1) if self.products else 0.0,
+            "requests_per_product": round(self.requests / self.products, 3) if self.products else 0.0,
+            "cache_hits": self.cache_hits,
+            "duplicates": self.duplicates,
+            # Share of products answered without their own API call
+            "dedup_rate": round((self.cache_hits + self.duplicates) / self.products, 4) if self.products else 0.0,
+        }
+
+
+class TagWriter:
+    """
+    Buffers (product id, tags) and bulk-applies them to products.search_tags.
+    Use as a context manager so the tail is flushed on exit.
+    """
+
+    STAGING_SCHEMA = """
+        CREATE TEMP TABLE IF NOT EXISTS tag_staging (
+            id VARCHAR(100) PRIMARY KEY,
+            search_tags TEXT NOT NULL,
+            input_hash TEXT
+        ) ON COMMIT DELETE ROWS
+    """
+
+    def __init__(self, conn, flush_size: int = TAG_FLUSH_SIZE,
+                 flush_seconds: float = TAG_FLUSH_SECONDS,
+                 on_flush: Optional[Callable] = None):
+        self.conn = conn
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        # Called with the cursor inside each flush's transaction (e.g. to
+        # move a checkpoint atomically with the tags it covers)
+        self.on_flush = on_flush
+        self._buffer: Dict[str, tuple] = {}
+        self._last_flush = time.monotonic()
+        self.flushes = 0
+        self.rows_written = 0
+        self.flush_seconds_total = 0.0
+
+    def add(self, product_id, tags: str, input_hash: Optional[str] = None):
+        """input_hash, if given, is stored as products.search_tags_hash"""
+        self._buffer[str(product_id)] = (tags, input_hash)
+        if (len(self._buffer) >= self.flush_size
+                or time.monotonic() - self._last_flush >= self.flush_seconds):
+            self.flush()
+
+    def flush(self) -> int:
+        """Apply and commit everything buffered; returns rows written"""
+        self._last_flush = time.monotonic()
+        if not self._buffer and self.on_flush is None:
+            return 0
+        
+        started = time.perf_counter()
+        cursor = self.conn.cursor()
+        if self._buffer:
+            cursor.execute(self.STAGING_SCHEMA)
+            execute_values(cursor, "INSERT INTO tag_staging (id, search_tags, input_hash) VALUES %s",
+                           [(pid, tags, h) for pid, (tags, h) in self._buffer.items()], page_size=1000)
+            # Only touch search_tags_hash when the caller tracks hashes
+            hashed = any(h is not None for _, h in self._buffer.values())
+            set_hash = "search_tags_hash = COALESCE(s.input_hash, p.search_tags_hash)," if hashed else ""
+            # '' marks "nothing to tag"; only real tags count as a content change
+            cursor.execute(f"""
+                UPDATE products AS p
+                SET search_tags = s.search_tags,
+                    {set_hash}
+                    updated_at = CASE WHEN s.search_tags <> '' THEN NOW() ELSE p.updated_at END
+                FROM tag_staging AS s
+                WHERE p.id = s.id
+            """)
+        if self.on_flush is not None:
+            self.on_flush(cursor)
+        self.conn.commit()  # also empties tag_staging
+        
+        written = len(self._buffer)
+        self._buffer.clear()
+        self.flushes += 1
+        self.rows_written += written
+        self.flush_seconds_total += time.perf_counter() - started
+        return written
+
+    def __enter__(self) -> 'TagWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Results already paid for are kept even if the producer failed
+        self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "pending": len(self._buffer),
+            "avg_flush_ms": round(self.flush_seconds_total / self.flushes * 1000, 1) if self.flushes else 0.0,
+        }
@@ -0,0 +1,91 @@
+"""
+Parity tests: score_batch() must give bit-identical scores to
+calculate_relevance_score() for every candidate, on raw rows and on rows
+carrying the precomputed *_norm columns.
+
+Run:
+    python -m pytest test_scoring.py
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+# search_engine builds an OpenAI client at import; no calls are made here
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from search_engine import (
+    SearchIntent, CandidateBatch, TopK, calculate_relevance_score, extract_intent, normalized_columns,
+    rank_chunk, score_batch
+)
+from bench_scoring import QUERIES, TAXONOMY, make_products
+
+
+def make_intent(keywords=(), categories=(), franchises=(), intent_type=None, min_price=None,
+                max_price=None, weights=None) -> SearchIntent:
+    return SearchIntent(raw_query=" ".join(keywords), keywords=list(keywords), categories=list(categories),
+                        franchises=list(franchises), age_group=None, intent_type=intent_type,
+                        min_price=min_price, max_price=max_price, weights=weights or {})
+
+
+def product(**fields) -> dict:
+    row = {"id": "1", "name": None, "description": None, "search_tags": None, "category": None,
+           "brand": None, "price": None, "image_url": None, "in_stock": False}
+    row.update(fields)
+    return row
+
+
+def assert_parity(products, intent):
+    for rows in (products, [{**p, **normalized_columns(p)} for p in products]):
+        expected = np.array([calculate_relevance_score(dict(p), intent) for p in rows])
+        actual = score_batch(CandidateBatch.from_products(rows), intent)
+        assert np.array_equal(expected, actual), (expected, actual)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_random_catalog(query):
+    intent = extract_intent(query, TAXONOMY)
+    for seed in range(3):
+        assert_parity(make_products(300, seed), intent)
+
+
+def test_empty_fields():
+    products = [product(), product(name="", description="", search_tags="", category="", brand=""),
+                product(name="Lego Set"), product(description="lego bricks"), product(search_tags="lego")]
+    assert_parity(products, make_intent(["lego"], categories=["Toys"], franchises=["LEGO"]))
+    assert_parity(products, make_intent())
+
+
+def test_empty_batch():
+    assert len(score_batch(CandidateBatch.from_products([]), make_intent(["lego"]))) == 0
+
+
+@pytest.mark.parametrize("price", [None, 0, 0.01, 9.99, 10, 10.01, 20, 20.01, 1000])
+def test_price_bounds(price):
+    products = [product(name="Lego", price=price, in_stock=True, image_url="x")]
+    for intent in (make_intent(["lego"], max_price=20), make_intent(["lego"], min_price=10),
+                   make_intent(["lego"], min_price=10, max_price=20)):
+        assert_parity(products, intent)
+
+
+def test_franchise_category_and_intent_weights():
+    products = [product(name="Marvel Spider-Man Dress", brand="Marvel", category="Clothing", price=15),
+                product(name="Spider-Man Lego", brand="LEGO", category="Toys > Building", price=40),
+                product(name="Plain Dress", description="marvel print", category="Clothing"),
+                product(name="Pokémon Plush", brand="Pokémon", category="Toys", in_stock=True)]
+    for intent_type in (None, "Gift", "Budget", "Premium"):
+        intent = make_intent(["dress", "spider-man", "pokémon"], categories=["Clothing", "Toys"],
+                             franchises=["Marvel", "Pokémon"], intent_type=intent_type, max_price=30,
+                             weights={"dress": 1.0, "spider-man": 1.5, "pokémon": 1.2})
+        assert_parity(products, intent)
+
+
+def test_rank_chunk_paths_agree():
+    intent = extract_intent(QUERIES[0], TAXONOMY)
+    rows = make_products(150, seed=4)
+    whole, split = TopK(8), TopK(8)
+    rank_chunk(whole, rows, intent)  # batch scorer
+    for start in range(0, len(rows), 30):
+        rank_chunk(split, rows[start:start + 30], intent)  # row-by-row scorer
+    assert whole.ids() == split.ids()
@@ -0,0 +1,174 @@
+"""
+search_products() SQL against in-memory rows: with NORMALIZED_TEXT the
+keyword filter must keep exactly the rows the scorer credits a keyword.
+extract_intent() typo correction: real words are never "corrected", and a
+guessed spelling never becomes a category/franchise filter. Only the
+best-first (fulltext/trigram) candidate pools grow in tiers.
+
+Run:
+    python -m pytest test_search.py
+"""
+
+import contextlib
+import os
+import re
+
+import pytest
+
+# search_engine builds an OpenAI client at import; no calls are made here
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import search_engine
+from search_engine import (
+    PhraseMatcher, SearchIntent, TaxonomyMatch, extract_intent, match_text, normalized_columns, search_products
+)
+
+
+def make_intent(keywords) -> SearchIntent:
+    return SearchIntent(raw_query=" ".join(keywords), keywords=list(keywords), categories=[], franchises=[],
+                        age_group=None, intent_type=None, min_price=None, max_price=None, weights={})
+
+
+def product(id, name, description="", search_tags="") -> dict:
+    row = {"id": id, "name": name, "description": description, "search_tags": search_tags, "category": "",
+           "brand": "", "price": 10, "image_url": None, "in_stock": True}
+    return {**row, **normalized_columns(row)}
+
+
+CATALOG = [product("1", "Baby Dolls Set"), product("2", "Rag Doll"), product("3", "Running Trainers"),
+           product("4", "Puzzle", description="Dolls house puzzle"), product("5", "Crème Brûlée Kit"),
+           product("6", "Football", search_tags="trainer, outdoor"), product("7", "Teddy Bear")]
+
+
+class FakeCursor:
+    """Applies the keyword filter the way Postgres would: text_norm LIKE '%term%'."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params=None):
+        patterns = [p for p in params if isinstance(p, str)]
+        assert query.count("text_norm LIKE %s") == len(patterns)
+        assert "search_tokens" not in query
+        terms = [re.fullmatch(r"%(.*)%", p).group(1) for p in patterns]
+        self.pending = [r for r in self.rows if any(t in r["text_norm"] for t in terms)]
+
+    def fetchmany(self, size):
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def cursor(self, name=None):
+        return FakeCursor(CATALOG)
+
+
+@pytest.fixture
+def normalized(monkeypatch):
+    monkeypatch.setattr(search_engine, "NORMALIZED_TEXT", True)
+    monkeypatch.setattr(search_engine, "get_db_connection", lambda: contextlib.nullcontext(FakeConnection()))
+
+
+@pytest.mark.parametrize("keywords", [["doll"], ["dolls"], ["trainer"], ["trainers"], ["creme brulee"],
+                                      ["Crème"], ["doll", "trainer"], ["bear"], ["kite"]])
+def test_keyword_filter_agrees_with_scorer(normalized, keywords):
+    credited = {row["id"] for row in CATALOG
+                if any(search_engine.normalize_term(kw) in match_text(row)[1] for kw in keywords)}
+    found = {row["id"] for row in search_products(make_intent(keywords), limit=len(CATALOG), vector_k=0)}
+    assert found == credited
+
+
+TAXONOMY = {k: TaxonomyMatch(k, c, sc, w) for k, c, sc, w in [
+    ('bluey', 'Franchise', 'Bluey', 1.5), ('peppa pig', 'Franchise', 'Peppa Pig', 1.5),
+    ('plush', 'Toys', 'Soft Toys', 1.0), ('boots', 'Footwear', 'Boots', 1.0), ('coat', 'Clothing', 'Coats', 1.0),
+    ('dress', 'Clothing', 'Dresses', 1.0), ('present', 'Intent', 'Gift', 1.2),
+]}
+
+# Catalogue words: every query word below except the misspellings
+VOCABULARY = frozenset("blue dress plus size lush bath bombs robot bots coast walking fire prevent "
+                       "peppa pig wellies".split())
+
+FALSE_POSITIVES = ["blue dress", "plus size dress", "lush bath bombs", "robot bots", "coast walking", "fire prevent"]
+
+
+@pytest.fixture
+def typo_on(monkeypatch):
+    monkeypatch.setattr(search_engine, "TYPO_MAX_DISTANCE", 1)
+
+
+def test_typo_correction_off_by_default():
+    assert search_engine.TYPO_MAX_DISTANCE == 0 or "TYPO_MAX_DISTANCE" in os.environ
+    intent = extract_intent("peppa pigg wellies", TAXONOMY, PhraseMatcher(TAXONOMY, VOCABULARY))
+    assert intent.franchises == [] and "pigg" in intent.keywords
+
+
+def test_typo_correction_needs_vocabulary(typo_on):
+    intent = extract_intent("peppa pigg wellies", TAXONOMY, PhraseMatcher(TAXONOMY))
+    assert intent.franchises == [] and "pigg" in intent.keywords
+
+
+def test_typo_completes_phrase(typo_on):
+    intent = extract_intent("peppa pigg wellies", TAXONOMY, PhraseMatcher(TAXONOMY, VOCABULARY))
+    assert intent.franchises == ["Peppa Pig"]
+
+
+@pytest.mark.parametrize("query", FALSE_POSITIVES)
+def test_catalogue_words_are_not_typos(typo_on, query):
+    intent = extract_intent(query, TAXONOMY, PhraseMatcher(TAXONOMY, VOCABULARY))
+    expected = ["Clothing"] if "dress" in query else []
+    assert (intent.categories, intent.franchises, intent.intent_type) == (expected, [], None)
+    assert set(query.split()) <= set(intent.keywords)
+
+
+@pytest.mark.parametrize("query", FALSE_POSITIVES)
+def test_guessed_word_only_boosts(typo_on, query):
+    # Even with the words missing from the vocabulary, a lone guess adds no filter
+    intent = extract_intent(query, TAXONOMY, PhraseMatcher(TAXONOMY, frozenset({"wellies"})))
+    expected = ["Clothing"] if "dress" in query else []
+    assert (intent.categories, intent.franchises, intent.intent_type) == (expected, [], None)
+    assert set(query.split()) <= set(intent.keywords)
+    for keyword in set(intent.keywords) - set(query.split()):
+        assert keyword in intent.weights
+
+
+class NullCursor:
+    def execute(self, query, params=None):
+        pass
+
+    def fetchmany(self, size):
+        return []
+
+    def close(self):
+        pass
+
+
+class NullConnection:
+    def cursor(self, name=None):
+        return NullCursor()
+
+
+@pytest.mark.parametrize("mode", ["like", "fulltext", "trigram"])
+def test_only_ordered_pools_grow(monkeypatch, mode):
+    tiers = []
+    monkeypatch.setattr(search_engine, "get_db_connection", lambda: contextlib.nullcontext(NullConnection()))
+    monkeypatch.setattr(search_engine, "grow_pool", lambda fetch, consume, top_ids, t, *args: tiers.extend(t))
+    search_products(make_intent(["lego"]), limit=10, mode=mode, vector_k=0)
+    if mode == "like":
+        # Unordered scan: one fixed tier, no "stable" stop over random rows
+        assert tiers == [50]
+    else:
+        assert tiers[0] == 50 and tiers[-1] == search_engine.SEARCH_CANDIDATE_POOL and len(tiers) > 1
+
+
+def test_loaded_matcher_never_touches_db(monkeypatch):
+    def unreachable():
+        raise AssertionError("DB touched")
+    monkeypatch.setattr(search_engine, "get_db_connection", unreachable)
+    cache = search_engine.TaxonomyCache(check_interval=0)
+    assert cache.loaded_matcher() is None
+    matcher = PhraseMatcher(TAXONOMY)
+    cache._loaded = (TAXONOMY, matcher, "v1")
+    assert cache.loaded_matcher() is matcher
@@ -0,0 +1,132 @@
+"""
+Sunny Caches
+============
+Small building blocks for the request-path caches:
+
+- TTLCache: thread-safe in-memory LRU with per-entry expiry and hit/miss counters
+- SQLiteCacheTier: optional persistent JSON tier behind it, so a restart
+  (or a second worker on the same box) doesn't start cold
+"""
+
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from db_pool import sqlite_connection
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU; entries older than `ttl` seconds count as misses"""
+
+    def __init__(self, max_size: int = 1000, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteCacheTier:
+    """Persistent key → JSON store with expiry, in its own SQLite file"""
+
+    def __init__(self, path: str, table: str = "cache", ttl: float = 86400):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        with sqlite_connection(path) as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+
+    def get(self, key: str):
+        with sqlite_connection(self.path) as conn:
+            row = conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row["value"])
+
+    def set(self, key: str, value):
+        with sqlite_connection(self.path) as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + self.ttl)
+            )
+            conn.commit()
+
+    def purge_expired(self) -> int:
+        with sqlite_connection(self.path) as conn:
+            deleted = conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?",
+                                   (time.time(),)).rowcount
+            conn.commit()
+        return deleted
+
+    def stats(self) -> Dict:
+        return {"path": self.path, "hits": self.hits, "misses": self.misses}